@@ -0,0 +1,6 @@
+"""Performance benchmarks for wdlfmt.
+
+Each module is a standalone script; run them from the repo root, e.g.
+
+    python -m benchmarks.warm_cache
+"""
@@ -0,0 +1,57 @@
+"""Scaling of comment placement with the number of comments.
+
+Builds documents with N comments (one before every input declaration) and
+times `lowering.lower` with the comments and without them; the difference
+is the time spent placing comments (`comment_neighbours`).
+
+    python -m benchmarks.comment_insertion [--sizes 100,1000,10000]
+"""
+
+import argparse
+import time
+
+from antlr4 import CommonTokenStream, InputStream
+
+from wdlfmt.lowering import lower
+from wdlfmt.parser_cache import get_parser_cache
+
+
+def commented_document(n_comments):
+    lines = ["version 1.0", "", "task Commented {", "    input {"]
+    for i in range(n_comments):
+        lines.append(f"        # documentation for input {i}")
+        lines.append(f"        String input{i} = \"value {i}\"")
+    lines += ["    }", "    command <<<", "        echo hi", "    >>>", "}", ""]
+    return "\n".join(lines)
+
+
+def parse(wdl):
+    cache = get_parser_cache()
+    stream = CommonTokenStream(cache.lexer(InputStream(wdl)))
+    stream.fill()
+    comments = [t for t in stream.tokens if t.channel == 2]
+    return cache.parser(stream).document(), comments
+
+
+def timed(wdl, with_comments):
+    tree, comments = parse(wdl)
+    start = time.perf_counter()
+    lower(tree, comments if with_comments else [])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000")
+    args = parser.parse_args()
+
+    print(f"{'comments':>9}  {'lower ms':>10}  {'no comments':>11}  {'us/comment':>10}")
+    for n in map(int, args.sizes.split(",")):
+        wdl = commented_document(n)
+        placed = timed(wdl, True) * 1000
+        bare = timed(wdl, False) * 1000
+        print(f"{n:>9}  {placed:10.1f}  {bare:11.1f}  {(placed - bare) * 1000 / n:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
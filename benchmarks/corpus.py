@@ -0,0 +1,190 @@
+"""A deterministic generator of large synthetic WDL documents.
+
+`generate(CorpusSpec(...))` builds a document whose shape is controlled by a
+handful of knobs, so that scaling can be measured one dimension at a time:
+number of tasks, comment density, command block length, interpolations per
+command block, scatter/if nesting depth in the workflow and expression
+length. The same spec always gives the same text.
+
+    python -m benchmarks.corpus --tasks 200 --comment-density 0.5 > big.wdl
+
+The formatter does not support `scatter` and `if` blocks yet, so documents
+with `nesting > 0` can be lexed, parsed and style-checked but not formatted.
+Conditional expressions (`if a then b else c`) lose their spaces when
+formatted, so expressions are built from operators and function calls only.
+"""
+
+import argparse
+import random
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class CorpusSpec:
+    """The shape of a generated document.
+
+    Attributes:
+        tasks: Number of tasks, each called once from the workflow.
+        comment_density: Chance (0 to 1) of a comment line before each
+            declaration, section and command line.
+        command_lines: Lines of shell script in each command block.
+        interpolations: `~{...}` placeholders in each command block.
+        nesting: Depth of alternating `scatter` and `if` blocks around the
+            workflow's calls.
+        expression_terms: Operands in each generated expression.
+        seed: Seed for the choices made along the way.
+    """
+
+    tasks: int = 20
+    comment_density: float = 0.2
+    command_lines: int = 5
+    interpolations: int = 3
+    nesting: int = 0
+    expression_terms: int = 3
+    seed: int = 0
+
+
+_WORDS = ["sample", "reads", "index", "reference", "output", "threads", "memory", "quality", "prefix", "bam"]
+# Simple commands, so that arguments can be appended to any of them.
+_SHELL = [
+    "samtools sort -@ 4 -o sorted.bam",
+    'mkdir -p "$(dirname output/file.txt)"',
+    "sort -k1,1 -k2,2n input.bed",
+    "gzip -c reads.fastq",
+    "tool run --verbose",
+    "cp -r results",
+]
+_OPERATORS = ["+", "-", "*"]
+
+
+class _Writer:
+    def __init__(self, spec: CorpusSpec):
+        self.spec = spec
+        self.random = random.Random(spec.seed)
+        self.lines = []
+
+    def comment(self, indent: int, what: str) -> None:
+        if self.random.random() < self.spec.comment_density:
+            self.lines.append(" " * indent + f"# {what}: {self.random.choice(_WORDS)}")
+
+    def line(self, indent: int, text: str) -> None:
+        self.lines.append(" " * indent + text)
+
+    def expression(self, names) -> str:
+        terms = [str(self.random.randint(1, 99))]
+        for _ in range(self.spec.expression_terms - 1):
+            operand = self.random.choice([str(self.random.randint(1, 99)), self.random.choice(names)])
+            terms.append(f"{self.random.choice(_OPERATORS)} {operand}")
+        expression = " ".join(terms)
+        if self.spec.expression_terms > 2:
+            expression = f"max({expression}, 1)"
+        return expression
+
+    def task(self, n: int) -> None:
+        spec = self.spec
+        self.comment(0, "task")
+        self.line(0, f"task Task{n} {{")
+        self.line(4, "input {")
+        self.comment(8, "input")
+        self.line(8, "File inputFile")
+        self.comment(8, "input")
+        self.line(8, f'String outputPath = "task_{n}.out"')
+        self.comment(8, "input")
+        self.line(8, f"Int threads = {self.expression(['1', '2'])}")
+        self.line(8, 'String memory = "4GiB"')
+        self.line(4, "}")
+        self.line(0, "")
+
+        self.comment(4, "command")
+        self.line(4, "command <<<")
+        self.line(8, "set -e")
+        placeholders = ["~{inputFile}", "~{outputPath}", "~{threads}", "~{memory}"]
+        lines = max(spec.command_lines, 1)
+        for i in range(lines):
+            self.comment(8, "step")
+            text = self.random.choice(_SHELL)
+            # Spread the placeholders over the lines of the script.
+            count = spec.interpolations // lines + (i < spec.interpolations % lines)
+            for j in range(count):
+                text += f" --{self.random.choice(_WORDS)} {placeholders[(i + j) % len(placeholders)]}"
+            self.line(8, text)
+        self.line(4, ">>>")
+        self.line(0, "")
+
+        self.line(4, "output {")
+        self.comment(8, "output")
+        self.line(8, "File outputFile = outputPath")
+        self.line(4, "}")
+        self.line(0, "")
+        self.line(4, "runtime {")
+        self.line(8, "cpu: threads")
+        self.line(8, "memory: memory")
+        self.line(8, 'docker: "debian:stable-slim"')
+        self.line(4, "}")
+        self.line(0, "}")
+        self.line(0, "")
+
+    def workflow(self) -> None:
+        spec = self.spec
+        self.comment(0, "workflow")
+        self.line(0, "workflow Main {")
+        self.line(4, "input {")
+        self.line(8, "File inputFile")
+        self.line(8, "Array[Int] shards = [1, 2, 3]")
+        self.line(8, "Boolean run = true")
+        self.line(8, "Int n = 10")
+        self.line(4, "}")
+        self.line(0, "")
+
+        indent = 4
+        for depth in range(spec.nesting):
+            if depth % 2 == 0:
+                self.line(indent, f"scatter (shard{depth} in shards) {{")
+            else:
+                self.line(indent, "if (run) {")
+            indent += 4
+
+        for n in range(spec.tasks):
+            self.comment(indent, "call")
+            self.line(indent, f"call Task{n} as task{n} {{")
+            self.line(indent + 4, "input:")
+            self.line(indent + 8, "inputFile = inputFile,")
+            self.line(indent + 8, f"threads = {self.expression(['n'])}")
+            self.line(indent, "}")
+            self.line(0, "")
+        self.comment(indent, "declaration")
+        self.line(indent, f"Int total = {self.expression(['n'])}")
+
+        for _ in range(spec.nesting):
+            indent -= 4
+            self.line(indent, "}")
+        self.line(0, "}")
+
+
+def generate(spec: CorpusSpec = CorpusSpec()) -> str:
+    """A WDL document shaped by `spec`."""
+    writer = _Writer(spec)
+    writer.line(0, "version 1.0")
+    writer.line(0, "")
+    for n in range(spec.tasks):
+        writer.task(n)
+    writer.workflow()
+    return "\n".join(writer.lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    defaults = CorpusSpec()
+    parser.add_argument("--tasks", type=int, default=defaults.tasks)
+    parser.add_argument("--comment-density", type=float, default=defaults.comment_density)
+    parser.add_argument("--command-lines", type=int, default=defaults.command_lines)
+    parser.add_argument("--interpolations", type=int, default=defaults.interpolations)
+    parser.add_argument("--nesting", type=int, default=defaults.nesting)
+    parser.add_argument("--expression-terms", type=int, default=defaults.expression_terms)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+    print(generate(CorpusSpec(**vars(args))), end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Per-node cost of looking up a node's formatter.
+
+Compares the previous dispatch, where each formatter rebuilt a string-keyed
+table from `Formatter.__subclasses__()` (instantiating every formatter) before
+looking up `str(type(node))`, with the shared type-keyed registry.
+
+    python -m benchmarks.dispatch [--nodes 2000]
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+from antlr4 import CommonTokenStream, InputStream
+
+from wdlfmt.formatters.common import Formatter, all_formatters
+from wdlfmt.parser_cache import get_parser_cache
+
+SNAPSHOT = Path(__file__).parent.parent / "test" / "snapshots" / "full_example.input.wdl"
+
+
+def legacy_collect_formatters(only_public=True):
+    formatters = {}
+    for formatter in Formatter.__subclasses__():
+        if only_public and not formatter.public:
+            continue
+        if isinstance(formatter().formats, list):
+            for format in formatter().formats:
+                formatters[str(format)] = formatter()
+        else:
+            formatters[str(formatter().formats)] = formatter()
+    return formatters
+
+
+def formattable_nodes():
+    cache = get_parser_cache()
+    tree = cache.parser(CommonTokenStream(cache.lexer(InputStream(SNAPSHOT.read_text())))).document()
+    table = all_formatters()
+    nodes, stack = [], [tree]
+    while stack:
+        node = stack.pop()
+        if type(node) in table:
+            nodes.append(node)
+        stack.extend(getattr(node, "children", None) or [])
+    return nodes
+
+
+def per_node(fn, nodes, n):
+    start = time.perf_counter()
+    done = 0
+    while done < n:
+        for node in nodes:
+            fn(node)
+        done += len(nodes)
+    return (time.perf_counter() - start) / done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=2000, help="Lookups per measurement")
+    args = parser.parse_args()
+
+    nodes = formattable_nodes()
+    before = per_node(lambda node: legacy_collect_formatters(False)[str(type(node))], nodes, args.nodes)
+    after = per_node(lambda node: all_formatters()[type(node)], nodes, args.nodes * 100)
+
+    print(f"before: {before * 1e6:10.2f} us/node  (rebuild string-keyed table per lookup)")
+    print(f"after:  {after * 1e6:10.2f} us/node  (shared type-keyed registry)")
+    print(f"speedup: {before / after:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
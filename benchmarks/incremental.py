@@ -0,0 +1,104 @@
+"""Latency of re-formatting a large document after a one-line edit.
+
+Builds a synthetic document of about 5,000 lines, formats it once, changes a
+single line in one task, and times formatting the edited document in full
+(`format_wdl_str`) and incrementally (`IncrementalFormatter`).
+
+    python -m benchmarks.incremental [--lines 5000] [--repeat 5]
+"""
+
+import argparse
+import time
+
+import wdlfmt
+from wdlfmt.incremental import IncrementalFormatter
+
+TASK = """
+# Task number {n}
+task Task{n} {{
+    input {{
+        File inputFile
+        String outputPath = "out_{n}.txt"
+        Int threads = {threads}
+        String memory = "4GiB"
+    }}
+
+    command <<<
+        set -e
+        mkdir -p "$(dirname ~{{outputPath}})"
+        tool_{n} --threads ~{{threads}} \\
+            --input ~{{inputFile}} \\
+            --output ~{{outputPath}}
+    >>>
+
+    output {{
+        File outputFile = outputPath
+    }}
+
+    runtime {{
+        cpu: threads
+        memory: memory
+    }}
+}}
+"""
+
+
+def document(lines, edited=None):
+    tasks = []
+    n = 0
+    while sum(t.count("\n") for t in tasks) < lines:
+        tasks.append(TASK.format(n=n, threads=8 if n == edited else 4))
+        n += 1
+    return "version 1.0\n" + "".join(tasks)
+
+
+def best(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=5000, help="Approximate document length")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per measurement (best is shown)")
+    args = parser.parse_args()
+
+    before = document(args.lines)
+    n_tasks = before.count("\ntask ")
+    after = document(args.lines, edited=n_tasks // 2)
+    assert before.count("\n") == after.count("\n")
+
+    # Warm the parser and shfmt caches so both paths only pay for the edit.
+    wdlfmt.format_wdl_str(before)
+    wdlfmt.format_wdl_str(after)
+
+    full = best(lambda: wdlfmt.format_wdl_str(after), args.repeat)
+
+    incremental = IncrementalFormatter()
+
+    def edit():
+        incremental.format(before)
+        start = time.perf_counter()
+        result = incremental.format(after)
+        edit.elapsed = time.perf_counter() - start
+        edit.result = result
+
+    timings = []
+    for _ in range(args.repeat):
+        edit()
+        timings.append(edit.elapsed)
+    assert edit.result == wdlfmt.format_wdl_str(after)
+
+    print(f"{after.count(chr(10))} lines, {n_tasks} tasks, one line changed")
+    print(f"full:        {full * 1000:8.1f} ms")
+    print(f"incremental: {min(timings) * 1000:8.1f} ms "
+          f"({incremental.formatted} element(s) formatted, {incremental.reused} reused, "
+          f"{incremental.parsed_chars} of {len(after)} characters parsed)")
+
+
+if __name__ == "__main__":
+    main()
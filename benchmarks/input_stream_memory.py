@@ -0,0 +1,74 @@
+"""Peak memory per MB of input for antlr4.InputStream vs. ArrayInputStream.
+
+Generates WDL documents of the given sizes by repeating a snapshot, then uses
+tracemalloc to measure the peak Python allocation while building the input
+stream alone and while lexing the whole document into tokens. The source
+string itself is allocated before tracing starts and is not counted.
+
+    python -m benchmarks.input_stream_memory [--sizes MB ...] [--no-lex]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from pathlib import Path
+
+from antlr4 import CommonTokenStream, InputStream
+
+from wdlfmt.input_stream import ArrayInputStream
+from wdlfmt.parser_cache import get_parser_cache
+
+SNAPSHOT = Path(__file__).parent.parent / "test" / "snapshots" / "md5_check.input.wdl"
+
+MB = 1 << 20
+
+
+def make_document(size: int) -> str:
+    body = SNAPSHOT.read_text().split("\n", 1)[1]
+    return "version 1.0\n" + body * (size // len(body) + 1)
+
+
+def measure(build):
+    """Peak traced bytes and seconds taken by `build()`."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return peak, elapsed
+
+
+def lex(stream_type, source):
+    tokens = CommonTokenStream(get_parser_cache().lexer(stream_type(source)))
+    tokens.fill()
+    return tokens
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 4], help="Input sizes in MB")
+    parser.add_argument("--no-lex", action="store_true", help="Only measure building the stream")
+    args = parser.parse_args()
+
+    # Warm the lexer so learned DFA states are not counted as per-input cost.
+    lex(InputStream, make_document(64 * 1024))
+
+    print(f"{'MB':>6}  {'stage':<6}  {'stream':<17}  {'peak MB/MB':>10}  {'seconds':>8}")
+    for size in args.sizes:
+        source = make_document(int(size * MB))
+        stages = [("stream", lambda t: t(source))]
+        if not args.no_lex:
+            stages.append(("lex", lambda t: lex(t, source)))
+        for stage, build in stages:
+            for stream_type in (InputStream, ArrayInputStream):
+                peak, elapsed = measure(lambda: build(stream_type))
+                print(f"{size:>6g}  {stage:<6}  {stream_type.__name__:<17}  "
+                      f"{peak / len(source):10.2f}  {elapsed:8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Command blocks (tasks) formatted per second by each shfmt strategy.
+
+Extracts every task's command script from a corpus of WDL files and formats
+them with:
+
+* tempfile: the previous approach, a temporary file and a shfmt process per
+  command block;
+* stdin: one shfmt process per command block, fed over stdin;
+* batched: one shfmt process per document (`ShfmtRunner.format_many`);
+* cached: batched, with the result cache on, so repeated blocks (and every
+  repeat of the corpus) skip shfmt.
+
+    python -m benchmarks.shfmt_throughput [FILE ...] [--repeat N]
+"""
+
+import argparse
+import os
+import subprocess
+import time
+from tempfile import NamedTemporaryFile
+
+from benchmarks.warm_cache import default_corpus
+from wdlfmt import syntax
+from wdlfmt.formatters.shell_formatter import ShfmtCache, ShfmtRunner
+from wdlfmt.formatters.task import command_shfmt_formatter
+from wdlfmt.input_stream import ArrayInputStream
+from wdlfmt.visitor import WdlVisitor
+
+
+def document_scripts(source):
+    scripts, stack = [], [WdlVisitor(ArrayInputStream(source)).document]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, syntax.Command):
+            scripts.append(command_shfmt_formatter(node).substituted())
+        stack.extend(getattr(node, "body", None) or [])
+    return scripts
+
+
+def legacy_format(bin, script):
+    try:
+        with NamedTemporaryFile(delete=False) as tmpfile:
+            tmpfile.write(script.encode("utf-8"))
+            tmpfile.flush()
+            return subprocess.check_output([bin, tmpfile.name]).decode("utf-8")
+    finally:
+        os.remove(tmpfile.name)
+
+
+def timed(fn, documents):
+    start = time.perf_counter()
+    for scripts in documents:
+        fn(scripts)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="WDL files (default: BioWDL tasks or snapshots)")
+    parser.add_argument("--repeat", type=int, default=5, help="Times to cycle through the files")
+    args = parser.parse_args()
+
+    paths = args.files or default_corpus()
+    documents = [document_scripts(open(p).read()) for p in paths] * args.repeat
+    tasks = sum(len(scripts) for scripts in documents)
+
+    def runner(maxsize):
+        runner = ShfmtRunner(cache=ShfmtCache(maxsize=maxsize))
+        runner.version
+        runner.processes = 0
+        return runner
+
+    uncached, batched, cached = runner(0), runner(0), runner(None)
+    strategies = {
+        "tempfile": (None, lambda scripts: [legacy_format(uncached.bin, s) for s in scripts]),
+        "stdin": (uncached, lambda scripts: [uncached.format(s) for s in scripts]),
+        "batched": (batched, batched.format_many),
+        "cached": (cached, cached.format_many),
+    }
+
+    print(f"{len(paths)} files, {tasks // args.repeat} command blocks, repeated {args.repeat}x")
+    print(f"{'strategy':>10}  {'tasks/s':>9}  {'processes':>9}")
+    for name, (runner, fn) in strategies.items():
+        elapsed = timed(fn, documents)
+        processes = runner.processes if runner is not None else tasks
+        print(f"{name:>10}  {tasks / elapsed:9.1f}  {processes:>9}")
+
+
+if __name__ == "__main__":
+    main()
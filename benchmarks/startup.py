@@ -0,0 +1,170 @@
+"""Start-up time of `wdlfmt` and of importing it.
+
+Each case runs in a fresh interpreter with `python -X importtime` and
+reports the wall time of the process, the time spent importing wdlfmt
+modules (and everything they import), and the slowest imports.
+
+    python -m benchmarks.startup [--case NAME ...] [--repeat 5] [--top 10]
+
+`wdlfmt --help` and the style checker on its own should not load the
+generated parser, the formatters or antlr4 (`HEAVY`). Each light case has
+a module budget (`MODULE_BUDGET`): the wdlfmt modules it may import and
+the most modules it may import in all, which does not depend on the speed
+of the machine. The test suite enforces both (test/test_startup.py). In
+addition `wdlfmt --help` should spend less than `IMPORT_BUDGET` seconds
+importing, which depends on the machine and is only checked here. The
+exit status is 1 if any of them is broken.
+"""
+
+import argparse
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+_HELP = """
+import sys
+sys.argv = ["wdlfmt", "--help"]
+from wdlfmt.cli import cli
+try:
+    cli()
+except SystemExit:
+    pass
+"""
+
+CASES = {
+    "wdlfmt --help": _HELP,
+    "import wdlfmt": "import wdlfmt",
+    "import wdlfmt.checker": "import wdlfmt.checker",
+    "format_wdl_str": "import wdlfmt; wdlfmt.format_wdl_str('version 1.0\\n')",
+}
+
+# Cases that must not import any of `HEAVY`.
+LIGHT_CASES = ("wdlfmt --help", "import wdlfmt", "import wdlfmt.checker")
+HEAVY = frozenset([
+    "antlr4",
+    "wdlfmt.grammar.WdlV1Lexer",
+    "wdlfmt.grammar.WdlV1Parser",
+    "wdlfmt.formatters.common",
+    "wdlfmt.visitor",
+])
+
+IMPORT_BUDGET = 0.075
+
+# For each light case, the wdlfmt modules it may import and the most
+# modules (the standard library's included) it may import in all. The
+# totals leave room for differences between Python versions.
+MODULE_BUDGET = {
+    "wdlfmt --help": ({"wdlfmt", "wdlfmt.cli", "wdlfmt.modes", "wdlfmt.profiling"}, 150),
+    "import wdlfmt": ({"wdlfmt"}, 100),
+    "import wdlfmt.checker": ({"wdlfmt", "wdlfmt.checker", "wdlfmt.profiling"}, 130),
+}
+
+
+@dataclass
+class Startup:
+    """One run of a case.
+
+    Attributes:
+        wall: Seconds from starting the interpreter until it exited.
+        imports: Seconds spent importing wdlfmt modules, including what
+            they import.
+        modules: Every module imported, with its cumulative import time in
+            seconds.
+    """
+
+    wall: float
+    imports: float
+    modules: Dict[str, float] = field(default_factory=dict)
+
+    @property
+    def loaded(self) -> Set[str]:
+        return set(self.modules)
+
+    def over_budget(self, case: str) -> List[str]:
+        """How this run breaks the module budget of `case`, if it does."""
+        allowed, most = MODULE_BUDGET[case]
+        problems = [f"imports {module}" for module in sorted(self.own_modules - allowed)]
+        if len(self.modules) > most:
+            problems.append(f"imports {len(self.modules)} modules (budget {most})")
+        return problems
+
+    @property
+    def own_modules(self) -> Set[str]:
+        return {name for name in self.modules if name.split(".")[0] == "wdlfmt"}
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, float]]:
+    """`(module, depth, cumulative seconds)` for every line `-X importtime`
+    wrote to `stderr`, in order."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        stripped = name.lstrip(" ")
+        depth = (len(name) - len(stripped) - 1) // 2
+        imports.append((stripped, depth, int(cumulative) / 1e6))
+    return imports
+
+
+def measure(code: str, repeat: int = 1) -> Startup:
+    """The fastest of `repeat` runs of `code` in a fresh interpreter."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        command = [sys.executable, "-X", "importtime", "-c", code]
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        wall = time.perf_counter() - start
+        if completed.returncode != 0:
+            raise RuntimeError(f"{code!r} failed:\n{completed.stderr}")
+        imports = parse_importtime(completed.stderr)
+        startup = Startup(
+            wall=wall,
+            # Top-level imports of wdlfmt modules, which include the
+            # imports they trigger.
+            imports=sum(s for name, depth, s in imports if depth == 0 and name.split(".")[0] == "wdlfmt"),
+            modules={name: s for name, _, s in imports},
+        )
+        if best is None or startup.wall < best.wall:
+            best = startup
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--case", nargs="+", choices=CASES, default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per case (best is kept)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list per case")
+    args = parser.parse_args()
+
+    failed = False
+    results = {name: measure(CASES[name], args.repeat) for name in args.case}
+    print(f"{'case':<24} {'wall ms':>8} {'import ms':>10} {'modules':>8}")
+    for name, startup in results.items():
+        print(f"{name:<24} {startup.wall * 1000:8.1f} {startup.imports * 1000:10.1f} {len(startup.modules):>8}")
+
+    for name, startup in results.items():
+        print(f"\n{name}: slowest imports (cumulative ms)")
+        slowest = sorted(startup.modules.items(), key=lambda item: -item[1])[: args.top]
+        for module, seconds in slowest:
+            print(f"  {seconds * 1000:8.1f}  {module}")
+        heavy = sorted(startup.loaded & HEAVY)
+        if name in LIGHT_CASES and heavy:
+            print(f"  LOADED {', '.join(heavy)}")
+            failed = True
+        for problem in startup.over_budget(name) if name in MODULE_BUDGET else []:
+            print(f"  OVER BUDGET: {problem}")
+            failed = True
+
+    if "wdlfmt --help" in results and results["wdlfmt --help"].imports > IMPORT_BUDGET:
+        print(f"\nOVER BUDGET: wdlfmt --help spends {results['wdlfmt --help'].imports * 1000:.1f} ms importing "
+              f"(budget {IMPORT_BUDGET * 1000:.0f} ms)")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
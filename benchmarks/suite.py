@@ -0,0 +1,244 @@
+"""Throughput, per-stage time and peak memory on generated corpora, with
+regression checks against a stored baseline.
+
+Each scenario generates a document with `benchmarks.corpus`, varying one
+dimension at a time, and measures:
+
+* `format_wdl_str`: lines per second (best of `--repeat` runs), the time
+  spent in each stage of the best run (see `wdlfmt.profiling`), and the
+  peak Python allocation while formatting (tracemalloc, in a separate run).
+* `StyleChecker.run_all` on the formatted document: lines per second.
+* The `wdlfmt` CLI in a fresh process: lines per second including start-up,
+  and the peak RSS of the process.
+
+The parser caches are warm, as in a long-running process, but shfmt results
+are not cached, so every run pays for shfmt.
+
+The results are compared with `benchmarks/baseline.json`. A metric more than
+`--threshold` worse than its baseline is reported as a regression, and the
+exit status is 1. Timings depend on the machine: record a baseline on the
+machine you compare on.
+
+    python -m benchmarks.suite [--scenario NAME ...] [--repeat 3] [--no-cli]
+    python -m benchmarks.suite --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict
+from pathlib import Path
+
+import wdlfmt
+from wdlfmt import profiling
+from wdlfmt.checker import StyleChecker
+from wdlfmt.formatters.shell_formatter import configure_shfmt_cache
+
+from .corpus import CorpusSpec, generate
+
+BASELINE = Path(__file__).parent / "baseline.json"
+
+SCENARIOS = {
+    "default": CorpusSpec(tasks=50),
+    "many-tasks": CorpusSpec(tasks=200),
+    "dense-comments": CorpusSpec(tasks=50, comment_density=1.0),
+    "long-commands": CorpusSpec(tasks=50, command_lines=50, interpolations=40),
+    "long-expressions": CorpusSpec(tasks=50, expression_terms=40),
+    # Not formatted yet (scatter/if): measures lexing, parsing and the checker.
+    "nested": CorpusSpec(tasks=50, nesting=4),
+}
+
+# Metrics where a larger value is better; for the rest smaller is better.
+_HIGHER_IS_BETTER = {"format_lines_per_second", "check_lines_per_second", "cli_lines_per_second"}
+
+
+def best_of(fn, repeat):
+    """The fastest of `repeat` calls of `fn`, as `(seconds, result)`."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best[0]:
+            best = (elapsed, result)
+    return best
+
+
+def _format_profiled(source):
+    with profiling.collect() as profile:
+        try:
+            formatted, error = wdlfmt.format_wdl_str(source), None
+        except Exception as e:
+            formatted, error = None, f"{type(e).__name__}: {e}"
+    return formatted, error, profile
+
+
+def measure_format(source, repeat):
+    _format_profiled(source)  # warm the parser caches
+    seconds, (formatted, error, profile) = best_of(lambda: _format_profiled(source), repeat)
+
+    tracemalloc.start()
+    _format_profiled(source)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, formatted, error, profile, peak
+
+
+# Runs the CLI and reports the peak RSS of the process itself on stderr.
+# (The rusage of a child process also counts memory the parent had when it
+# forked.)
+_CLI = """
+import atexit, sys
+
+def report_peak():
+    try:
+        with open("/proc/self/status") as f:
+            kb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:"))
+    except (OSError, StopIteration):
+        import resource
+        kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == "darwin" else 1)
+    sys.stderr.write(f"\\npeak_kb {kb}\\n")
+
+atexit.register(report_peak)
+from wdlfmt.cli import cli
+sys.argv[0] = "wdlfmt"
+cli()
+"""
+
+
+def measure_cli(source):
+    """Wall time and peak RSS in bytes of `wdlfmt --check` on `source`."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "corpus.wdl")
+        with open(path, "w") as f:
+            f.write(source)
+        command = [sys.executable, "-c", _CLI, "--no-cache", "--check", "-j", "1", path]
+        start = time.perf_counter()
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        elapsed = time.perf_counter() - start
+    peak_kb = int(completed.stderr.rsplit("peak_kb ", 1)[1])
+    return elapsed, peak_kb * 1024
+
+
+def run_scenario(name, spec, repeat, cli):
+    source = generate(spec)
+    lines = source.count("\n")
+    seconds, formatted, error, profile, peak = measure_format(source, repeat)
+    check_seconds, _ = best_of(lambda: StyleChecker(formatted or source).run_all(), repeat)
+
+    result = {
+        "lines": lines,
+        "format_error": error,
+        "format_lines_per_second": None if error else lines / seconds,
+        "format_peak_mb": peak / (1 << 20),
+        "stages": dict(profile.seconds),
+        "check_lines_per_second": lines / check_seconds,
+    }
+    if cli:
+        cli_seconds, rss = measure_cli(source)
+        result["cli_lines_per_second"] = lines / cli_seconds
+        result["cli_peak_rss_mb"] = rss / (1 << 20)
+    return result
+
+
+def compare(results, baseline, threshold):
+    """Metrics more than `threshold` (a fraction) worse than the baseline, as
+    `(scenario, metric, baseline, current)` tuples."""
+    regressions = []
+    for name, result in results.items():
+        for metric, before in baseline.get("scenarios", {}).get(name, {}).items():
+            after = result.get(metric)
+            if not isinstance(before, (int, float)) or not isinstance(after, (int, float)) or metric == "lines":
+                continue
+            if metric in _HIGHER_IS_BETTER:
+                worse = after < before * (1 - threshold)
+            else:
+                worse = after > before * (1 + threshold)
+            if worse:
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def print_results(results):
+    stages = [s for s in profiling.STAGES if any(s in r["stages"] for r in results.values())]
+    header = f"{'scenario':<18} {'lines':>7} {'format l/s':>11} {'check l/s':>11} {'cli l/s':>9} " \
+             f"{'peak MB':>8} {'cli RSS MB':>10}"
+    print(header)
+    for name, r in results.items():
+        fmt = "failed" if r["format_error"] else f"{r['format_lines_per_second']:11.0f}"
+        cli = f"{r['cli_lines_per_second']:9.0f}" if "cli_lines_per_second" in r else f"{'-':>9}"
+        rss = f"{r['cli_peak_rss_mb']:10.1f}" if "cli_peak_rss_mb" in r else f"{'-':>10}"
+        print(f"{name:<18} {r['lines']:>7} {fmt:>11} {r['check_lines_per_second']:11.0f} {cli} "
+              f"{r['format_peak_mb']:8.1f} {rss}")
+
+    print()
+    print(f"{'ms per stage':<18} " + " ".join(f"{s:>9.9}" for s in stages))
+    for name, r in results.items():
+        print(f"{name:<18} " + " ".join(f"{r['stages'].get(s, 0.0) * 1000:9.1f}" for s in stages))
+
+    for name, r in results.items():
+        if r["format_error"]:
+            print(f"\n{name}: format_wdl_str failed: {r['format_error'][:200]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per measurement (best is kept)")
+    parser.add_argument("--no-cli", action="store_true", help="Skip the CLI measurements")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="Baseline file (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="Record the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Fraction by which a metric may be worse than the baseline (default: %(default)s)")
+    parser.add_argument("--json", metavar="FILE", help="Also write the results to FILE")
+    args = parser.parse_args()
+
+    configure_shfmt_cache(maxsize=0)
+    results = {}
+    for name in args.scenario:
+        results[name] = run_scenario(name, SCENARIOS[name], args.repeat, cli=not args.no_cli)
+    print_results(results)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "specs": {name: asdict(SCENARIOS[name]) for name in results},
+        "scenarios": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; record one with --save-baseline")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    changed = [n for n in results if baseline.get("specs", {}).get(n, asdict(SCENARIOS[n])) != asdict(SCENARIOS[n])]
+    for name in changed:
+        print(f"\n{name}: scenario changed since the baseline was recorded, not compared")
+    regressions = compare({n: r for n, r in results.items() if n not in changed}, baseline, args.threshold)
+    print()
+    if not regressions:
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+        return
+    for name, metric, before, after in regressions:
+        print(f"REGRESSION {name} {metric}: {before:.1f} -> {after:.1f}")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Per-file latency of the Nth document against the first.
+
+Formats a sequence of WDL files in one process, once with the shared parser
+cache kept warm and once with it reset after every document, and prints the
+latency of each file in the sequence.
+
+    python -m benchmarks.warm_cache [FILE ...] [--repeat N]
+"""
+
+import argparse
+import glob
+import time
+
+import wdlfmt
+from wdlfmt.parser_cache import DEFAULT_MAX_STATES, configure_parser_cache
+
+
+def default_corpus():
+    paths = sorted(glob.glob("test/biowdl_tasks/*.wdl"))
+    return paths or sorted(glob.glob("test/snapshots/*.input.wdl"))
+
+
+def run(sources, max_states):
+    configure_parser_cache(max_states)
+    timings = []
+    for source in sources:
+        start = time.perf_counter()
+        wdlfmt.format_wdl_str(source)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("files", nargs="*", help="WDL files (default: BioWDL tasks or snapshots)")
+    parser.add_argument("--repeat", type=int, default=5, help="Times to cycle through the files")
+    args = parser.parse_args()
+
+    paths = args.files or default_corpus()
+    sources = [open(p).read() for p in paths] * args.repeat
+
+    cold = run(sources, max_states=0)
+    warm = run(sources, max_states=DEFAULT_MAX_STATES)
+
+    print(f"{'file':>6}  {'cold ms':>9}  {'warm ms':>9}")
+    for n, (c, w) in enumerate(zip(cold, warm), start=1):
+        print(f"{n:>6}  {c * 1000:9.1f}  {w * 1000:9.1f}")
+    print()
+    print(f"warm: first file {warm[0] * 1000:.1f} ms, "
+          f"mean of files 2..{len(warm)} {sum(warm[1:]) / max(len(warm) - 1, 1) * 1000:.1f} ms")
+    print(f"cold: mean {sum(cold) / len(cold) * 1000:.1f} ms, warm: mean {sum(warm) / len(warm) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
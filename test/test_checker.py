@@ -1,4 +1,7 @@
+import time
 import unittest
+
+from benchmarks.corpus import CorpusSpec, generate
 from wdlfmt.checker import StyleChecker, Status
 
 _HEADER = "version 1.0\n"
@@ -78,6 +81,12 @@ class TestCallAliases(unittest.TestCase):
         self.assertEqual(r.status, Status.WARN)
         self.assertIn("MyTask", r.details)
 
+    def test_each_call_needs_its_own_alias(self):
+        wdl = "workflow W {\n    call MyTask as myTask { }\n    call MyTask { }\n}\n"
+        r = self._result(wdl)
+        self.assertEqual(r.status, Status.WARN)
+        self.assertEqual([loc.line for loc in r.locations], [4])
+
 
 class TestSetPipefail(unittest.TestCase):
     def _result(self, wdl):
@@ -177,5 +186,44 @@ class TestDockerRuntime(unittest.TestCase):
         self.assertEqual(r.status, Status.WARN)
 
 
+class TestSingleScan(unittest.TestCase):
+    def test_ignores_comments_strings_and_command_scripts(self):
+        wdl = (
+            "# task bad_name {\n"
+            "task T {\n"
+            "    # parameter_meta {\n"
+            "    command <<<\n"
+            "        echo 'call foo' > runtime { docker\n"
+            "        echo \"}\"\n"
+            "    >>>\n"
+            "    String s = \"workflow lower {\"\n"
+            "}\n"
+        )
+        r = _check(wdl)
+        self.assertEqual(r["Task names are UpperCamelCase"].status, Status.PASS)
+        self.assertEqual(r["Workflow names are UpperCamelCase"].status, Status.PASS)
+        self.assertEqual(r["Call aliases are lowerCamelCase"].status, Status.PASS)
+        self.assertEqual(r["parameter_meta section present"].details, "Missing in: task 'T'")
+        self.assertEqual(r["docker defined in runtime blocks"].details, "No runtime blocks found")
+
+    def test_locations(self):
+        wdl = "task t {\n    runtime {\n        cpu: 1\n    }\n}\n"
+        r = _check(wdl)
+        loc = r["Task names are UpperCamelCase"].locations[0]
+        self.assertEqual((loc.line, loc.column, loc.end_column), (2, 5, 6))
+        loc = r["docker defined in runtime blocks"].locations[0]
+        self.assertEqual((loc.line, loc.column, loc.end_column), (3, 4, 11))
+
+    def test_large_document(self):
+        text = generate(CorpusSpec(tasks=3000))
+        self.assertGreater(text.count("\n"), 100_000)
+        start = time.perf_counter()
+        r = {r.rule: r for r in StyleChecker(text).run_all()}
+        # About a tenth of this on a laptop; the per-rule scans took seconds.
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertEqual(len(r["parameter_meta section present"].locations), 3001)
+        self.assertEqual(r["docker defined in runtime blocks"].status, Status.PASS)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,84 @@
+"""Tests for comment placement (comment_neighbours, via lowering.lower)."""
+import unittest
+from pathlib import Path
+
+from antlr4 import CommonTokenStream
+
+import wdlfmt
+from wdlfmt import syntax
+from wdlfmt.input_stream import ArrayInputStream
+from wdlfmt.lowering import lower
+from wdlfmt.parser_cache import get_parser_cache
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+
+
+def _lower(wdl):
+    """The syntax tree of `wdl`, and the text of its comment tokens."""
+    cache = get_parser_cache()
+    stream = CommonTokenStream(cache.lexer(ArrayInputStream(wdl)))
+    stream.fill()
+    comments = [t for t in stream.tokens if t.channel == 2]
+    return lower(cache.parser(stream).document(), comments), [t.text for t in comments]
+
+
+def _comments(document):
+    """The text of every comment in the syntax tree, in blocks or inline."""
+    out = []
+    stack = [document]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, syntax.Comment):
+            out.append(node.text)
+        out.extend(text for _, text in getattr(node, "inline", None) or ())
+        for name in node._fields:
+            value = getattr(node, name)
+            if isinstance(value, syntax.Node):
+                stack.append(value)
+            elif isinstance(value, list):
+                stack.extend(v for v in value if isinstance(v, syntax.Node))
+    return sorted(out)
+
+
+def _body(node, cls):
+    return [element for element in node.body if isinstance(element, cls)]
+
+
+class TestCommentPlacement(unittest.TestCase):
+    def test_every_comment_is_kept(self):
+        for path in sorted(SNAPSHOT_DIR.glob("*.wdl")):
+            document, comments = _lower(path.read_text())
+            self.assertEqual(_comments(document), sorted(comments), path.name)
+
+    def test_comment_goes_in_the_block_of_its_neighbour(self):
+        wdl = (
+            "version 1.0\n# before the task\ntask T {\n    input {\n        String a\n"
+            "        # end of the input\n    }\n    command <<< echo >>>\n    # end of the task\n}\n"
+        )
+        document, _ = _lower(wdl)
+        self.assertEqual([c.text for c in _body(document, syntax.Comment)], ["# before the task"])
+        (task,) = _body(document, syntax.Task)
+        self.assertEqual([c.text for c in _body(task, syntax.Comment)], ["# end of the task"])
+        (input,) = _body(task, syntax.Input)
+        self.assertEqual([type(e) for e in input.body], [syntax.Declaration, syntax.Comment])
+
+    def test_leading_comment_before_version(self):
+        wdl = "# leading\nversion 1.0\n\ntask T {\n    command <<< echo >>>\n}\n"
+        formatted = wdlfmt.format_wdl_str(wdl)
+        self.assertTrue(formatted.startswith("# leading\nversion 1.0\n"))
+
+    def test_many_comments_keep_order(self):
+        n = 2000
+        lines = ["version 1.0", "task T {", "    input {"]
+        for i in range(n):
+            lines += [f"        # doc {i}", f"        String s{i}"]
+        lines += ["    }", "    command <<< echo >>>", "}", ""]
+        document, _ = _lower("\n".join(lines))
+
+        (task,) = _body(document, syntax.Task)
+        (input,) = _body(task, syntax.Input)
+        self.assertEqual([c.text for c in _body(input, syntax.Comment)], [f"# doc {i}" for i in range(n)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+from dataclasses import replace
+
+import pytest
+
+import wdlfmt
+from benchmarks.corpus import CorpusSpec, generate
+from benchmarks.suite import SCENARIOS
+from wdlfmt.input_stream import ArrayInputStream
+from wdlfmt.visitor import WdlVisitor
+
+
+def test_deterministic():
+    spec = CorpusSpec(tasks=3, comment_density=0.5)
+    assert generate(spec) == generate(spec)
+    assert generate(spec) != generate(replace(spec, seed=1))
+
+
+def test_knobs():
+    base = CorpusSpec(tasks=2, comment_density=0.0)
+    assert generate(replace(base, tasks=4)).count("\ntask ") == 4
+    assert "#" not in generate(base)
+    assert generate(replace(base, comment_density=1.0)).count("# ") > 20
+    assert generate(replace(base, interpolations=7)).count("~{") == 2 * 7
+    assert generate(replace(base, nesting=3)).count("scatter (") == 2
+
+
+@pytest.mark.parametrize("name", [name for name, spec in SCENARIOS.items() if not spec.nesting])
+def test_scenarios_format_losslessly(name):
+    spec = replace(SCENARIOS[name], tasks=3)
+    wdlfmt.format_wdl_str(generate(spec), verify="full")
+
+
+def test_nested_scenario_parses():
+    spec = replace(SCENARIOS["nested"], tasks=3)
+    assert WdlVisitor(ArrayInputStream(generate(spec))).syntax_errors == 0
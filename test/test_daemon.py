@@ -0,0 +1,167 @@
+"""Tests for the wdlfmtd server, its client and `wdlfmt --daemon`."""
+import os
+import signal
+import subprocess
+import threading
+from pathlib import Path
+
+import pytest
+
+import wdlfmt
+from benchmarks.startup import HEAVY, measure
+from wdlfmt.daemon import DaemonClient, DaemonError, make_server, parse_address
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+
+
+@pytest.fixture(scope="module", params=["unix", "tcp"])
+def address(request, tmp_path_factory):
+    if request.param == "unix":
+        address = f"unix:{tmp_path_factory.mktemp('daemon') / 'wdlfmtd.sock'}"
+    else:
+        address = "127.0.0.1:0"
+    server = make_server(address, jobs=1)
+    if request.param == "tcp":
+        address = "%s:%d" % server.server_address
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield address
+    server.shutdown()
+    server.server_close()
+    server.pool.shutdown()
+
+
+def test_parse_address():
+    assert parse_address("unix:/tmp/w.sock") == ("unix", "/tmp/w.sock")
+    assert parse_address("localhost:1234") == ("tcp", ("localhost", 1234))
+    assert parse_address("1234") == ("tcp", ("127.0.0.1", 1234))
+
+
+def test_ping(address):
+    assert DaemonClient(address).ping().startswith("wdlfmtd ")
+
+
+def test_format_matches_format_wdl_str(address):
+    client = DaemonClient(address)
+    for path in sorted(SNAPSHOT_DIR.glob("*.input.wdl")):
+        source = path.read_text()
+        formatted, syntax_errors, error = client.format(source)
+        assert error is None
+        assert syntax_errors == []
+        assert formatted == wdlfmt.format_wdl_str(source)
+
+
+def test_format_already_formatted(address):
+    source = (SNAPSHOT_DIR / "md5_check.expected.wdl").read_text()
+    assert DaemonClient(address).format(source) == (source, [], None)
+
+
+def test_format_reports_syntax_errors(address):
+    formatted, syntax_errors, error = DaemonClient(address).format("version 1.0\ntask a {{\n}\n")
+    assert error is None
+    assert len(syntax_errors) == 1
+    assert syntax_errors[0].startswith("line 2:8 ")
+
+
+def test_format_error(address):
+    formatted, _, error = DaemonClient(address).format("version 1.0\nworkflow W {\n    call A\n}\n")
+    assert formatted is None
+    assert error.startswith("IndexError")
+
+
+def test_check(address):
+    source = (SNAPSHOT_DIR / "md5_check.input.wdl").read_text()
+    reply = DaemonClient(address).check(source)
+    assert reply["changed"] is True
+    expected = wdlfmt.check_style(wdlfmt.format_wdl_str(source))
+    assert [(r["rule"], r["status"]) for r in reply["results"]] == [(r.rule, r.status.value) for r in expected]
+
+
+def test_unknown_parse_mode(address):
+    formatted, _, error = DaemonClient(address).format("version 1.0\n", parse_mode="fast")
+    assert formatted is None
+    assert "unknown parse mode" in error
+
+
+def test_verify_mode(address):
+    source = (SNAPSHOT_DIR / "md5_check.input.wdl").read_text()
+    formatted, _, error = DaemonClient(address).format(source, verify="full")
+    assert error is None
+    assert formatted == wdlfmt.format_wdl_str(source)
+    formatted, _, error = DaemonClient(address).format(source, verify="slow")
+    assert formatted is None
+    assert "unknown verify mode" in error
+
+
+def test_error_reply_keeps_connection_usable(address):
+    connection = DaemonClient(address)._connection()
+    try:
+        for headers, status in [({"X-Parse-Mode": "fast"}, 400), ({"X-Verify": "slow"}, 400), ({}, 200)]:
+            connection.request("POST", "/format", body=b"version 1.0\ntask a {}\n", headers=headers)
+            response = connection.getresponse()
+            response.read()
+            assert response.status == status
+    finally:
+        connection.close()
+
+
+def test_killed_worker_is_replaced(tmp_path):
+    server = make_server(f"unix:{tmp_path / 'wdlfmtd.sock'}", jobs=2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        broken = server.pool
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+        source = (SNAPSHOT_DIR / "md5_check.expected.wdl").read_text()
+        assert DaemonClient(f"unix:{tmp_path / 'wdlfmtd.sock'}").format(source) == (source, [], None)
+        assert server.pool is not broken
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.pool.shutdown()
+
+
+def test_unreachable_daemon(tmp_path):
+    with pytest.raises(DaemonError):
+        DaemonClient(f"unix:{tmp_path / 'missing.sock'}").ping()
+
+
+def test_cli_daemon_check(address):
+    paths = sorted(SNAPSHOT_DIR.glob("*.input.wdl"))
+    result = subprocess.run(
+        ["wdlfmt", "--daemon", address, "--check", *paths], capture_output=True, text=True
+    )
+    assert result.returncode == 1
+    lines = [ln for ln in result.stderr.splitlines() if ln.startswith("would reformat")]
+    assert lines == [f"would reformat: {p}" for p in paths]
+
+
+def test_cli_daemon_does_not_load_the_parser(address):
+    path = SNAPSHOT_DIR / "md5_check.expected.wdl"
+    code = (
+        "import sys\n"
+        f"sys.argv = ['wdlfmt', '--daemon', {address!r}, '--check', {str(path)!r}]\n"
+        "from wdlfmt.cli import cli\n"
+        "cli()\n"
+    )
+    assert not measure(code).loaded & HEAVY
+
+
+def test_cli_daemon_stdout(address):
+    path = SNAPSHOT_DIR / "unicycler.input.wdl"
+    result = subprocess.run(
+        ["wdlfmt", "--daemon", address, "--no-check", str(path)], capture_output=True, text=True
+    )
+    assert result.returncode == 0
+    assert result.stdout.startswith(wdlfmt.format_wdl_str(path.read_text()))
+
+
+def test_cli_daemon_unreachable(tmp_path):
+    result = subprocess.run(
+        ["wdlfmt", "--daemon", f"unix:{tmp_path / 'missing.sock'}", str(SNAPSHOT_DIR / "md5_check.input.wdl")],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 1
+    assert "cannot reach wdlfmtd" in result.stderr
@@ -0,0 +1,84 @@
+"""Deeply nested documents format without hitting the recursion limit."""
+import sys
+
+import pytest
+from antlr4 import CommonTokenStream, InputStream
+
+import wdlfmt
+from wdlfmt import syntax
+from wdlfmt.formatters.common import comment_neighbours, index_tree_positions
+from wdlfmt.input_stream import ArrayInputStream
+from wdlfmt.parser_cache import get_parser_cache
+from wdlfmt.utils import call_with_deep_stack, node_text
+from wdlfmt.visitor import WdlVisitor, parse_document
+
+DEPTH = 10000
+
+
+def _task(expression):
+    return (
+        "version 1.0\n\ntask t {\n    input {\n"
+        f"        Int x = {expression}\n"
+        "    }\n    command <<<\n    >>>\n}\n"
+    )
+
+
+@pytest.mark.parametrize(
+    "expression",
+    [
+        "+".join(["1"] * DEPTH),
+        "!" * DEPTH + "true",
+        "[" * DEPTH + "1" + "]" * DEPTH,
+        "f(" * DEPTH + "1" + ")" * DEPTH,
+    ],
+    ids=["operators", "prefix", "arrays", "calls"],
+)
+def test_deep_expressions(expression):
+    formatted = wdlfmt.format_wdl_str(_task(expression), verify="full")
+    assert "".join(formatted.split()).count("Intx=" + expression.replace(" ", "")) == 1
+    assert sys.getrecursionlimit() < DEPTH
+
+
+def test_deep_conditionals():
+    depth = 2000
+    source = "version 1.0\n\nworkflow w {\n" + "if (true) {\n" * depth + "Int x = 1\n" + "}\n" * depth + "}\n"
+    node = WdlVisitor(ArrayInputStream(source)).document.body[1]
+    for _ in range(depth):
+        (node,) = node.body
+        assert isinstance(node, syntax.Conditional)
+    (declaration,) = node.body
+    assert declaration.name == "x"
+
+
+def test_tree_walkers_on_deep_trees():
+    source = _task("+".join(["1"] * DEPTH))
+    cache = get_parser_cache()
+    stream = CommonTokenStream(cache.lexer(InputStream(source)))
+    stream.fill()
+    tree, _ = parse_document(cache.parser(stream))
+
+    # Every node, down to the `<EOF>` at the end.
+    positions = index_tree_positions(tree)
+    assert max(positions) == stream.tokens[-1].tokenIndex
+
+    # The outermost node starting at the first `1` is the whole chain.
+    first = min(token.tokenIndex for token in stream.tokens if token.text == "1")
+    chain, _ = positions[first]
+    assert node_text(chain) == "+".join(["1"] * DEPTH)
+
+    # A comment before the chain goes before the whole chain, not before its
+    # deepest leaf.
+    ((neighbour, parent),) = comment_neighbours(tree, [first - 1])
+    assert neighbour is chain
+    assert chain in parent.children
+
+
+def test_call_with_deep_stack():
+    def depth(n):
+        return 0 if n == 0 else 1 + depth(n - 1)
+
+    limit = sys.getrecursionlimit()
+    assert call_with_deep_stack(depth, 50000) == 50000
+    assert sys.getrecursionlimit() == limit
+    with pytest.raises(ValueError):
+        call_with_deep_stack(int, "x")
@@ -0,0 +1,126 @@
+"""Tests for the persistent format cache (wdlfmt.cache and --no-cache/--cache-dir)."""
+import json
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import wdlfmt
+from wdlfmt.batch import format_files
+from wdlfmt.cache import FormatCache
+from wdlfmt.formatters.shell_formatter import get_shfmt_runner
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+
+
+def _copy(tmp_path, name):
+    dest = tmp_path / name
+    shutil.copy(SNAPSHOT_DIR / name, dest)
+    return dest
+
+
+def test_formatted_file_is_recorded_and_skipped(tmp_path):
+    path = _copy(tmp_path, "md5_check.expected.wdl")
+    cache = FormatCache(directory=tmp_path / "cache")
+    assert not cache.is_formatted(str(path))
+
+    [result] = format_files([str(path)], cache=cache)
+    assert not result.cached and not result.changed
+
+    cache = FormatCache(directory=tmp_path / "cache")
+    assert cache.is_formatted(str(path))
+    [result] = format_files([str(path)], cache=cache)
+    assert result.cached
+
+
+def test_unformatted_file_is_not_recorded(tmp_path):
+    path = _copy(tmp_path, "md5_check.input.wdl")
+    list(format_files([str(path)], cache=FormatCache(directory=tmp_path / "cache")))
+    assert not FormatCache(directory=tmp_path / "cache").is_formatted(str(path))
+
+
+def test_edit_invalidates_entry(tmp_path):
+    path = _copy(tmp_path, "md5_check.expected.wdl")
+    cache = FormatCache(directory=tmp_path)
+    cache.mark_formatted(str(path), path.read_text())
+    path.write_text(path.read_text() + "\n\n")
+    assert not cache.is_formatted(str(path))
+
+
+def test_touch_without_change_keeps_entry(tmp_path):
+    path = _copy(tmp_path, "md5_check.expected.wdl")
+    cache = FormatCache(directory=tmp_path)
+    cache.mark_formatted(str(path), path.read_text())
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert cache.is_formatted(str(path))
+
+
+def test_undecodable_file_is_a_miss(tmp_path):
+    path = _copy(tmp_path, "md5_check.expected.wdl")
+    cache = FormatCache(directory=tmp_path)
+    cache.mark_formatted(str(path), path.read_text())
+    st = path.stat()
+    path.write_bytes(b"\xff" * st.st_size)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert not cache.is_formatted(str(path))
+
+
+def test_options_use_separate_caches(tmp_path):
+    assert FormatCache({"parse_mode": "ll"}, tmp_path).path != FormatCache({}, tmp_path).path
+
+
+def test_concurrent_writers_merge(tmp_path):
+    a = _copy(tmp_path, "md5_check.expected.wdl")
+    b = _copy(tmp_path, "struct_basic.expected.wdl")
+    first, second = FormatCache(directory=tmp_path), FormatCache(directory=tmp_path)
+    first.mark_formatted(str(a), a.read_text())
+    second.mark_formatted(str(b), b.read_text())
+    first.write()
+    second.write()
+
+    entries = json.loads(second.path.read_text())
+    assert set(entries) == {str(a), str(b)}
+    assert not list(tmp_path.glob(".format-cache.*"))
+
+
+def test_format_wdl_uses_cache(tmp_path):
+    path = _copy(tmp_path, "md5_check.expected.wdl")
+    first = wdlfmt.format_wdl(str(path), return_object=True, cache=True, cache_dir=tmp_path / "c")
+    second = wdlfmt.format_wdl(str(path), return_object=True, cache=True, cache_dir=tmp_path / "c")
+    assert first.split("# Formatted by")[0] == second.split("# Formatted by")[0]
+
+
+def _check(path, *flags):
+    return subprocess.run(["wdlfmt", "--check", *flags, str(path)], capture_output=True, text=True)
+
+
+def test_cli_check_skips_cached_files(tmp_path):
+    cache_dir = tmp_path / "cache"
+    path = _copy(tmp_path, "md5_check.input.wdl")
+    # Pretend the unformatted file was recorded as formatted: a cached
+    # run must trust the record, --no-cache must not.
+    cache = FormatCache({"parse_mode": "two-stage", "shfmt": get_shfmt_runner().version}, cache_dir)
+    cache.mark_formatted(str(path), path.read_text())
+    cache.write()
+
+    assert _check(path, "--cache-dir", str(cache_dir)).returncode == 0
+    assert _check(path, "--cache-dir", str(cache_dir), "--no-cache").returncode == 1
+
+
+def test_cli_check_ignores_entries_from_another_shfmt(tmp_path):
+    cache_dir = tmp_path / "cache"
+    path = _copy(tmp_path, "md5_check.input.wdl")
+    cache = FormatCache({"parse_mode": "two-stage", "shfmt": "v0.0.0"}, cache_dir)
+    cache.mark_formatted(str(path), path.read_text())
+    cache.write()
+
+    assert _check(path, "--cache-dir", str(cache_dir)).returncode == 1
+
+
+def test_cache_dir_from_environment(tmp_path):
+    path = _copy(tmp_path, "md5_check.expected.wdl")
+    env = {**os.environ, "WDLFMT_CACHE_DIR": str(tmp_path / "envcache")}
+    result = subprocess.run(["wdlfmt", "--check", str(path)], capture_output=True, env=env)
+    assert result.returncode == 0
+    assert list((tmp_path / "envcache").glob("format-cache.*.json"))
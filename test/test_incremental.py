@@ -0,0 +1,97 @@
+import glob
+
+import pytest
+
+import wdlfmt
+from wdlfmt.incremental import IncrementalFormatter
+
+SNAPSHOTS = sorted(glob.glob("test/snapshots/*.input.wdl"))
+
+WDL = """version 1.0
+
+# A comment between elements
+task First {
+    command <<<
+        echo first
+    >>>
+}
+
+task Second {
+    input {
+        Int n = 1
+    }
+    command <<<
+        echo ~{n}
+    >>>
+}
+
+workflow Main {
+    call Second {
+        input:
+            n = 3
+    }
+}
+"""
+
+
+@pytest.mark.parametrize("path", SNAPSHOTS)
+def test_incremental_matches_full_format_after_each_line_edit(path):
+    with open(path) as f:
+        source = f.read()
+    incremental = IncrementalFormatter()
+    assert incremental.format(source) == wdlfmt.format_wdl_str(source)
+
+    lines = source.split("\n")
+    for i in range(len(lines)):
+        edited = "\n".join(lines[:i] + [lines[i] + "  "] + lines[i + 1:])
+        assert incremental.format(edited) == wdlfmt.format_wdl_str(edited)
+
+
+def test_unchanged_document_is_not_parsed_again():
+    incremental = IncrementalFormatter()
+    first = incremental.format(WDL)
+    assert incremental.format(WDL) == first
+    assert incremental.formatted == 0
+    # Only the version line and the trailing newline
+    assert incremental.parsed_chars == len("version 1.0\n") + 1
+
+
+def test_only_the_edited_element_is_formatted():
+    incremental = IncrementalFormatter()
+    incremental.format(WDL)
+
+    edited = WDL.replace("Int n = 1", "Int n = 2")
+    assert incremental.format(edited) == wdlfmt.format_wdl_str(edited)
+    assert incremental.formatted == 1
+    assert incremental.parsed_chars < len(WDL) / 2
+
+
+def test_new_element_and_comment():
+    incremental = IncrementalFormatter()
+    incremental.format(WDL)
+
+    edited = WDL.replace("task Second", "# New\ntask Third {\n    command <<< >>>\n}\n\ntask Second")
+    assert incremental.format(edited) == wdlfmt.format_wdl_str(edited)
+    assert incremental.formatted == 2
+
+
+def test_second_workflow_falls_back_to_full_format():
+    incremental = IncrementalFormatter()
+    incremental.format(WDL)
+
+    edited = WDL.replace("task First", "workflow Other {\n}\n\ntask First")
+    assert incremental.format(edited) == wdlfmt.format_wdl_str(edited)
+    assert incremental.parsed_chars == len(edited)
+
+
+def test_syntax_error_is_not_reused(capsys):
+    incremental = IncrementalFormatter()
+    incremental.format(WDL)
+
+    broken = WDL.replace("task Second {", "task Second {{")
+    assert incremental.format(broken) == wdlfmt.format_wdl_str(broken)
+    assert incremental.parsed_chars == len(broken)
+
+    # The broken version is not the base for the next edit
+    assert incremental.format(WDL) == wdlfmt.format_wdl_str(WDL)
+    assert incremental.parsed_chars == len(WDL)
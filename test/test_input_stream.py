@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+from antlr4 import CommonTokenStream, InputStream
+from antlr4.Token import Token
+
+import wdlfmt
+from wdlfmt.input_stream import ArrayInputStream, code_points
+from wdlfmt.parser_cache import get_parser_cache
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+
+NON_ASCII = """version 1.0
+
+# Überprüfung 😀
+task Greet {
+    input {
+        String greeting = "héllo 😀"
+    }
+    command <<<
+        echo "~{greeting} ✓"
+    >>>
+}
+"""
+
+
+def tokens(stream):
+    token_stream = CommonTokenStream(get_parser_cache().lexer(stream))
+    token_stream.fill()
+    return [(t.type, t.channel, t.start, t.stop, t.line, t.column, t.text) for t in token_stream.tokens]
+
+
+@pytest.mark.parametrize("text", ["", "abc", "héllo", "a😀b"])
+def test_code_points(text):
+    assert list(code_points(text)) == [ord(c) for c in text]
+
+
+def test_ascii_uses_one_byte_per_character():
+    assert code_points("version 1.0\n").itemsize == 1
+
+
+@pytest.mark.parametrize("text", ["", "ab", "é😀"])
+def test_look_ahead_matches_input_stream(text):
+    ours, theirs = ArrayInputStream(text), InputStream(text)
+    for _ in range(len(text) + 1):
+        for offset in (-2, -1, 1, 2, 3):
+            assert ours.LA(offset) == theirs.LA(offset)
+        if ours.LA(1) == Token.EOF:
+            break
+        ours.consume()
+        theirs.consume()
+
+
+@pytest.mark.parametrize(
+    "source",
+    [NON_ASCII] + [p.read_text() for p in sorted(SNAPSHOT_DIR.glob("*.input.wdl"))],
+)
+def test_lexes_like_input_stream(source):
+    assert tokens(ArrayInputStream(source)) == tokens(InputStream(source))
+
+
+def test_formats_non_ascii_source():
+    formatted = wdlfmt.format_wdl_str(NON_ASCII)
+    assert '"héllo 😀"' in formatted
+    assert "# Überprüfung 😀" in formatted
@@ -0,0 +1,140 @@
+"""Tests for parallel formatting (-j/--jobs and wdlfmt.batch)."""
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import wdlfmt
+from wdlfmt.batch import SourceText, format_files, format_many
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+
+
+def input_paths():
+    return [str(p) for p in sorted(SNAPSHOT_DIR.glob("*.input.wdl"))]
+
+
+def expected_paths():
+    return [str(p) for p in sorted(SNAPSHOT_DIR.glob("*.expected.wdl"))]
+
+
+def test_parallel_results_match_serial_and_keep_order():
+    paths = input_paths() + expected_paths()
+    serial = list(format_files(paths, jobs=1))
+    parallel = list(format_files(paths, jobs=3))
+    assert [r.path for r in parallel] == paths
+    assert [r.formatted for r in parallel] == [r.formatted for r in serial]
+
+
+def test_errors_are_reported_per_file(tmp_path):
+    missing = str(tmp_path / "missing.wdl")
+    paths = [input_paths()[0], missing, input_paths()[1]]
+    results = list(format_files(paths, jobs=2))
+    assert [r.error is None for r in results] == [True, False, True]
+    assert "FileNotFoundError" in results[1].error
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_format_many_accepts_source_text(jobs):
+    path = input_paths()[0]
+    source = Path(path).read_text()
+    results = list(format_many([SourceText(source), path], jobs=jobs, check_style=True))
+    assert results[0].path == "<string>"
+    assert results[0].formatted == wdlfmt.format_wdl_str(source)
+    assert results[0].check_results is not None
+    assert results[1].path == path
+    assert results[1].formatted == results[0].formatted
+
+
+def test_format_many_strings_are_paths(tmp_path):
+    one_line = "version 1.0"
+    [result] = format_many([one_line])
+    assert result.path == one_line
+    assert "FileNotFoundError" in result.error
+
+    path = tmp_path / "a\nb.wdl"
+    path.write_text("version 1.0\n")
+    [result] = format_many([str(path)])
+    assert result.error is None
+    assert result.path == str(path)
+
+    [result] = format_many([SourceText(one_line, path="one_line.wdl")])
+    assert result.path == "one_line.wdl"
+    assert result.formatted == wdlfmt.format_wdl_str(one_line)
+
+
+def test_format_many_bounds_work_in_flight():
+    paths = input_paths() * 4
+    taken = []
+
+    def items():
+        for path in paths:
+            taken.append(path)
+            yield path
+
+    results = format_many(items(), jobs=2, max_in_flight=3)
+    for yielded, result in enumerate(results, start=1):
+        # Nothing is taken from the input more than max_in_flight ahead of
+        # what has been yielded.
+        assert len(taken) <= yielded + 3
+        assert result.path == paths[yielded - 1]
+        assert result.error is None
+    assert yielded == len(paths)
+
+
+def test_format_many_can_be_abandoned():
+    results = format_many(input_paths() * 10, jobs=2, max_in_flight=2)
+    assert next(results).error is None
+    results.close()
+
+
+def test_format_wdl_with_jobs_returns_in_order():
+    paths = expected_paths()
+    texts = wdlfmt.format_wdl(files=paths, return_object=True, jobs=2)
+    for path, text in zip(paths, texts):
+        assert text.startswith(Path(path).read_text())
+
+
+def test_cli_check_with_jobs_is_deterministic():
+    paths = input_paths()
+    result = subprocess.run(
+        ["wdlfmt", "-j", "4", "--check", *paths], capture_output=True, text=True
+    )
+    assert result.returncode == 1
+    lines = [ln for ln in result.stderr.splitlines() if ln.startswith("would reformat")]
+    assert lines == [f"would reformat: {p}" for p in paths]
+
+
+def test_cli_check_with_jobs_passes_on_formatted_files():
+    result = subprocess.run(
+        ["wdlfmt", "-j", "4", "--check", *expected_paths()], capture_output=True, text=True
+    )
+    assert result.returncode == 0
+
+
+def test_cli_error_does_not_abort_batch(tmp_path):
+    missing = str(tmp_path / "missing.wdl")
+    paths = [expected_paths()[0], missing, expected_paths()[1]]
+    result = subprocess.run(
+        ["wdlfmt", "-j", "2", "--no-check", *paths], capture_output=True, text=True
+    )
+    assert result.returncode == 1
+    assert f"error: cannot format {missing}" in result.stderr
+    assert result.stdout.count("# Formatted by wdlfmt") == 2
+
+
+def test_cli_in_place_with_jobs(tmp_path):
+    copies = []
+    for path in input_paths():
+        copy = tmp_path / Path(path).name
+        shutil.copy(path, copy)
+        copies.append(copy)
+
+    result = subprocess.run(
+        ["wdlfmt", "-j", "2", "-i", *map(str, copies)], capture_output=True, text=True
+    )
+    assert result.returncode == 0
+    for path, copy in zip(input_paths(), copies):
+        expected = wdlfmt.format_wdl_str(Path(path).read_text())
+        assert copy.read_text().startswith(expected)
@@ -0,0 +1,73 @@
+import wdlfmt
+from wdlfmt.formatters.layout import HARDLINE, LINE, SOFTLINE, fill, group, join, lines, nest, render
+from wdlfmt.input_stream import ArrayInputStream
+from wdlfmt.visitor import WdlVisitor
+
+
+def _args(*args):
+    return group("f(", nest(4, SOFTLINE, join([",", LINE], args)), SOFTLINE, ")")
+
+
+def test_group_fits_flat():
+    assert render(_args("a", "b")) == "f(a, b)"
+
+
+def test_group_breaks_when_too_wide():
+    assert render(_args("aaaa", "bbbb"), width=8) == "f(\n    aaaa,\n    bbbb\n)"
+
+
+def test_width_counts_text_after_the_group():
+    doc = [_args("a", "b"), " + tail"]
+    assert render(doc, width=14) == "f(a, b) + tail"
+    assert render(doc, width=13) == "f(\n    a,\n    b\n) + tail"
+
+
+def test_hardline_breaks_its_groups():
+    assert render(group("a", LINE, "b", HARDLINE, "c")) == "a\nb\nc"
+
+
+def test_nest_indents_blank_lines_and_start():
+    doc = ["{", nest(4, HARDLINE, "a", HARDLINE, "", HARDLINE, "b"), HARDLINE, "}"]
+    assert render(doc, indent=4) == "    {\n        a\n        \n        b\n    }"
+
+
+def test_fill_breaks_only_where_needed():
+    assert render(nest(4, fill(["aaa", "bbb", "ccc", "ddd"])), width=8) == "aaa bbb\n    ccc\n    ddd"
+
+
+def test_lines():
+    assert render(nest(2, lines("a\n\nb\n"))) == "a\n  \n  b"
+
+
+def test_deep_documents():
+    doc = "x"
+    for _ in range(20000):
+        doc = group("(", nest(1, doc), ")")
+    assert render(doc) == "(" * 20000 + "x" + ")" * 20000
+
+
+def _expression(wdl_expression):
+    source = f"version 1.0\ntask t {{\n    input {{\n        Int x = {wdl_expression}\n    }}\n}}\n"
+    task = WdlVisitor(ArrayInputStream(source)).document.body[1]
+    return task.body[0].body[0].expression
+
+
+def test_expression_breaks():
+    expression = _expression('f(a, -b) + "x,${y + 1}"')
+    assert expression.text == 'f(a,-b)+"x,${y+1}"'
+    # After the comma and `+`; not after unary minus or inside the string.
+    assert [expression.text[:i] for i in expression.breaks] == ["f(a,", "f(a,-b)+"]
+    assert _expression("1 + # note\n 2").breaks == ()
+
+
+def test_long_expressions_fit_the_line():
+    terms = "+".join(f"value{i}" for i in range(40))
+    source = (
+        "version 1.0\n\ntask t {\n    input {\n"
+        f"        Int x = max({terms}, 1)\n"
+        "    }\n    command <<<\n    >>>\n}\n"
+    )
+    formatted = wdlfmt.format_wdl_str(source, verify="full")
+    assert all(len(line) <= 100 for line in formatted.splitlines())
+    assert "".join(formatted.split()).count(f"Intx=max({terms},1)") == 1
+    assert wdlfmt.format_wdl_str(formatted) == formatted
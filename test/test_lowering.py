@@ -0,0 +1,107 @@
+import gc
+
+from wdlfmt import syntax
+from wdlfmt.grammar.WdlV1Parser import WdlV1Parser
+from wdlfmt.input_stream import ArrayInputStream
+from wdlfmt.visitor import WdlVisitor
+
+WDL = """# leading
+version 1.0
+
+struct Numbers { # after brace
+    Array[ Int ]   # between
+        numbers
+}
+
+task t {
+    input {
+        # first
+        Int a = 1 + # mid
+            2
+    }
+    command <<<
+        echo ~{a}
+    >>>
+    runtime {
+        docker: 'ubuntu'
+    }
+}
+
+workflow w {
+    call t as u {
+        input: a = 1
+    }
+}
+# trailing
+"""
+
+
+def _document(wdl=WDL) -> syntax.Document:
+    return WdlVisitor(ArrayInputStream(wdl)).document
+
+
+def test_elements_and_spans():
+    document = _document()
+    kinds = [type(node) for node in document.body]
+    assert kinds == [syntax.Comment, syntax.Version, syntax.Struct, syntax.Task, syntax.Workflow, syntax.Comment]
+    assert [WDL[node.start:node.stop].split()[0] for node in document.body] == [
+        "#", "version", "struct", "task", "workflow", "#"
+    ]
+    workflow = document.body[4]
+    assert WDL[workflow.start:workflow.stop].endswith("}\n}")
+    assert workflow.stop - workflow.start == len("workflow w {\n    call t as u {\n        input: a = 1\n    }\n}")
+
+
+def test_token_ranges():
+    visitor = WdlVisitor(ArrayInputStream(WDL))
+    task = visitor.document.body[3]
+    tokens = visitor.tokens[task.token_start:task.token_stop]
+    assert tokens[0].text == "task"
+    assert tokens[-1].text == "}"
+    assert "".join(token.text for token in tokens) == WDL[task.start:task.stop]
+
+
+def test_comments_are_attached_where_they_are():
+    struct, task = _document().body[2:4]
+    assert isinstance(struct.body[0], syntax.Comment)
+    member = struct.body[1]
+    assert member.parts() == ["Array[ Int ]", "# between", "numbers"]
+
+    declaration = task.body[0].body[1]
+    assert task.body[0].body[0].text == "# first"
+    assert declaration.parts() == ["Int", "a", "=", "1+# mid2"]
+
+
+def test_sections():
+    _, _, _, task, workflow, _ = _document().body
+    command, runtime = task.body[1:]
+    assert command.script == "echo ~{a}\n"
+    assert not command.dollar_interpolation
+    assert [(entry.key, entry.value.text) for entry in runtime.body] == [("docker", "'ubuntu'")]
+
+    call = workflow.body[0]
+    assert (call.target, call.alias) == ("t", "u")
+    (inputs,) = call.body
+    assert [(i.name, i.expression.text) for i in inputs.body] == [("a", "1")]
+
+
+def test_call_without_body():
+    call = _document("version 1.0\nworkflow w {\n    call t\n}\n").body[1].body[0]
+    assert call.body is None
+
+
+def test_nodes_have_no_dict():
+    for node in _document().body:
+        assert not hasattr(node, "__dict__")
+
+
+def _parse_trees():
+    gc.collect()
+    return sum(isinstance(o, WdlV1Parser.DocumentContext) for o in gc.get_objects())
+
+
+def test_parse_tree_is_released():
+    before = _parse_trees()
+    visitor = WdlVisitor(ArrayInputStream(WDL))
+    assert _parse_trees() == before
+    assert visitor.document.body
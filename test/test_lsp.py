@@ -0,0 +1,263 @@
+"""Tests for the `wdlfmt-lsp` language server."""
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import wdlfmt
+from wdlfmt.lsp import METHOD_NOT_FOUND, LanguageServer, read_message, write_message
+
+URI = "file:///work/main.wdl"
+
+WDL = """version 1.0
+
+task first_task {
+    command <<<
+        echo first
+    >>>
+}
+
+task Second {
+    input {
+        Int n = 1
+    }
+    command <<< echo ~{n} >>>
+    runtime {
+        docker: "debian"
+    }
+}
+"""
+
+
+class Client:
+    """Drives a `LanguageServer` in-process, collecting what it sends."""
+
+    def __init__(self, debounce=None, **initialize):
+        self.sent = []
+        self.server = LanguageServer(self.sent.append, debounce=debounce)
+        self.next_id = 0
+        self.request("initialize", {"capabilities": {}, **initialize})
+        self.notify("initialized", {})
+
+    def request(self, method, params):
+        self.next_id += 1
+        self.server.handle({"jsonrpc": "2.0", "id": self.next_id, "method": method, "params": params})
+        return next(m for m in reversed(self.sent) if m.get("id") == self.next_id)
+
+    def notify(self, method, params):
+        self.server.handle({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def open(self, text, uri=URI):
+        self.notify("textDocument/didOpen", {"textDocument": {"uri": uri, "version": 1, "text": text}})
+
+    def change(self, version, *changes, uri=URI):
+        self.notify(
+            "textDocument/didChange",
+            {"textDocument": {"uri": uri, "version": version}, "contentChanges": list(changes)},
+        )
+
+    def diagnostics(self, uri=URI):
+        published = [
+            m["params"] for m in self.sent
+            if m.get("method") == "textDocument/publishDiagnostics" and m["params"]["uri"] == uri
+        ]
+        return published[-1]["diagnostics"]
+
+
+def _apply(text, edits):
+    lines = text.split("\n")
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line) + 1)
+
+    def offset(position):
+        return offsets[position["line"]] + position["character"]
+
+    for edit in sorted(edits, key=lambda e: offset(e["range"]["start"]), reverse=True):
+        text = text[:offset(edit["range"]["start"])] + edit["newText"] + text[offset(edit["range"]["end"]):]
+    return text
+
+
+def test_initialize_advertises_formatting():
+    client = Client()
+    result = client.sent[0]["result"]
+    assert result["capabilities"]["documentFormattingProvider"] is True
+    assert result["capabilities"]["documentRangeFormattingProvider"] is True
+    assert result["capabilities"]["textDocumentSync"]["change"] == 2
+    assert result["capabilities"]["positionEncoding"] == "utf-16"
+
+
+def test_formatting_matches_format_wdl_str():
+    client = Client()
+    client.open(WDL)
+    edits = client.request("textDocument/formatting", {"textDocument": {"uri": URI}, "options": {}})["result"]
+    assert _apply(WDL, edits) == wdlfmt.format_wdl_str(WDL)
+
+
+def test_formatting_formatted_document_has_no_edits():
+    client = Client()
+    client.open(wdlfmt.format_wdl_str(WDL))
+    assert client.request("textDocument/formatting", {"textDocument": {"uri": URI}, "options": {}})["result"] == []
+
+
+def test_range_formatting_only_touches_overlapping_elements():
+    client = Client()
+    client.open(WDL)
+    line = WDL.split("\n").index("task Second {")
+    params = {
+        "textDocument": {"uri": URI},
+        "range": {"start": {"line": line + 1, "character": 0}, "end": {"line": line + 2, "character": 0}},
+        "options": {},
+    }
+    edits = client.request("textDocument/rangeFormatting", params)["result"]
+    assert len(edits) == 1
+    assert edits[0]["range"]["start"] == {"line": line, "character": 0}
+    formatted = _apply(WDL, edits)
+    assert formatted.startswith(WDL[:WDL.index("task Second")])
+    assert "    command <<<\n        echo ~{n}\n    >>>" in formatted
+
+
+def test_range_formatting_is_idempotent():
+    text = (Path(__file__).parent / "snapshots" / "full_example.input.wdl").read_text()
+    client = Client()
+    client.open(text)
+    whole = {"start": {"line": 0, "character": 0}, "end": {"line": text.count("\n"), "character": 0}}
+    for version in range(2, 4):
+        params = {"textDocument": {"uri": URI}, "range": whole, "options": {}}
+        edits = client.request("textDocument/rangeFormatting", params)["result"]
+        if not edits:
+            break
+        text = _apply(text, edits)
+        client.change(version, {"text": text})
+    assert edits == []
+
+
+def test_style_diagnostics_have_ranges():
+    client = Client()
+    client.open(WDL)
+    diagnostics = client.diagnostics()
+    naming = [d for d in diagnostics if d["message"].startswith("Task names are UpperCamelCase")]
+    assert len(naming) == 1
+    assert naming[0]["range"] == {"start": {"line": 2, "character": 5}, "end": {"line": 2, "character": 15}}
+    assert naming[0]["severity"] == 2
+    assert all(d["source"] == "wdlfmt" for d in diagnostics)
+
+
+def test_incremental_changes_update_diagnostics():
+    client = Client()
+    client.open(WDL)
+    # Rename first_task to FirstTask.
+    client.change(2, {
+        "range": {"start": {"line": 2, "character": 5}, "end": {"line": 2, "character": 15}},
+        "text": "FirstTask",
+    })
+    assert client.server.documents[URI].text == WDL.replace("first_task", "FirstTask")
+    assert not any(d["message"].startswith("Task names") for d in client.diagnostics())
+
+
+def test_syntax_errors_are_diagnostics_and_block_formatting():
+    client = Client()
+    client.open("version 1.0\ntask a {{\n}\n")
+    errors = [d for d in client.diagnostics() if d["severity"] == 1]
+    assert len(errors) == 1
+    assert errors[0]["range"]["start"] == {"line": 1, "character": 8}
+    assert client.request("textDocument/formatting", {"textDocument": {"uri": URI}, "options": {}})["result"] == []
+
+
+def test_utf16_positions():
+    client = Client()
+    text = 'version 1.0\n\n# \U0001F600 é\ntask x {\n    command <<< echo >>>\n}\n'
+    client.open(text)
+    # The emoji is two UTF-16 code units, so "é" starts at character 5.
+    client.change(2, {
+        "range": {"start": {"line": 2, "character": 5}, "end": {"line": 2, "character": 6}},
+        "text": "e",
+    })
+    assert client.server.documents[URI].text == text.replace("é", "e")
+
+
+def test_utf32_is_used_when_offered():
+    client = Client(capabilities={"general": {"positionEncodings": ["utf-32", "utf-16"]}})
+    assert client.sent[0]["result"]["capabilities"]["positionEncoding"] == "utf-32"
+
+
+def test_debounced_diagnostics_are_published_once():
+    client = Client(initializationOptions={"debounce": 50})
+    client.open(WDL)
+    for version in range(2, 6):
+        client.change(version, {"text": WDL})
+    time.sleep(0.5)
+    published = [m for m in client.sent if m.get("method") == "textDocument/publishDiagnostics"]
+    assert len(published) == 1
+    assert published[0]["params"]["version"] == 5
+
+
+def test_unknown_request():
+    client = Client()
+    response = client.request("textDocument/hover", {})
+    assert response["error"]["code"] == METHOD_NOT_FOUND
+
+
+def test_closing_clears_diagnostics():
+    client = Client()
+    client.open(WDL)
+    client.notify("textDocument/didClose", {"textDocument": {"uri": URI}})
+    assert client.diagnostics() == []
+    assert URI not in client.server.documents
+
+
+def test_stdio_session(tmp_path):
+    stdin = tmp_path / "stdin"
+    with open(stdin, "wb") as f:
+        for id, method, params in [
+            (1, "initialize", {"capabilities": {}}),
+            (None, "initialized", {}),
+            (None, "textDocument/didOpen", {"textDocument": {"uri": URI, "version": 1, "text": WDL}}),
+            (2, "textDocument/formatting", {"textDocument": {"uri": URI}, "options": {}}),
+            (3, "shutdown", None),
+            (None, "exit", None),
+        ]:
+            message = {"jsonrpc": "2.0", "method": method, "params": params}
+            if id is not None:
+                message["id"] = id
+            write_message(f, message)
+
+    with open(stdin, "rb") as f:
+        process = subprocess.run(
+            [sys.executable, "-m", "wdlfmt.lsp", "--debounce", "0"], stdin=f, capture_output=True, timeout=60
+        )
+    assert process.returncode == 0, process.stderr.decode()
+
+    stdout = tmp_path / "stdout"
+    stdout.write_bytes(process.stdout)
+    messages = []
+    with open(stdout, "rb") as f:
+        while (message := read_message(f)) is not None:
+            messages.append(message)
+    responses = {m["id"]: m for m in messages if "id" in m}
+    assert _apply(WDL, responses[2]["result"]) == wdlfmt.format_wdl_str(WDL)
+    assert any(m.get("method") == "textDocument/publishDiagnostics" for m in messages)
+
+
+@pytest.mark.parametrize("lines", [5000])
+def test_diagnostics_after_an_edit_are_fast(lines):
+    tasks = []
+    for i in range(lines // 12):
+        tasks.append(f"task T{i} {{\n    input {{\n        Int n = {i}\n    }}\n    command <<<\n"
+                     f"        echo ~{{n}}\n    >>>\n    runtime {{\n        docker: \"debian\"\n    }}\n}}\n")
+    text = "version 1.0\n\n" + "\n".join(tasks)
+    client = Client()
+    client.open(text)
+
+    line = text.split("\n").index("        Int n = 7")
+    start = time.perf_counter()
+    client.change(2, {
+        "range": {"start": {"line": line, "character": 16}, "end": {"line": line, "character": 17}},
+        "text": "8",
+    })
+    elapsed = time.perf_counter() - start
+    assert client.server.documents[URI].formatter.reused > 0
+    # Generous bound so slow CI machines pass; typically a few milliseconds.
+    assert elapsed < 0.5
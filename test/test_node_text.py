@@ -0,0 +1,63 @@
+from pathlib import Path
+
+import pytest
+from antlr4 import CommonTokenStream
+from antlr4.tree.Tree import TerminalNode
+
+from wdlfmt.input_stream import ArrayInputStream
+from wdlfmt.parser_cache import get_parser_cache
+from wdlfmt.utils import join_text, node_text
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+
+COMMENT_IN_EXPRESSION = """version 1.0
+
+workflow Main {
+    input {
+        Array[Int] numbers = [1, # one
+            2,   3]
+        String s = "a  b ~{x}"
+    }
+}
+"""
+
+
+def _parse(source):
+    """The parse tree of `source`, and its comment tokens."""
+    cache = get_parser_cache()
+    stream = CommonTokenStream(cache.lexer(ArrayInputStream(source)))
+    stream.fill()
+    comments = [t for t in stream.tokens if t.channel == 2]
+    return cache.parser(stream).document(), comments
+
+
+def walk(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node
+        stack.extend(getattr(node, "children", None) or [])
+
+
+@pytest.mark.parametrize("path", [None] + sorted(SNAPSHOT_DIR.glob("*.input.wdl")), ids=lambda p: getattr(p, "name", p))
+def test_node_text_matches_get_text(path):
+    source = path.read_text() if path else COMMENT_IN_EXPRESSION
+    tree, comments = _parse(source)
+    for node in walk(tree):
+        if node is tree or isinstance(node, TerminalNode):
+            assert node_text(node) == node.getText()
+            continue
+        # `getText()`, with the comments inside the node where they are in
+        # the source.
+        start, stop = node.start.tokenIndex, node.stop.tokenIndex
+        tokens = [leaf.symbol for leaf in walk(node) if isinstance(leaf, TerminalNode)]
+        tokens += [t for t in comments if start <= t.tokenIndex <= stop]
+        assert node_text(node) == "".join(t.text for t in sorted(tokens, key=lambda t: t.tokenIndex))
+
+
+def test_join_text():
+    tree, _ = _parse(COMMENT_IN_EXPRESSION)
+    declaration = next(
+        node for node in walk(tree) if type(node).__name__ == "Bound_declsContext" and "numbers" in node.getText()
+    )
+    assert join_text(declaration.children) == "Array[Int] numbers = [1,# one2,3]"
@@ -0,0 +1,62 @@
+import subprocess
+import unittest
+from pathlib import Path
+
+from antlr4 import CommonTokenStream, InputStream
+
+import wdlfmt
+from wdlfmt.parser_cache import get_parser_cache
+from wdlfmt.visitor import WdlVisitor, parse_document
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+
+
+def _parser(wdl):
+    cache = get_parser_cache()
+    stream = CommonTokenStream(cache.lexer(InputStream(wdl)))
+    parser = cache.parser(stream)
+    parser.removeErrorListeners()
+    return parser
+
+
+class TestParseMode(unittest.TestCase):
+    def test_two_stage_matches_ll(self):
+        for path in sorted(SNAPSHOT_DIR.glob("*.input.wdl")):
+            wdl = path.read_text()
+            self.assertEqual(
+                wdlfmt.format_wdl_str(wdl, parse_mode="two-stage"),
+                wdlfmt.format_wdl_str(wdl, parse_mode="ll"),
+                path.name,
+            )
+
+    def test_valid_document_parses_with_sll(self):
+        visitor = WdlVisitor(InputStream((SNAPSHOT_DIR / "md5_check.input.wdl").read_text()))
+        self.assertEqual(visitor.parse_stage, "sll")
+
+    def test_ll_mode_skips_sll(self):
+        _, stage = parse_document(_parser("version 1.0\n"), mode="ll")
+        self.assertEqual(stage, "ll")
+
+    def test_syntax_error_falls_back_to_ll(self):
+        parser = _parser("version 1.0\ntask T {\n    runtime {\n        cpu:\n    }\n}\n")
+        tree, stage = parse_document(parser)
+        self.assertEqual(stage, "ll")
+        # The LL pass uses the default strategy, so errors are recovered from.
+        self.assertGreater(parser.getNumberOfSyntaxErrors(), 0)
+        self.assertIsNotNone(tree)
+
+    def test_unknown_mode_raises(self):
+        with self.assertRaises(ValueError):
+            parse_document(_parser("version 1.0\n"), mode="sll-only")
+
+    def test_cli_reports_parse_stats(self):
+        path = str(SNAPSHOT_DIR / "md5_check.expected.wdl")
+        result = subprocess.run(
+            ["wdlfmt", "--no-cache", "--check", "--parse-stats", path], capture_output=True, text=True
+        )
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("Parse stages: 1 SLL, 0 LL", result.stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import wdlfmt
+from wdlfmt import parser_cache
+from wdlfmt.parser_cache import ParserCache, configure_parser_cache, get_parser_cache
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+
+
+class TestParserCache(unittest.TestCase):
+    def tearDown(self):
+        parser_cache._cache = None
+
+    def test_cache_is_shared_across_documents(self):
+        cache = configure_parser_cache(max_states=10**9)
+        wdl = (SNAPSHOT_DIR / "md5_check.input.wdl").read_text()
+        wdlfmt.format_wdl_str(wdl)
+        learned = cache.size()
+        self.assertGreater(learned, 0)
+
+        wdlfmt.format_wdl_str(wdl)
+        self.assertIs(get_parser_cache(), cache)
+        self.assertEqual(cache.documents, 2)
+        self.assertEqual(cache.resets, 0)
+        # Nothing new to learn from the same document.
+        self.assertEqual(cache.size(), learned)
+
+    def test_ceiling_resets_cache(self):
+        cache = configure_parser_cache(max_states=0)
+        # Verifying lexes the output again, which would reset a second time.
+        wdlfmt.format_wdl_str((SNAPSHOT_DIR / "md5_check.input.wdl").read_text(), verify="off")
+        self.assertEqual(cache.resets, 1)
+        self.assertEqual(cache.size(), 0)
+
+    def test_warm_and_cold_output_match(self):
+        for path in sorted(SNAPSHOT_DIR.glob("*.input.wdl")):
+            wdl = path.read_text()
+            configure_parser_cache(max_states=0)
+            cold = wdlfmt.format_wdl_str(wdl)
+            configure_parser_cache(max_states=10**9)
+            wdlfmt.format_wdl_str(wdl)
+            warm = wdlfmt.format_wdl_str(wdl)
+            self.assertEqual(cold, warm, path.name)
+
+    def test_max_states_from_environment(self):
+        with mock.patch.dict(os.environ, {parser_cache.MAX_STATES_ENV: "42"}):
+            self.assertEqual(ParserCache().max_states, 42)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import pickle
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+import wdlfmt
+from wdlfmt import parser_cache, parser_state
+from wdlfmt.parser_cache import ParserCache, configure_parser_cache
+from wdlfmt.parser_state import dumps_state, load_state, loads_state, save_state, state_key, state_path
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+INPUTS = sorted(SNAPSHOT_DIR.glob("*.input.wdl"))
+
+
+@pytest.fixture(autouse=True)
+def fresh_parser_cache():
+    yield
+    parser_cache._cache = None
+
+
+def _learn(paths=INPUTS) -> ParserCache:
+    cache = configure_parser_cache(max_states=10**9)
+    for path in paths:
+        wdlfmt.format_wdl_str(path.read_text())
+    return cache
+
+
+def test_loaded_state_predicts_like_the_saved_one():
+    learned = _learn()
+    size = learned.size()
+
+    cache = configure_parser_cache(max_states=10**9)
+    loads_state(cache, dumps_state(learned))
+    assert cache.size() == size
+    for path in INPUTS:
+        expected = SNAPSHOT_DIR / path.name.replace(".input.", ".expected.")
+        assert wdlfmt.format_wdl_str(path.read_text()) == expected.read_text()
+    # Every prediction was found in the loaded state.
+    assert cache.size() == size
+
+
+# Loads the state in a process with a different string hash seed and reports
+# how many states formatting the snapshots adds to it.
+_LOAD = """
+import sys
+from pathlib import Path
+import wdlfmt
+from wdlfmt.parser_cache import configure_parser_cache
+from wdlfmt.parser_state import load_state
+
+cache = configure_parser_cache(max_states=10**9)
+assert load_state(cache, sys.argv[1])
+before = cache.size()
+for path in sys.argv[2:]:
+    wdlfmt.format_wdl_str(Path(path).read_text())
+print(cache.size() - before)
+"""
+
+
+def test_state_is_valid_in_another_process(tmp_path):
+    path = tmp_path / "state.pickle"
+    assert save_state(_learn(), path)
+    env = dict(os.environ, PYTHONHASHSEED="12345")
+    completed = subprocess.run(
+        [sys.executable, "-c", _LOAD, str(path), *map(str, INPUTS)], env=env, capture_output=True, text=True
+    )
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.strip() == "0"
+
+
+def test_only_a_larger_state_replaces_the_file(tmp_path):
+    path = tmp_path / "state.pickle"
+    assert save_state(_learn(), path)
+    saved = path.read_bytes()
+    assert not save_state(_learn(INPUTS[:1]), path)
+    assert path.read_bytes() == saved
+
+
+def test_unusable_files_are_ignored(tmp_path):
+    cache = ParserCache()
+    assert not load_state(cache, tmp_path / "missing.pickle")
+
+    corrupt = tmp_path / "corrupt.pickle"
+    corrupt.write_bytes(dumps_state(_learn())[:-100])
+    assert not load_state(cache, corrupt)
+
+    foreign = tmp_path / "foreign.pickle"
+    foreign.write_bytes(pickle.dumps({"size": 1}) + pickle.dumps(os.system))
+    assert not load_state(cache, foreign)
+    assert cache.size() == 0
+
+
+def test_key_changes_with_the_grammar(tmp_path, monkeypatch):
+    grammar = tmp_path / "grammar"
+    shutil.copytree(parser_state._GRAMMAR_DIR, grammar)
+    monkeypatch.setattr(parser_state, "_GRAMMAR_DIR", grammar)
+    key = state_key()
+    assert state_path(tmp_path).name == f"parser-state.{key}.pickle"
+
+    with open(grammar / "WdlV1Parser.g4", "a") as f:
+        f.write("\n")
+    assert state_key() != key
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_cli_warm_start(tmp_path, jobs):
+    for path in INPUTS:
+        shutil.copy(path, tmp_path / path.name)
+    cache_dir = tmp_path / "cache"
+    command = ["wdlfmt", "--warm-start", "--cache-dir", str(cache_dir), "--check", "-j", jobs]
+    completed = subprocess.run(command + sorted(map(str, tmp_path.glob("*.wdl"))), capture_output=True, text=True)
+    assert completed.returncode == 1, completed.stderr
+    assert "would reformat" in completed.stderr
+
+    cache = ParserCache(max_states=10**9)
+    assert load_state(cache, state_path(cache_dir))
+    assert cache.size() > 0
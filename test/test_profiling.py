@@ -0,0 +1,111 @@
+import json
+import subprocess
+import time
+from pathlib import Path
+
+import pytest
+
+import wdlfmt
+from wdlfmt import profiling
+from wdlfmt.cache import FormatCache
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+SOURCE = (SNAPSHOT_DIR / "md5_check.input.wdl").read_text()
+
+
+def test_disabled_by_default():
+    assert not profiling.enabled()
+    assert profiling.stage("lex") is profiling.stage("parse")
+    profiling.count("tokens")
+
+
+def test_collects_stages_and_counters():
+    with profiling.collect() as profile:
+        wdlfmt.check_style(wdlfmt.format_wdl_str(SOURCE))
+    assert not profiling.enabled()
+    # shfmt only shows up if the command block was not cached yet.
+    assert set(profile.seconds) >= set(profiling.STAGES) - {"shfmt"}
+    assert profile.counts["documents"] == 1
+    assert profile.counts["characters"] == len(SOURCE)
+    assert profile.counts["parse_sll"] == 1
+    assert profile.counts["tokens"] > profile.counts["comments"] > 0
+    assert profile.counts["style_checks"] == 12
+    assert profile.counts["shfmt_cache_hits"] + profile.counts["shfmt_cache_misses"] == 1
+
+
+def test_stage_times_are_exclusive():
+    with profiling.collect() as profile:
+        with profiling.stage("format"):
+            time.sleep(0.02)
+            with profiling.stage("shfmt"):
+                time.sleep(0.05)
+    assert profile.seconds["shfmt"] >= 0.05
+    assert 0.02 <= profile.seconds["format"] < 0.05
+    assert sum(profile.seconds.values()) <= profile.total
+
+
+def test_nested_collect_adds_to_outer():
+    with profiling.collect() as outer:
+        profiling.count("tokens", 2)
+        with profiling.collect() as inner:
+            profiling.count("tokens", 3)
+    assert inner.counts["tokens"] == 3
+    assert outer.counts["tokens"] == 5
+
+
+def test_full_verification_is_not_counted_as_a_document():
+    with profiling.collect() as profile:
+        wdlfmt.format_wdl_str(SOURCE, verify="full")
+    assert profile.counts["documents"] == 1
+    assert profile.seconds["verify"] > 0
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_format_many_attaches_profiles(jobs):
+    results = list(wdlfmt.format_many([wdlfmt.SourceText(SOURCE)] * 2, jobs=jobs, profile=True))
+    assert [r.profile.counts["documents"] for r in results] == [1, 1]
+    assert all(r.profile.seconds["parse"] > 0 for r in results)
+    assert wdlfmt.batch.format_text(SOURCE).profile is None
+
+
+def test_hooks(tmp_path):
+    path = tmp_path / "formatted.wdl"
+    path.write_text(wdlfmt.format_wdl_str(SOURCE))
+    cache = FormatCache(directory=tmp_path / "cache")
+    seen = []
+
+    def hook(path, profile):
+        seen.append((path, dict(profile.counts)))
+
+    profiling.add_hook(hook)
+    try:
+        list(wdlfmt.format_many([wdlfmt.SourceText(SOURCE), path], cache=cache))
+        list(wdlfmt.format_many([path], cache=cache))
+    finally:
+        profiling.remove_hook(hook)
+    assert [p for p, _ in seen] == ["<string>", str(path), str(path)]
+    assert seen[0][1]["documents"] == 1
+    assert seen[2][1] == {"format_cache_hits": 1}
+
+
+def test_table_and_json():
+    with profiling.collect() as profile:
+        wdlfmt.format_wdl_str(SOURCE)
+    table = profile.format_table()
+    assert table.splitlines()[0].split() == ["stage", "seconds", "share"]
+    assert "tokens" in table
+    data = json.loads(profile.to_json())
+    assert data["counts"]["documents"] == 1
+    assert data["seconds"].keys() == profile.seconds.keys()
+
+
+def test_cli_profile(tmp_path):
+    report = tmp_path / "profile.json"
+    paths = [str(p) for p in sorted(SNAPSHOT_DIR.glob("*.input.wdl"))]
+    result = subprocess.run(
+        ["wdlfmt", "--no-cache", "--check", "-j", "2", "--profile-json", str(report), *paths],
+        capture_output=True,
+        text=True,
+    )
+    assert "parse" in result.stderr and "shfmt_processes" in result.stderr
+    assert json.loads(report.read_text())["counts"]["documents"] == len(paths)
@@ -0,0 +1,67 @@
+import unittest
+
+import wdlfmt  # noqa: F401  (imports and registers the built-in formatters)
+from wdlfmt import syntax
+from wdlfmt.formatters.common import (
+    Formatter,
+    FormatterRegistry,
+    all_formatters,
+    collect_formatters,
+    public_formatters,
+    register_formatter,
+    registry,
+)
+
+
+class TestFormatterRegistry(unittest.TestCase):
+    def test_tables_are_keyed_by_type(self):
+        self.assertIn(syntax.Task, public_formatters())
+        self.assertIn(syntax.Comment, public_formatters())
+        self.assertIn(syntax.Expression, all_formatters())
+        self.assertNotIn(syntax.Expression, public_formatters())
+
+    def test_tables_are_read_only(self):
+        with self.assertRaises(TypeError):
+            all_formatters()[syntax.Task] = None
+
+    def test_formatters_are_shared_instances(self):
+        table = all_formatters()
+        self.assertIs(table[syntax.Input], public_formatters()[syntax.Input])
+        self.assertIs(table, all_formatters())
+
+    def test_registration_replaces_and_snapshots_stay_fixed(self):
+        local = FormatterRegistry()
+        local._classes = list(registry._classes)
+        before = local.all
+
+        class Override(Formatter):
+            formats = syntax.Version
+            public = True
+
+            def format(self, input, indent=0):
+                return "override"
+
+        # Defining the subclass registered it globally; undo that.
+        registry._classes.remove(Override)
+        registry._all = registry._public = None
+
+        local.register(Override)
+        self.assertIsInstance(local.all[syntax.Version], Override)
+        self.assertNotIsInstance(before[syntax.Version], Override)
+        self.assertNotIsInstance(all_formatters()[syntax.Version], Override)
+
+    def test_register_formatter_is_a_decorator(self):
+        table = all_formatters()
+        cls = type(table[syntax.Struct])
+        self.assertIs(register_formatter(cls), cls)
+        registry._classes.pop()
+        registry._all = registry._public = None
+
+    def test_collect_formatters_keeps_string_keys(self):
+        self.assertIn(str(syntax.Task), collect_formatters())
+        self.assertIn(str(syntax.Expression), collect_formatters(False))
+        self.assertNotIn(str(syntax.Expression), collect_formatters())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -18,3 +18,200 @@ def test_shfmt_substitution(input):
     output = formatter.format()
 
     utils.assert_text_equal(output, input)
+
+
+SCRIPTS = [
+    "echo a;echo b\n\n\n",
+    "if true; then\nfoo | \nbar\nfi",
+    "   \n",
+    "x=1 # a",
+    "yyyyyyy=2 # b\nz=1 # c",
+    "cat <<EOF\n  indented\nEOF\n",
+]
+
+
+def test_shfmt_batch_matches_single_runs():
+    runner = sf.ShfmtRunner()
+    single = [runner.format(script) for script in SCRIPTS]
+
+    runner = sf.ShfmtRunner()
+    runner.version
+    runner.processes = 0
+    assert runner.format_many(SCRIPTS) == single
+    # One batch, plus the heredoc on its own
+    assert runner.processes == 2
+    assert runner.fallbacks == 0
+
+
+def test_shfmt_batch_falls_back_when_worker_dies(monkeypatch):
+    runner = sf.ShfmtRunner()
+    expected = [runner.format(script) for script in SCRIPTS]
+    run = sf.subprocess.run
+
+    def killed_on_batch(args, input, **kwargs):
+        if b"WDLFMT_SHFMT_SEPARATOR" in input:
+            raise sf.subprocess.CalledProcessError(-9, args)
+        return run(args, input=input, **kwargs)
+
+    monkeypatch.setattr(sf.subprocess, "run", killed_on_batch)
+    runner = sf.ShfmtRunner()
+    assert runner.format_many(SCRIPTS) == expected
+    assert runner.fallbacks == 1
+
+
+def test_shfmt_batch_falls_back_on_lost_separator(monkeypatch):
+    expected = [sf.ShfmtRunner().format(script) for script in SCRIPTS]
+    runner = sf.ShfmtRunner()
+    run = runner._run
+    monkeypatch.setattr(
+        runner, "_run", lambda script, **kwargs: run(script, **kwargs).replace("# WDLFMT", "#WDLFMT")
+    )
+    assert runner.format_many(SCRIPTS) == expected
+    assert runner.fallbacks == 1
+
+
+def test_shfmt_invalid_script_raises():
+    runner = sf.ShfmtRunner()
+    with pytest.raises(sf.subprocess.CalledProcessError):
+        runner.format_many(["echo ok", "echo x |"])
+
+
+def test_shfmt_unclosed_quotes_are_not_batched():
+    # Joined, the separator would sit inside the string and both would pass.
+    runner = sf.ShfmtRunner()
+    with pytest.raises(sf.subprocess.CalledProcessError):
+        runner.format_many(['echo "a', 'b"'])
+
+
+def test_shfmt_quotes_balanced():
+    assert sf._quotes_balanced("echo 'a' \"b $x\" `c` \\' # it's")
+    assert sf._quotes_balanced("echo ${#x}")
+    assert not sf._quotes_balanced('echo "a')
+    assert not sf._quotes_balanced("echo ${#x}'")
+
+
+def test_shfmt_cache_repeated_blocks_do_not_spawn():
+    runner = sf.ShfmtRunner()
+    first = runner.format_many(SCRIPTS)
+    processes = runner.processes
+
+    assert runner.format_many(SCRIPTS) == first
+    assert runner.format(SCRIPTS[0]) == first[0]
+    assert runner.processes == processes
+    info = runner.cache_info()
+    assert info.misses == len(SCRIPTS)
+    assert info.hits == len(SCRIPTS) + 1
+    assert info.currsize == len(SCRIPTS)
+
+
+def test_shfmt_cache_duplicates_within_a_batch():
+    runner = sf.ShfmtRunner()
+    runner.format_many(["echo a", "echo b", "echo a"])
+    assert (runner.hits, runner.misses) == (1, 2)
+
+
+def test_shfmt_cache_lru_eviction():
+    cache = sf.ShfmtCache(maxsize=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert len(cache) == 2
+
+
+def test_shfmt_disk_cache_shared_between_runners(tmp_path):
+    runner = sf.ShfmtRunner(cache=sf.ShfmtCache(directory=tmp_path))
+    first = runner.format_many(SCRIPTS)
+
+    runner = sf.ShfmtRunner(cache=sf.ShfmtCache(directory=tmp_path))
+    runner.version
+    runner.processes = 0
+    assert runner.format_many(SCRIPTS) == first
+    assert runner.processes == 0
+    assert runner.misses == 0
+
+
+def test_shfmt_disk_cache_failed_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    def full_disk(src, dst):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(sf.os, "replace", full_disk)
+    cache = sf.ShfmtCache(directory=tmp_path)
+    cache.put("ab" * 32, "echo a\n")
+    assert cache.get("ab" * 32) == "echo a\n"
+    assert [p.name for p in tmp_path.rglob("*") if p.is_file()] == []
+
+
+def test_shfmt_cache_key_includes_version():
+    runner = sf.ShfmtRunner()
+    key = runner.key("echo a")
+    runner._version = "v0.0.0-other"
+    assert runner.key("echo a") != key
+
+
+@pytest.mark.parametrize(
+    "cmd, dollar, expected",
+    [
+        ("echo ~{a} ~{b}", False, ["~{a}", "~{b}"]),
+        ('echo ~{sep="}" xs} done', False, ['~{sep="}" xs}']),
+        ('echo ~{if a then "{" else b}', False, ['~{if a then "{" else b}']),
+        ("echo ~{select_first([x, {'a': 1}])}", False, ["~{select_first([x, {'a': 1}])}"]),
+        ('echo ~{"a\\"}"} ~{b}', False, ['~{"a\\"}"}', "~{b}"]),
+        ("echo ${x} ~{y}", False, ["~{y}"]),
+        ("echo ${x} ~{y}", True, ["${x}", "~{y}"]),
+        ("echo ~{a} ~{unclosed", False, ["~{a}"]),
+        ("echo {} ~ $ } {", True, []),
+    ],
+)
+def test_find_interpolations(cmd, dollar, expected):
+    assert [cmd[a:b] for a, b in sf.find_interpolations(cmd, dollar)] == expected
+
+
+def test_shfmt_substitution_nested_braces():
+    cmd = 'echo ~{sep=" " prefix("-I ", select_first([dirs, {}]))} >~{out}\n'
+    formatter = sf.ShfmtFormatter(cmd)
+    substituted = formatter.substituted()
+    assert substituted == "echo WDLFMT_EXPRESSION_PLACEHOLDER_0_ >WDLFMT_EXPRESSION_PLACEHOLDER_1_\n"
+    assert formatter.format() == cmd
+
+
+def test_shfmt_substitution_dollar_interpolation():
+    cmd = "echo ${name} $HOME\n"
+    assert sf.ShfmtFormatter(cmd).substituted() == cmd
+    formatter = sf.ShfmtFormatter(cmd, dollar_interpolation=True)
+    assert formatter.substituted() == "echo WDLFMT_EXPRESSION_PLACEHOLDER_0_ $HOME\n"
+    # Written back for a `command <<< >>>` block, where `${` is shell syntax.
+    assert formatter.format() == "echo ~{name} $HOME\n"
+
+
+def test_shfmt_substitution_scales_to_10k_placeholders():
+    n = 10_000
+    cmd = "".join(f'echo "~{{sep=" " values_{i}}}" >~{{out_{i}}}\n' for i in range(n))
+    formatter = sf.ShfmtFormatter(cmd)
+
+    substituted = formatter.substituted()
+    assert len(formatter.placeholder_dict) == 2 * n
+    assert "~{" not in substituted
+    assert formatter.restore_from_placeholders(substituted) == cmd
+
+    # Through shfmt and back
+    assert formatter.format() == cmd
+
+
+def test_shfmt_substitution_is_linear():
+    import time
+
+    def elapsed(n):
+        cmd = "x ~{a} y\n" * n
+        formatter = sf.ShfmtFormatter(cmd)
+        start = time.perf_counter()
+        formatter.restore_from_placeholders(formatter.substituted())
+        return time.perf_counter() - start
+
+    elapsed(1_000)
+    small = min(elapsed(5_000) for _ in range(3))
+    large = min(elapsed(20_000) for _ in range(3))
+    # 4x the input: a quadratic implementation takes ~16x as long.
+    assert large < small * 8
@@ -0,0 +1,47 @@
+import pytest
+
+import wdlfmt
+from benchmarks.startup import CASES, HEAVY, LIGHT_CASES, MODULE_BUDGET, measure, parse_importtime
+
+
+@pytest.mark.parametrize("case", LIGHT_CASES)
+def test_does_not_load_the_parser(case):
+    assert not measure(CASES[case]).loaded & HEAVY
+
+
+@pytest.mark.parametrize("case", LIGHT_CASES)
+def test_module_budget(case):
+    assert measure(CASES[case]).over_budget(case) == []
+
+
+def test_module_budget_catches_new_imports():
+    startup = measure(CASES["format_wdl_str"])
+    _, most = MODULE_BUDGET["wdlfmt --help"]
+    assert "imports wdlfmt.visitor" in startup.over_budget("wdlfmt --help")
+    assert len(startup.modules) > most
+
+
+def test_formatting_loads_the_parser():
+    assert measure(CASES["format_wdl_str"]).loaded >= HEAVY
+
+
+def test_parse_importtime():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   wdlfmt.modes\n"
+        "import time:       300 |        420 | wdlfmt\n"
+        "unrelated output\n"
+    )
+    assert parse_importtime(stderr) == [("wdlfmt.modes", 1, 0.00012), ("wdlfmt", 0, 0.00042)]
+
+
+def test_lazy_attributes():
+    from wdlfmt import batch, checker, visitor
+
+    assert wdlfmt.format_wdl_str is visitor.format_wdl_str
+    assert wdlfmt.format_many is batch.format_many
+    assert wdlfmt.StyleChecker is checker.StyleChecker
+    assert wdlfmt.daemon.__name__ == "wdlfmt.daemon"
+    assert {"format_wdl", "format_and_check", "VerificationError", "cli"} <= set(dir(wdlfmt))
+    with pytest.raises(AttributeError):
+        wdlfmt.not_an_attribute
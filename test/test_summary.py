@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import pytest
+
+import wdlfmt
+from benchmarks.corpus import CorpusSpec, generate
+from wdlfmt import checker
+from wdlfmt.batch import format_text
+from wdlfmt.checker import Command, Runtime, StyleChecker
+from wdlfmt.input_stream import ArrayInputStream
+from wdlfmt.visitor import WdlVisitor
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+SOURCES = [p.read_text() for p in sorted(SNAPSHOT_DIR.glob("*.input.wdl"))]
+SOURCES.append(generate(CorpusSpec(tasks=10, comment_density=0.5)))
+
+
+def _summarized(source):
+    visitor = WdlVisitor(ArrayInputStream(source), summarize=True)
+    return str(visitor), visitor.summary
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_summary_matches_text_scan(source):
+    formatted, summary = _summarized(source)
+    assert summary is not None
+    assert summary == StyleChecker(formatted).summary
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_format_and_check(source, monkeypatch):
+    expected = wdlfmt.check_style(wdlfmt.format_wdl_str(source))
+
+    def no_scan(text):
+        raise AssertionError("the formatted text was scanned")
+
+    monkeypatch.setattr(checker, "_scan", no_scan)
+    formatted, results = wdlfmt.format_and_check(source)
+    assert formatted == wdlfmt.format_wdl_str(source)
+    assert results == expected
+    assert format_text(source, check_style=True).check_results == expected
+
+
+def test_summary_contents():
+    source = (
+        "version 1.0\n"
+        "task t {\n"
+        "    command { echo a; echo b }\n"
+        "    runtime { cpu: 1 docker: \"ubuntu\" }\n"
+        "}\n"
+        "workflow W {\n"
+        "    call t\n    {\n    }\n"
+        "    call t as other {}\n"
+        "}\n"
+    )
+    formatted, summary = _summarized(source)
+    assert [(d.kind, d.name, d.parameter_meta) for d in summary.definitions] == [
+        ("task", "t", False), ("workflow", "W", False)
+    ]
+    assert [(c.target, c.alias) for c in summary.calls] == [("t", None), ("t", "other")]
+    assert [formatted[c.start:].split()[0] for c in summary.calls] == ["t", "other"]
+    assert summary.runtimes == [Runtime(["cpu", "docker"], formatted.index("runtime"))]
+    # shfmt puts the two commands on lines of their own.
+    assert summary.commands == [Command(2, False, formatted.index("command"))]
+
+
+def test_not_summarized_with_syntax_errors():
+    visitor = WdlVisitor(ArrayInputStream("version 1.0\ntask a {{\n}\n"), summarize=True, report_errors=False)
+    assert visitor.summary is None
+
+
+def test_falls_back_to_text_scan(monkeypatch):
+    def unexpected(summary, ctx, text, offset):
+        raise LookupError("moved")
+
+    monkeypatch.setattr(wdlfmt.visitor, "summarize_element", unexpected)
+    formatted, summary = _summarized(SOURCES[0])
+    assert summary is None
+    assert wdlfmt.format_and_check(SOURCES[0])[1] == wdlfmt.check_style(formatted)
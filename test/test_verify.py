@@ -0,0 +1,185 @@
+import subprocess
+from pathlib import Path
+
+import pytest
+
+import wdlfmt
+from wdlfmt.formatters import task
+from wdlfmt.incremental import IncrementalFormatter
+from wdlfmt.verify import VerificationError, verify_output, verify_text
+
+SNAPSHOT_DIR = Path(__file__).parent / "snapshots"
+
+SOURCE = """version 1.0
+
+task Greet {
+    input {
+        # The greeting
+        String greeting = 'hi'
+        Array[Int] numbers = [1, 2,]
+    }
+    command {
+        echo ${greeting}; echo done
+    }
+    runtime {
+        cpu: 1
+    }
+}
+"""
+
+
+@pytest.mark.parametrize("mode", ["fast", "full"])
+@pytest.mark.parametrize("path", sorted(SNAPSHOT_DIR.glob("*.input.wdl")), ids=lambda p: p.name)
+def test_snapshots_verify(path, mode):
+    source = path.read_text()
+    assert wdlfmt.format_wdl_str(source, verify=mode) == wdlfmt.format_wdl_str(source, verify="off")
+
+
+def test_layout_changes_are_allowed():
+    formatted = wdlfmt.format_wdl_str(SOURCE, verify="off")
+    assert "~{greeting}" in formatted
+    verify_text(SOURCE, formatted, mode="full")
+
+
+@pytest.mark.parametrize(
+    "edit, message",
+    [
+        (lambda s: s.replace("        # The greeting\n", ""), "lost comment 'The greeting' on line 5 "),
+        (lambda s: s.replace("String greeting", "String String greeting"), "added 'String' on line 7 "),
+        (lambda s: s.replace("cpu: 1", "cpu: 2"), "changed '1' on line 13 of the source into '2'"),
+        (lambda s: s.replace("echo done", "echo gone"), "changed command block on line 9 "),
+        (lambda s: s.replace("    runtime {\n        cpu: 1\n    }\n", ""), "'runtime' on line 12 "),
+        (lambda s: s.rstrip("}\n"), "lost '}' on line 15 "),
+        (lambda s: s + "struct S {\n}\n", "added 'struct'"),
+    ],
+)
+def test_detects_changed_tokens(edit, message):
+    formatted = wdlfmt.format_wdl_str(SOURCE, verify="off")
+    with pytest.raises(VerificationError, match=message):
+        verify_text(SOURCE, edit(formatted))
+
+
+def test_detects_placeholder_turned_into_shell():
+    # In a `<<< >>>` block `${greeting}` is a shell variable.
+    formatted = wdlfmt.format_wdl_str(SOURCE, verify="off").replace("~{greeting}", "${greeting}")
+    with pytest.raises(VerificationError, match="command block"):
+        verify_text(SOURCE, formatted)
+
+
+def test_full_mode_checks_output_is_stable():
+    formatted = wdlfmt.format_wdl_str(SOURCE, verify="off")
+    unstable = formatted.replace("    runtime", "runtime")
+    verify_text(SOURCE, unstable, mode="fast")
+    with pytest.raises(VerificationError, match="again"):
+        verify_text(SOURCE, unstable, mode="full")
+
+
+def test_full_mode_checks_output_parses():
+    with pytest.raises(VerificationError, match="does not parse"):
+        verify_output("version 1.0\ntask {\n")
+
+
+IMPORTS = """version 1.1
+
+import   "tasks/common.wdl"   as common  alias Sample as CommonSample
+import "other.wdl"
+
+task Greet {
+    command <<< echo hi >>>
+}
+"""
+
+
+@pytest.mark.parametrize("mode", ["fast", "full"])
+def test_imports_are_kept(mode):
+    formatted = wdlfmt.format_wdl_str(IMPORTS, verify=mode)
+    assert 'import "tasks/common.wdl" as common alias Sample as CommonSample\n' in formatted
+    assert 'import "other.wdl"\n' in formatted
+    assert IncrementalFormatter(verify=mode).format(IMPORTS) == formatted
+
+
+META_AND_CALLS = """version 1.0
+
+task Greet {
+    meta {
+        author: "x"
+        # A comment in meta
+        tags: ["a", "b"]
+    }
+    input {
+        Int # inline
+            n
+    }
+    command <<< echo ~{n} >>>
+    runtime {
+        docker: # inline
+            "ubuntu"
+    }
+}
+
+workflow W {
+    meta {
+        allowNestedInputs: true
+    }
+    call Greet as # in the header
+        greet {
+        input:
+            # Before the first input
+            n = 1, # after the first input
+    }
+}
+"""
+
+
+@pytest.mark.parametrize("mode", ["fast", "full"])
+def test_meta_and_inline_comments_are_kept(mode):
+    formatted = wdlfmt.format_wdl_str(META_AND_CALLS, verify=mode)
+    assert '    meta {\n        author: "x"\n' in formatted
+    assert "        allowNestedInputs: true\n" in formatted
+    assert "        Int # inline\n            n\n" in formatted
+    assert "    call Greet as # in the header\n        greet {\n" in formatted
+    assert "            # Before the first input\n            n = 1,\n    # after the first input\n    }\n" in formatted
+    assert IncrementalFormatter(verify=mode).format(META_AND_CALLS) == formatted
+
+
+def test_meta_and_inline_comments_checked_like_text():
+    formatted, results = wdlfmt.format_and_check(META_AND_CALLS)
+    expected = wdlfmt.check_style(formatted)
+    assert [(r.rule, r.status, r.details) for r in results] == [(r.rule, r.status, r.details) for r in expected]
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError, match="verify mode"):
+        wdlfmt.format_wdl_str(SOURCE, verify="slow")
+
+
+@pytest.fixture
+def lossy_runtime(monkeypatch):
+    monkeypatch.setattr(task.RuntimeFormatter, "doc", lambda self, input: "")
+
+
+def test_format_raises_on_lost_tokens(lossy_runtime):
+    with pytest.raises(VerificationError, match="'runtime' on line 12"):
+        wdlfmt.format_wdl_str(SOURCE)
+    assert "runtime" not in wdlfmt.format_wdl_str(SOURCE, verify="off")
+
+
+def test_incremental_raises_on_lost_tokens(lossy_runtime):
+    with pytest.raises(VerificationError, match="'runtime' on line 12"):
+        IncrementalFormatter().format(SOURCE)
+    assert "runtime" not in IncrementalFormatter(verify="off").format(SOURCE)
+
+
+def test_batch_reports_lost_tokens(lossy_runtime):
+    [result] = wdlfmt.format_many([wdlfmt.SourceText(SOURCE)])
+    assert result.formatted is None
+    assert result.error.startswith("VerificationError: formatting changed 'runtime'")
+
+
+@pytest.mark.parametrize("mode", ["off", "fast", "full"])
+def test_cli_verify_modes(mode):
+    path = str(SNAPSHOT_DIR / "md5_check.expected.wdl")
+    result = subprocess.run(
+        ["wdlfmt", "--no-cache", "--check", "--verify", mode, path], capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
@@ -1,13 +1,83 @@
-from . import formatters  # noqa: F401
-from .visitor import format_wdl, format_wdl_str  # noqa: F401
-from .checker import StyleChecker, CheckResult, Status  # noqa: F401
+from typing import TYPE_CHECKING
+
+# The public API is imported on first use (see `__getattr__`), so that
+# `import wdlfmt`, `wdlfmt --help` and the checker on its own do not load the
+# generated parser, the formatters or antlr4.
+_LAZY = {
+    "format_and_check": "visitor",
+    "format_wdl": "visitor",
+    "format_wdl_str": "visitor",
+    "format_many": "batch",
+    "SourceText": "batch",
+    "VerificationError": "verify",
+    "StyleChecker": "checker",
+    "CheckResult": "checker",
+    "Status": "checker",
+}
+
+_SUBMODULES = frozenset([
+    "batch",
+    "cache",
+    "checker",
+    "cli",
+    "daemon",
+    "formatters",
+    "grammar",
+    "incremental",
+    "input_stream",
+    "lowering",
+    "lsp",
+    "modes",
+    "parser_cache",
+    "parser_state",
+    "profiling",
+    "results",
+    "summary",
+    "syntax",
+    "utils",
+    "verify",
+    "visitor",
+])
+
+__all__ = [*_LAZY, "check_style", "is_formatted"]
+
+if TYPE_CHECKING:
+    from .batch import SourceText, format_many  # noqa: F401
+    from .checker import CheckResult, Status, StyleChecker  # noqa: F401
+    from .verify import VerificationError  # noqa: F401
+    from .visitor import format_and_check, format_wdl, format_wdl_str  # noqa: F401
+
+
+def _import(module: str):
+    # `__import__` rather than `importlib.import_module`, so that the import
+    # shows up in `python -X importtime`.
+    return __import__(f"{__name__}.{module}", fromlist=["__name__"])
+
+
+def __getattr__(name: str):
+    if name in _LAZY:
+        value = getattr(_import(_LAZY[name]), name)
+    elif name in _SUBMODULES:
+        value = _import(name)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY) | _SUBMODULES)
 
 
 def check_style(wdl: str) -> list:
     """Return a list of CheckResult for the given formatted WDL string."""
-    return StyleChecker(wdl).run_all()
+    from . import checker
+
+    return checker.StyleChecker(wdl).run_all()
 
 
 def is_formatted(wdl: str) -> bool:
     """Return True if the WDL string is already correctly formatted."""
-    return format_wdl_str(wdl) == wdl
+    from . import visitor
+
+    return visitor.format_wdl_str(wdl) == wdl
@@ -0,0 +1,294 @@
+"""Format many WDL files, optionally spread across worker processes.
+
+Each file is lexed, parsed, formatted and (optionally) style-checked
+independently, so files are distributed over a process pool and the results
+are yielded back in the order the paths were given. Only a bounded number of
+files is in flight at once, so a batch of any size runs in constant memory.
+A file that fails to format produces a `FileResult` with `error` set instead
+of aborting the batch.
+
+When a `FormatCache` is given, files it already knows to be formatted are not
+read at all, and files found to be formatted are added to it. Worker processes
+share the parent's shfmt cache settings, and warm start if it is enabled (see
+`parser_state.py`).
+"""
+
+from __future__ import annotations
+
+import os
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from itertools import chain
+from typing import Iterable, Iterator, Optional, Sequence, Union
+
+from . import profiling
+from .cache import FormatCache
+from .checker import StyleChecker
+from .formatters.shell_formatter import configure_shfmt_cache, get_shfmt_runner
+from .input_stream import ArrayInputStream
+from .parser_state import enable_warm_start, warm_start_directory
+from .results import FileResult
+from .verify import DEFAULT_VERIFY_MODE
+from .visitor import DEFAULT_PARSE_MODE, WdlVisitor
+
+
+class FormatError(Exception):
+    """A file could not be formatted in a worker process."""
+
+
+@dataclass(frozen=True)
+class SourceText:
+    """WDL source text to format in a batch, rather than a file to read.
+
+    Attributes:
+        text: The WDL source.
+        path: What to report as `FileResult.path`.
+    """
+
+    text: str
+    path: str = "<string>"
+
+
+def default_jobs() -> int:
+    """The default number of worker processes: one per CPU."""
+    return os.cpu_count() or 1
+
+
+def format_text(
+    source: str,
+    path: str = "<string>",
+    parse_mode: str = DEFAULT_PARSE_MODE,
+    check_style: bool = False,
+    report_errors: bool = True,
+    verify: str = DEFAULT_VERIFY_MODE,
+    profile: bool = False,
+) -> FileResult:
+    """Format and optionally style-check WDL source text, capturing any error.
+
+    Args:
+        report_errors: Print syntax errors to stderr as they are found. They
+            are collected in `FileResult.syntax_errors` either way.
+        verify: Passed through to `WdlVisitor`. A failed check is reported
+            as an error like any other.
+        profile: Record a `Profile` of the work in `FileResult.profile`.
+    """
+    if profile:
+        with profiling.collect() as collected:
+            result = format_text(
+                source, path, parse_mode=parse_mode, check_style=check_style, report_errors=report_errors, verify=verify
+            )
+        result.profile = collected
+        return result
+
+    result = FileResult(path, source=source)
+    try:
+        visitor = WdlVisitor(
+            ArrayInputStream(source),
+            parse_mode=parse_mode,
+            report_errors=report_errors,
+            verify=verify,
+            summarize=check_style,
+        )
+        result.syntax_errors = visitor.syntax_error_messages
+        result.formatted = str(visitor)
+        result.parse_stage = visitor.parse_stage
+        if check_style:
+            result.check_results = StyleChecker(result.formatted, summary=visitor.summary).run_all()
+    except Exception as e:
+        result.formatted = None
+        result.error = f"{type(e).__name__}: {e}"
+        result.exception = e
+    return result
+
+
+def format_file(
+    path: str,
+    parse_mode: str = DEFAULT_PARSE_MODE,
+    check_style: bool = False,
+    verify: str = DEFAULT_VERIFY_MODE,
+    profile: bool = False,
+) -> FileResult:
+    """Read, format and optionally style-check one file, capturing any error."""
+    try:
+        with open(path, "r") as f:
+            source = f.read()
+    except Exception as e:
+        return FileResult(path, error=f"{type(e).__name__}: {e}", exception=e)
+    return format_text(source, path, parse_mode=parse_mode, check_style=check_style, verify=verify, profile=profile)
+
+
+def _format_file_in_worker(path: str, **kwargs) -> FileResult:
+    # Exceptions are not reliably picklable (ANTLR's are not), so only the
+    # message travels back to the parent process.
+    result = format_file(path, **kwargs)
+    result.exception = None
+    return result
+
+
+def _format_text_in_worker(source: str, path: str, **kwargs) -> FileResult:
+    result = format_text(source, path, **kwargs)
+    result.exception = None
+    return result
+
+
+def _init_worker(shfmt_cache_dir, shfmt_cache_size, parser_state_dir):
+    configure_shfmt_cache(shfmt_cache_dir, shfmt_cache_size)
+    if parser_state_dir is not None:
+        enable_warm_start(parser_state_dir)
+
+
+def default_max_in_flight(jobs: int) -> int:
+    """The default cap on documents being formatted at once: two per worker,
+    so a worker never waits for the next document."""
+    return 2 * max(jobs, 1)
+
+
+def format_many(
+    paths_or_strings: Iterable[Union[str, os.PathLike, SourceText]],
+    jobs: int = 1,
+    parse_mode: str = DEFAULT_PARSE_MODE,
+    check_style: bool = False,
+    cache: Optional[FormatCache] = None,
+    max_in_flight: Optional[int] = None,
+    verify: str = DEFAULT_VERIFY_MODE,
+    profile: bool = False,
+) -> Iterator[FileResult]:
+    """Format WDL files or source strings, yielding one `FileResult` per item
+    in input order.
+
+    Items are taken from `paths_or_strings` only as capacity frees up, and
+    each result is yielded as soon as it and everything before it are done,
+    so memory use is bounded by `max_in_flight` rather than by the number of
+    items. `paths_or_strings` may be a lazy iterator. Every document formatted
+    by the same process reuses that process's warm lexer and parser state
+    (see `parser_cache.py`).
+
+    Args:
+        paths_or_strings: File paths (`str` or `os.PathLike`), or WDL
+            source text wrapped in `SourceText`. The two may be mixed.
+        jobs: Number of worker processes. With `1`, or fewer than two items
+            to format, everything is formatted in this process.
+        parse_mode: Passed through to `WdlVisitor`.
+        check_style: Also run `StyleChecker` on each formatted document.
+        cache: Skip files this cache knows are formatted, and record newly
+            confirmed ones. The cache is written back when iteration ends.
+        max_in_flight: Most items submitted to the workers but not yet
+            yielded (default: `default_max_in_flight(jobs)`). A consumer that
+            falls behind stops new work from being started.
+        verify: Passed through to `WdlVisitor`.
+        profile: Attach a `Profile` to each result, and pass it to the
+            hooks registered with `profiling.add_hook`. On by default while
+            there are hooks. Files skipped thanks to `cache` count as
+            `format_cache_hits`.
+    """
+    profile = profile or profiling.has_hooks()
+    options = dict(parse_mode=parse_mode, check_style=check_style, verify=verify, profile=profile)
+    if max_in_flight is None:
+        max_in_flight = default_max_in_flight(jobs)
+    items = iter(paths_or_strings)
+
+    try:
+        # Look ahead far enough to know whether a worker pool pays off.
+        lookahead = []
+        todo = 0
+        if jobs > 1:
+            for item in items:
+                lookahead.append(item)
+                if isinstance(item, SourceText) or not _is_cached(item, cache):
+                    todo += 1
+                if todo > 1:
+                    break
+        items = chain(lookahead, items)
+
+        if jobs <= 1 or todo <= 1:
+            for item in items:
+                yield _profiled(_format_item(item, cache, **options), profile)
+            return
+
+        shfmt_cache = get_shfmt_runner().cache
+        pool = ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(shfmt_cache.directory, shfmt_cache.maxsize, warm_start_directory()),
+        )
+        try:
+            pending = deque()
+            for item in items:
+                pending.append((item, _submit(pool, item, cache, options)))
+                while len(pending) >= max_in_flight:
+                    yield _profiled(_collect(*pending.popleft(), cache), profile)
+            while pending:
+                yield _profiled(_collect(*pending.popleft(), cache), profile)
+        finally:
+            # Drops queued work if the consumer stopped iterating early.
+            pool.shutdown(cancel_futures=True)
+    finally:
+        if cache is not None:
+            cache.write()
+
+
+def format_files(
+    paths: Sequence[str],
+    jobs: int = 1,
+    parse_mode: str = DEFAULT_PARSE_MODE,
+    check_style: bool = False,
+    cache: Optional[FormatCache] = None,
+    verify: str = DEFAULT_VERIFY_MODE,
+) -> Iterator[FileResult]:
+    """Format `paths`, yielding one `FileResult` per path in input order.
+
+    The same as `format_many` with paths only.
+    """
+    return format_many(
+        paths, jobs=jobs, parse_mode=parse_mode, check_style=check_style, cache=cache, verify=verify
+    )
+
+
+def _is_cached(path, cache: Optional[FormatCache]) -> bool:
+    return cache is not None and cache.is_formatted(os.fspath(path))
+
+
+def _format_item(item, cache, **options) -> FileResult:
+    if isinstance(item, SourceText):
+        return format_text(item.text, item.path, **options)
+    path = os.fspath(item)
+    if _is_cached(path, cache):
+        return FileResult(path, cached=True)
+    return _record(format_file(path, **options), cache)
+
+
+def _submit(pool, item, cache, options):
+    """Start formatting `item`, or return its result if no work is needed."""
+    if isinstance(item, SourceText):
+        return pool.submit(partial(_format_text_in_worker, item.text, item.path, **options))
+    path = os.fspath(item)
+    if _is_cached(path, cache):
+        return FileResult(path, cached=True)
+    return pool.submit(partial(_format_file_in_worker, path, **options))
+
+
+def _collect(item, pending, cache) -> FileResult:
+    if isinstance(pending, FileResult):
+        return pending
+    result = pending.result()
+    if not isinstance(item, SourceText):
+        _record(result, cache)
+    return result
+
+
+def _profiled(result: FileResult, profile: bool) -> FileResult:
+    if not profile:
+        return result
+    if result.cached:
+        result.profile = profiling.Profile(counts=Counter(format_cache_hits=1))
+    if result.profile is not None:
+        profiling.run_hooks(result.path, result.profile)
+    return result
+
+
+def _record(result: FileResult, cache: Optional[FormatCache]) -> FileResult:
+    if cache is not None and result.error is None and not result.changed:
+        cache.mark_formatted(result.path, result.source)
+    return result
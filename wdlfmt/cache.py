@@ -0,0 +1,156 @@
+"""Persistent record of files that are already correctly formatted.
+
+A file is recorded once `format_wdl_str(content) == content` has been
+established for it. On later runs it is skipped after a single `os.stat` as
+long as its size and mtime are unchanged; if only the mtime moved, its
+content hash decides.
+
+There is one cache file per wdlfmt build and set of formatting options, so
+upgrading wdlfmt or changing an option never reuses stale results. Several
+wdlfmt processes may share a cache directory (pre-commit runs them in
+parallel): every write merges with what is on disk and replaces the file
+atomically, so the worst case is a lost entry, never a corrupt cache.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+CACHE_DIR_ENV = "WDLFMT_CACHE_DIR"
+
+_PACKAGE_DIR = Path(__file__).parent
+
+
+def user_cache_dir() -> Path:
+    """The directory wdlfmt caches live in.
+
+    `$WDLFMT_CACHE_DIR` if set, otherwise the platform's per-user cache
+    directory (`$XDG_CACHE_HOME/wdlfmt`, `~/.cache/wdlfmt`,
+    `~/Library/Caches/wdlfmt` or `%LOCALAPPDATA%\\wdlfmt`).
+    """
+    if os.environ.get(CACHE_DIR_ENV):
+        return Path(os.environ[CACHE_DIR_ENV])
+    if sys.platform == "darwin":
+        return Path.home() / "Library" / "Caches" / "wdlfmt"
+    if sys.platform == "win32" and os.environ.get("LOCALAPPDATA"):
+        return Path(os.environ["LOCALAPPDATA"]) / "wdlfmt"
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "wdlfmt"
+
+
+def wdlfmt_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("wdlfmt")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _code_fingerprint() -> str:
+    """Fingerprint of the installed sources, so editable installs do not
+    reuse results from an older checkout with the same version number."""
+    h = hashlib.sha256()
+    for path in sorted(_PACKAGE_DIR.rglob("*.py")):
+        st = path.stat()
+        h.update(f"{path.relative_to(_PACKAGE_DIR)}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()[:16]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class FormatCache:
+    """Files known to be formatted under a given wdlfmt build and options.
+
+    Args:
+        options: The effective formatting options. Each distinct set of
+            options gets its own cache file.
+        directory: Where to keep the cache. Defaults to `user_cache_dir()`.
+    """
+
+    def __init__(self, options: Optional[dict] = None, directory: Union[str, Path, None] = None):
+        self.directory = Path(directory) if directory is not None else user_cache_dir()
+        key = json.dumps(
+            {"version": wdlfmt_version(), "code": _code_fingerprint(), "options": options or {}},
+            sort_keys=True,
+        )
+        self.path = self.directory / f"format-cache.{hashlib.sha256(key.encode()).hexdigest()[:16]}.json"
+        self.entries: Dict[str, list] = self._load()
+        self._dirty: Dict[str, list] = {}
+
+    def _load(self) -> Dict[str, list]:
+        try:
+            with open(self.path, "r") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return entries if isinstance(entries, dict) else {}
+
+    def is_formatted(self, path: str) -> bool:
+        """True if `path` is recorded as formatted and has not changed since."""
+        key = os.path.abspath(path)
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        try:
+            st = os.stat(key)
+        except OSError:
+            return False
+        size, mtime, digest = entry
+        if st.st_size != size:
+            return False
+        if st.st_mtime_ns == mtime:
+            return True
+
+        # Touched but possibly unchanged (e.g. a fresh checkout).
+        try:
+            with open(key, "r") as f:
+                if content_hash(f.read()) != digest:
+                    return False
+        except (OSError, UnicodeDecodeError):
+            # Formatting the file will report the problem.
+            return False
+        self._record(key, [size, st.st_mtime_ns, digest])
+        return True
+
+    def mark_formatted(self, path: str, content: str) -> None:
+        """Record that `path`, whose current text is `content`, is formatted."""
+        key = os.path.abspath(path)
+        try:
+            st = os.stat(key)
+        except OSError:
+            return
+        self._record(key, [st.st_size, st.st_mtime_ns, content_hash(content)])
+
+    def _record(self, key: str, entry: list) -> None:
+        self.entries[key] = entry
+        self._dirty[key] = entry
+
+    def write(self) -> None:
+        """Merge new entries into the on-disk cache, replacing it atomically."""
+        if not self._dirty:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        merged = self._load()
+        merged.update(self._dirty)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".format-cache.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(merged, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        self.entries = merged
+        self._dirty = {}
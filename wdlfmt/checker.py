@@ -8,8 +8,12 @@ from __future__ import annotations
 
 import re
 import sys
-from dataclasses import dataclass
+from bisect import bisect_right
+from dataclasses import dataclass, field
 from enum import Enum
+from typing import Optional
+
+from . import profiling
 
 
 class Status(Enum):
@@ -26,6 +30,22 @@ class Status(Enum):
     WARN = "warn"
 
 
+@dataclass
+class Location:
+    """A span of the checked text that a result refers to.
+
+    Attributes:
+        line: 1-based line number.
+        column: 0-based column where the span starts.
+        end_column: 0-based column where the span ends (exclusive), on the
+            same line.
+    """
+
+    line: int
+    column: int
+    end_column: int
+
+
 @dataclass
 class CheckResult:
     """The result of a single style check.
@@ -34,38 +54,202 @@ class CheckResult:
         rule: Human-readable name of the rule that was checked.
         status: `PASS`, `FAIL`, or `WARN`.
         details: Optional extra information (e.g. which names violated the rule).
+        locations: Where in the text the rule is violated, when that can be
+            pinned down.
     """
 
     rule: str
     status: Status
     details: str = ""
+    locations: list[Location] = field(default_factory=list)
 
 
-# ── helpers ──────────────────────────────────────────────────────────────────
+# ── document summary ─────────────────────────────────────────────────────────
 
-def _is_upper_camel(name: str) -> bool:
-    return bool(re.match(r"^[A-Z][a-zA-Z0-9]*$", name))
+@dataclass
+class Definition:
+    """A task, workflow or struct.
+
+    Attributes:
+        kind: `"task"`, `"workflow"` or `"struct"`.
+        name: The name it is defined with.
+        start: Offset of the name in the checked text.
+        parameter_meta: Whether a task or workflow has a `parameter_meta`
+            section; `None` for structs.
+    """
 
+    kind: str
+    name: str
+    start: int
+    parameter_meta: Optional[bool] = None
 
-def _is_lower_camel(name: str) -> bool:
-    return bool(re.match(r"^[a-z][a-zA-Z0-9]*$", name))
 
+@dataclass
+class Call:
+    """A call in a workflow.
 
-def _extract_command_blocks(text: str) -> list[str]:
-    """Return the contents of every command <<< ... >>> block."""
-    return re.findall(r"command\s*<<<(.*?)>>>", text, re.DOTALL)
+    Attributes:
+        target: The task or workflow called, as written (`lib.Task`).
+        alias: The name given with `as`, or `None`.
+        start: Offset of the alias in the checked text, or of the target for
+            a call without one.
+    """
 
+    target: str
+    alias: Optional[str]
+    start: int
 
-def _task_names(text: str) -> list[str]:
-    return re.findall(r"\btask\s+(\w+)\s*\{", text)
 
+@dataclass
+class Runtime:
+    """A runtime section.
 
-def _workflow_names(text: str) -> list[str]:
-    return re.findall(r"\bworkflow\s+(\w+)\s*\{", text)
+    Attributes:
+        keys: Its keys, in order.
+        start: Offset of the `runtime` keyword in the checked text.
+    """
+
+    keys: list[str]
+    start: int
 
 
-def _struct_names(text: str) -> list[str]:
-    return re.findall(r"\bstruct\s+(\w+)\s*\{", text)
+@dataclass
+class Command:
+    """A command block.
+
+    Attributes:
+        lines: Lines of the script that are not blank or comments.
+        pipefail: Whether the script contains `set -e -o pipefail`.
+        start: Offset of the `command` keyword in the checked text.
+    """
+
+    lines: int
+    pipefail: bool
+    start: int
+
+
+@dataclass
+class Summary:
+    """The parts of a document the content checks look at, in document order.
+
+    `StyleChecker` builds one from the text it checks, or takes one collected
+    from the parse tree while the text was formatted (see `wdlfmt.summary`).
+    """
+
+    definitions: list[Definition] = field(default_factory=list)
+    calls: list[Call] = field(default_factory=list)
+    runtimes: list[Runtime] = field(default_factory=list)
+    commands: list[Command] = field(default_factory=list)
+
+
+def script_lines(script: str) -> int:
+    """The number of lines of `script` that are not blank or comments."""
+    count = 0
+    for line in script.split("\n"):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            count += 1
+    return count
+
+
+# ── helpers ──────────────────────────────────────────────────────────────────
+
+def _is_upper_camel(name: str) -> bool:
+    return bool(re.match(r"^[A-Z][a-zA-Z0-9]*$", name))
+
+
+def _is_lower_camel(name: str) -> bool:
+    return bool(re.match(r"^[a-z][a-zA-Z0-9]*$", name))
+
+
+# Everything the content checks look at, in one alternation. Comments, string
+# literals and heredoc command scripts are matched as a whole so that keywords
+# and braces inside them are skipped; they have no named group. Every
+# alternative starts with a literal character, which lets `re` skip straight
+# to the next candidate position, so keywords check for a word boundary after
+# their first letter. A `#` only starts a comment after whitespace, so that
+# `$#` in a curly-brace command script does not.
+_TOKENS = re.compile(
+    r"""
+      \#(?<!\S.)[^\n]*
+    | "[^"\\\n]*(?:\\.[^"\\\n]*)*"
+    | '[^'\\\n]*(?:\\.[^'\\\n]*)*'
+    | c(?<!\w.)(?:
+          ommand\s*<<<(?P<script>[^>]*(?:>(?!>>)[^>]*)*)>>>
+        | all\s+(?P<target>[^\s{]+)(?:\s+as\s+(?P<alias>\w+))?
+      )
+    | t(?<!\w.)ask\s+(?P<task>\w+)\s*\{
+    | w(?<!\w.)orkflow\s+(?P<workflow>\w+)\s*\{
+    | s(?<!\w.)truct\s+(?P<struct>\w+)\s*\{
+    | r(?<!\w.)untime\s*(?P<runtime>\{)
+    | p(?<!\w.)arameter_meta\b(?P<meta>)
+    | \{(?P<open>)
+    | \}(?P<close>)
+    """,
+    re.VERBOSE,
+)
+
+# A key at the start of a line (or of the section) in a runtime section.
+_RUNTIME_KEY = re.compile(r"(?:^|\{)[ \t]*(\w+)[ \t]*:", re.MULTILINE)
+
+
+def _scan(text: str) -> Summary:
+    """Tokenize `text` once and summarize the parts the content checks need.
+
+    Braces are matched with a stack, so every task, workflow and runtime
+    section knows what it contains without another pass over its text. A
+    task or workflow that is never closed counts as lacking parameter_meta.
+    """
+    summary = Summary()
+    # What each open brace belongs to: a task or workflow `Definition`, a
+    # `Runtime`, or None. `section` and `runtime` are the innermost open ones;
+    # `body` is where the open runtime section's keys start.
+    braces = []
+    section = runtime = None
+    body = 0
+    for m in _TOKENS.finditer(text):
+        group = m.lastgroup
+        if group is None:
+            continue
+        if group == "close":
+            if not braces:
+                continue
+            block = braces.pop()
+            if block is None:
+                continue
+            if block is section:
+                section = None
+            elif block is runtime:
+                runtime = None
+                block.keys = _RUNTIME_KEY.findall(text, body, m.start())
+                summary.runtimes.append(block)
+        elif group == "open":
+            braces.append(None)
+        elif group == "meta":
+            if section is not None:
+                section.parameter_meta = True
+        elif group == "script":
+            script = m.group("script")
+            summary.commands.append(Command(script_lines(script), "set -e -o pipefail" in script, m.start()))
+        elif group in ("target", "alias"):
+            summary.calls.append(Call(m.group("target"), m.group("alias"), m.start(group)))
+        elif group == "runtime":
+            runtime = Runtime([], m.start())
+            body = m.start("runtime")
+            braces.append(runtime)
+        else:
+            definition = Definition(group, m.group(group), m.start(group))
+            summary.definitions.append(definition)
+            if group != "struct":
+                definition.parameter_meta = False
+                section = definition
+                braces.append(definition)
+            else:
+                braces.append(None)
+    for block in braces:
+        if isinstance(block, Definition):
+            block.parameter_meta = False
+    return summary
 
 
 # ── checker ───────────────────────────────────────────────────────────────────
@@ -73,16 +257,47 @@ def _struct_names(text: str) -> list[str]:
 class StyleChecker:
     """Check a formatted WDL string for BioWDL style guide compliance.
 
-    Operates on already-formatted text using regex — no re-parsing required.
+    Operates on already-formatted text — no re-parsing required. The content
+    checks read a `Summary` of the document. Unless one is given, it is built
+    on first use by tokenizing the text once; keywords inside comments, string
+    literals and command scripts are ignored.
     Call `run_all()` to execute every check and get a list of `CheckResult` objects.
 
     Args:
         formatted: The formatted WDL source text to check.
+        summary: The structure of `formatted`, as collected while formatting
+            it (see `wdlfmt.format_and_check`). Offsets in it must point into
+            `formatted`.
     """
 
-    def __init__(self, formatted: str):
+    def __init__(self, formatted: str, summary: Optional[Summary] = None):
         self.text = formatted
-        self.lines = formatted.splitlines()
+        self._lines = None
+        self._line_starts = None
+        self._summary = summary
+
+    @property
+    def lines(self) -> list[str]:
+        if self._lines is None:
+            self._lines = self.text.splitlines()
+        return self._lines
+
+    @property
+    def summary(self) -> Summary:
+        if self._summary is None:
+            self._summary = _scan(self.text)
+        return self._summary
+
+    def location(self, start: int, end: int) -> Location:
+        """The `Location` of `text[start:end]`, cut off at the end of its line."""
+        if self._line_starts is None:
+            self._line_starts = [0] + [m.end() for m in re.finditer("\n", self.text)]
+        line = bisect_right(self._line_starts, start) - 1
+        line_start = self._line_starts[line]
+        newline = self.text.find("\n", start, end)
+        if newline != -1:
+            end = newline
+        return Location(line + 1, start - line_start, end - line_start)
 
     # -- formatter-guaranteed checks (always pass after wdlfmt) ---------------
 
@@ -117,7 +332,7 @@ class StyleChecker:
     # -- content checks -------------------------------------------------------
 
     def check_line_length(self) -> CheckResult:
-        offenders = [i + 1 for i, line in enumerate(self.lines) if len(line) > 100]
+        offenders = [i + 1 for i, length in enumerate(map(len, self.lines)) if length > 100]
         if offenders:
             sample = ", ".join(str(n) for n in offenders[:5])
             suffix = f" (+{len(offenders)-5} more)" if len(offenders) > 5 else ""
@@ -125,125 +340,96 @@ class StyleChecker:
                 rule="Line length ≤ 100 chars",
                 status=Status.FAIL,
                 details=f"{len(offenders)} line(s) exceed 100 chars: {sample}{suffix}",
+                locations=[Location(n, 100, len(self.lines[n - 1])) for n in offenders],
             )
         return CheckResult(rule="Line length ≤ 100 chars", status=Status.PASS)
 
-    def check_task_naming(self) -> CheckResult:
-        bad = [n for n in _task_names(self.text) if not _is_upper_camel(n)]
+    def _check_naming(self, kind: str, rule: str) -> CheckResult:
+        bad = [d for d in self.summary.definitions if d.kind == kind and not _is_upper_camel(d.name)]
         if bad:
             return CheckResult(
-                rule="Task names are UpperCamelCase",
+                rule=rule,
                 status=Status.FAIL,
-                details=f"Non-conforming: {', '.join(bad)}",
+                details=f"Non-conforming: {', '.join(d.name for d in bad)}",
+                locations=[self.location(d.start, d.start + len(d.name)) for d in bad],
             )
-        return CheckResult(rule="Task names are UpperCamelCase", status=Status.PASS)
+        return CheckResult(rule=rule, status=Status.PASS)
+
+    def check_task_naming(self) -> CheckResult:
+        return self._check_naming("task", "Task names are UpperCamelCase")
 
     def check_workflow_naming(self) -> CheckResult:
-        bad = [n for n in _workflow_names(self.text) if not _is_upper_camel(n)]
-        if bad:
-            return CheckResult(
-                rule="Workflow names are UpperCamelCase",
-                status=Status.FAIL,
-                details=f"Non-conforming: {', '.join(bad)}",
-            )
-        return CheckResult(rule="Workflow names are UpperCamelCase", status=Status.PASS)
+        return self._check_naming("workflow", "Workflow names are UpperCamelCase")
 
     def check_struct_naming(self) -> CheckResult:
-        bad = [n for n in _struct_names(self.text) if not _is_upper_camel(n)]
-        if bad:
-            return CheckResult(
-                rule="Struct names are UpperCamelCase",
-                status=Status.FAIL,
-                details=f"Non-conforming: {', '.join(bad)}",
-            )
-        return CheckResult(rule="Struct names are UpperCamelCase", status=Status.PASS)
+        return self._check_naming("struct", "Struct names are UpperCamelCase")
 
     def check_call_aliases(self) -> CheckResult:
         """Warn for calls without an 'as' alias; fail if any alias is not lowerCamelCase."""
-        # calls with an alias
-        aliased = re.findall(r"\bcall\s+\S+\s+as\s+(\w+)", self.text)
-        bad_case = [a for a in aliased if not _is_lower_camel(a)]
-
-        # calls without any alias (call X { or call X\n{)
-        all_calls = re.findall(r"\bcall\s+(\S+)", self.text)
-        aliased_calls = re.findall(r"\bcall\s+(\S+)\s+as\s+\w+", self.text)
-        missing_alias = [c for c in all_calls if c not in aliased_calls]
+        calls = self.summary.calls
+        bad_case = [c for c in calls if c.alias is not None and not _is_lower_camel(c.alias)]
+        missing_alias = [c for c in calls if c.alias is None]
 
         if bad_case:
             return CheckResult(
                 rule="Call aliases are lowerCamelCase",
                 status=Status.FAIL,
-                details=f"Non-conforming aliases: {', '.join(bad_case)}",
+                details=f"Non-conforming aliases: {', '.join(c.alias for c in bad_case)}",
+                locations=[self.location(c.start, c.start + len(c.alias)) for c in bad_case],
             )
         if missing_alias:
             return CheckResult(
                 rule="Call aliases are lowerCamelCase",
                 status=Status.WARN,
-                details=f"Calls missing 'as' alias: {', '.join(missing_alias)}",
+                details=f"Calls missing 'as' alias: {', '.join(c.target for c in missing_alias)}",
+                locations=[self.location(c.start, c.start + len(c.target)) for c in missing_alias],
             )
         return CheckResult(rule="Call aliases are lowerCamelCase", status=Status.PASS)
 
     def check_set_pipefail(self) -> CheckResult:
         """Warn for command blocks with multiple commands but no set -e -o pipefail."""
-        blocks = _extract_command_blocks(self.text)
         missing = []
-        for i, block in enumerate(blocks):
+        locations = []
+        for i, command in enumerate(self.summary.commands):
             # Only care if there are multiple non-trivial command lines
-            cmd_lines = [
-                ln.strip() for ln in block.splitlines()
-                if ln.strip() and not ln.strip().startswith("#")
-            ]
-            if len(cmd_lines) > 1 and "set -e -o pipefail" not in block:
-                # Try to find what task this belongs to (rough heuristic)
+            if command.lines > 1 and not command.pipefail:
                 missing.append(f"block {i + 1}")
+                locations.append(self.location(command.start, command.start + len("command")))
 
         if missing:
             return CheckResult(
                 rule="set -e -o pipefail in multi-command blocks",
                 status=Status.WARN,
                 details=f"Missing in: {', '.join(missing)}",
+                locations=locations,
             )
         return CheckResult(rule="set -e -o pipefail in multi-command blocks", status=Status.PASS)
 
     def check_parameter_meta(self) -> CheckResult:
         """Warn for tasks/workflows that have no parameter_meta block."""
-        missing = []
-        # Find each task/workflow block and check for parameter_meta inside it
-        for pattern, kind in [(r"\btask\s+(\w+)\s*\{", "task"), (r"\bworkflow\s+(\w+)\s*\{", "workflow")]:
-            for m in re.finditer(pattern, self.text):
-                name = m.group(1)
-                brace_pos = self.text.index("{", m.start())
-                depth = 0
-                block_end = brace_pos
-                for i, ch in enumerate(self.text[brace_pos:], start=brace_pos):
-                    if ch == "{":
-                        depth += 1
-                    elif ch == "}":
-                        depth -= 1
-                        if depth == 0:
-                            block_end = i
-                            break
-                block_text = self.text[brace_pos:block_end]
-                if "parameter_meta" not in block_text:
-                    missing.append(f"{kind} '{name}'")
-
+        # Tasks first, then workflows
+        missing = [d for d in self.summary.definitions if d.kind == "task" and not d.parameter_meta]
+        missing += [d for d in self.summary.definitions if d.kind == "workflow" and not d.parameter_meta]
         if missing:
+            names = [f"{d.kind} '{d.name}'" for d in missing]
             return CheckResult(
                 rule="parameter_meta section present",
                 status=Status.WARN,
-                details=f"Missing in: {', '.join(missing)}",
+                details=f"Missing in: {', '.join(names)}",
+                locations=[self.location(d.start, d.start + len(d.name)) for d in missing],
             )
         return CheckResult(rule="parameter_meta section present", status=Status.PASS)
 
     def check_docker_runtime(self) -> CheckResult:
         """Warn for runtime blocks that have no docker: entry."""
-        runtime_blocks = re.findall(r"\bruntime\s*\{([^}]*)\}", self.text, re.DOTALL)
-        missing_count = sum(1 for b in runtime_blocks if "docker" not in b)
-        if missing_count:
+        runtime_blocks = self.summary.runtimes
+        missing = [r for r in runtime_blocks if "docker" not in r.keys]
+        if missing:
             return CheckResult(
                 rule="docker defined in runtime blocks",
                 status=Status.WARN,
-                details=f"{missing_count} runtime block(s) missing 'docker'",
+                details=f"{len(missing)} runtime block(s) missing 'docker'",
+                locations=[self.location(r.start, r.start + len("runtime")) for r in missing],
             )
         if not runtime_blocks:
             return CheckResult(
@@ -256,6 +442,12 @@ class StyleChecker:
     # -- run all ---------------------------------------------------------------
 
     def run_all(self) -> list[CheckResult]:
+        with profiling.stage("check"):
+            results = self._run_all()
+        profiling.count("style_checks", len(results))
+        return results
+
+    def _run_all(self) -> list[CheckResult]:
         return [
             # formatter-guaranteed
             self.check_indentation(),
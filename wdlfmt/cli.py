@@ -1,7 +1,12 @@
 import argparse
 import sys
-from .visitor import format_wdl, format_wdl_str
-from .checker import StyleChecker, print_checklist
+from collections import Counter
+
+from . import profiling
+from .modes import DEFAULT_PARSE_MODE, DEFAULT_VERIFY_MODE, PARSE_MODES, VERIFY_MODES
+
+# The parser, formatters and checker are imported once there are files to
+# format, so that `wdlfmt --help` and a bare `wdlfmt` start up quickly.
 
 
 def cli():
@@ -30,6 +35,68 @@ def cli():
         action="store_true",
         help="Skip the BioWDL style guide compliance checklist",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of files to format in parallel (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not skip files the format cache records as already formatted, "
+        "and do not reuse formatted command blocks from earlier runs",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help="Directory for the format cache (default: $WDLFMT_CACHE_DIR or the user cache directory)",
+    )
+    parser.add_argument(
+        "--warm-start",
+        action="store_true",
+        help="Start the lexer and parser from the prediction state saved by earlier runs in the cache "
+        "directory, and save what this run learns for the next one. Not used with --daemon",
+    )
+    parser.add_argument(
+        "--parse-mode",
+        choices=PARSE_MODES,
+        default=DEFAULT_PARSE_MODE,
+        help="Parse with fast SLL prediction and fall back to full LL only on failure "
+        "(two-stage), or always use full LL (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--verify",
+        choices=VERIFY_MODES,
+        default=DEFAULT_VERIFY_MODE,
+        help="Check that formatting changed nothing but layout by comparing tokens (fast), "
+        "also check that the output parses and is stable (full), or skip the check "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--daemon",
+        metavar="ADDR",
+        nargs="?",
+        const="",
+        help="Format through a running wdlfmtd at ADDR (unix:/path, host:port or port; "
+        "default: $WDLFMTD_ADDRESS or 127.0.0.1:45485). The format cache is not used",
+    )
+    parser.add_argument(
+        "--parse-stats",
+        action="store_true",
+        help="Report how many files were parsed by the SLL and LL stages",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Report the time spent in each stage (lex, parse, format, shfmt, ...) and counters "
+        "such as tokens and shfmt cache hits, summed over all files. Not available with --daemon",
+    )
+    parser.add_argument(
+        "--profile-json",
+        metavar="FILE",
+        help="Write the --profile report to FILE as JSON (implies --profile)",
+    )
 
     args = parser.parse_args()
 
@@ -37,34 +104,122 @@ def cli():
         parser.print_help()
         return
 
-    if args.in_place:
-        format_wdl(files=args.files, in_place=True)
-        return
+    from .daemon import DaemonError
+
+    stages = Counter()
+    profile = profiling.Profile() if args.profile or args.profile_json else None
+    try:
+        _run(args, stages, profile)
+    except DaemonError as e:
+        sys.stderr.write(f"error: {e}\n")
+        sys.exit(1)
+    finally:
+        if args.parse_stats:
+            print_parse_stats(stages, file=sys.stderr)
+        if profile is not None:
+            print_profile(profile, args.profile_json, file=sys.stderr)
+
+
+def print_parse_stats(stages: Counter, file=None) -> None:
+    print(f"Parse stages: {stages['sll']} SLL, {stages['ll']} LL", file=file)
+
+
+def print_profile(profile: profiling.Profile, json_path: str = None, file=None) -> None:
+    print(profile.format_table(), end="", file=file)
+    if json_path:
+        with open(json_path, "w") as f:
+            f.write(profile.to_json() + "\n")
+
+
+def _run(args, stages: Counter, profile: profiling.Profile = None):
+    from .checker import StyleChecker, print_checklist
+    from .results import add_footer
+
+    check_style = not (args.check or args.in_place or args.no_check)
+    if args.daemon is not None:
+        # A thin client: the parser and formatters are only loaded by wdlfmtd.
+        from .daemon import DaemonClient, format_files_with_daemon
+
+        client = DaemonClient(args.daemon or None)
+        results = format_files_with_daemon(
+            args.files, client, parse_mode=args.parse_mode, check_style=check_style, verify=args.verify
+        )
+    else:
+        from .batch import default_jobs, format_many
+        from .cache import FormatCache
+        from .formatters.shell_formatter import configure_shfmt_cache, get_shfmt_runner
+
+        if args.warm_start:
+            from .parser_state import enable_warm_start
+
+            enable_warm_start(args.cache_dir)
+
+        cache = None
+        if not args.no_cache:
+            # Command blocks are formatted by shfmt, so its version is part of the key.
+            options = {"parse_mode": args.parse_mode, "shfmt": get_shfmt_runner().version}
+            cache = FormatCache(options=options, directory=args.cache_dir)
+            configure_shfmt_cache(cache.directory / "shfmt")
+
+        results = format_many(
+            args.files,
+            jobs=default_jobs() if args.jobs is None else args.jobs,
+            parse_mode=args.parse_mode,
+            check_style=check_style,
+            cache=cache,
+            verify=args.verify,
+            profile=profile is not None,
+        )
+
+    failures = []
+    errors = []
+    for result in results:
+        if result.parse_stage is not None:
+            stages[result.parse_stage] += 1
+        if profile is not None and result.profile is not None:
+            profile.add(result.profile)
+        if args.daemon is not None:
+            # Reported by the parser in the daemon, not on this terminal.
+            for message in result.syntax_errors:
+                sys.stderr.write(f"{result.path}: {message}\n")
+
+        if result.error is not None:
+            sys.stderr.write(f"error: cannot format {result.path}: {result.error}\n")
+            errors.append(result.path)
+            continue
+
+        if result.cached:
+            # Already formatted: nothing to check or write, but stdout
+            # mode still has to echo the file.
+            if not (args.check or args.in_place):
+                with open(result.path, "r") as f:
+                    result.formatted = result.source = f.read()
+                if check_style:
+                    result.check_results = StyleChecker(result.formatted).run_all()
+            else:
+                continue
+
+        if args.check:
+            if result.changed:
+                sys.stderr.write(f"would reformat: {result.path}\n")
+                failures.append(result.path)
+        elif args.in_place:
+            with open(result.path, "w") as f:
+                f.write(add_footer(result.formatted))
+        else:
+            sys.stdout.write(add_footer(result.formatted))
+            if result.check_results is not None:
+                print_checklist(result.check_results, file=sys.stderr)
 
     if args.check:
-        failures = []
-        for path in args.files:
-            content = open(path).read()
-            if format_wdl_str(content) != content:
-                sys.stderr.write(f"would reformat: {path}\n")
-                failures.append(path)
-        n = len(args.files)
+        n = len(args.files) - len(errors)
+        summary = []
         if failures:
-            sys.stderr.write(
-                f"{len(failures)} file(s) would be reformatted, "
-                f"{n - len(failures)} file(s) already correctly formatted.\n"
-            )
-            sys.exit(1)
-        sys.stderr.write(f"{n} file(s) already correctly formatted.\n")
-        return
-
-    # Capture formatted text so we can both print it and run the checker.
-    formatted_texts = format_wdl(files=args.files, in_place=False, return_object=True)
-    if isinstance(formatted_texts, str):
-        formatted_texts = [formatted_texts]
+            summary.append(f"{len(failures)} file(s) would be reformatted")
+        summary.append(f"{n - len(failures)} file(s) already correctly formatted")
+        if errors:
+            summary.append(f"{len(errors)} file(s) could not be formatted")
+        sys.stderr.write(", ".join(summary) + ".\n")
 
-    for text in formatted_texts:
-        sys.stdout.write(text)
-        if not args.no_check:
-            results = StyleChecker(text).run_all()
-            print_checklist(results, file=sys.stderr)
+    if failures or errors:
+        sys.exit(1)
@@ -0,0 +1,488 @@
+"""A resident formatting server, and the client the CLI uses to talk to it.
+
+Starting `wdlfmt` costs Python start-up, importing the generated parser,
+deserializing its ATN and warming the prediction caches before the first
+byte is formatted. `wdlfmtd` pays that once and then serves format and
+check requests over HTTP, on a localhost TCP port or a Unix socket:
+
+    wdlfmtd                          # http://127.0.0.1:45485
+    wdlfmtd --bind unix:/tmp/wdlfmtd.sock -j 4
+
+    wdlfmt --daemon file.wdl         # format through the default daemon
+    wdlfmt --daemon unix:/tmp/wdlfmtd.sock --check *.wdl
+
+Requests are formatted by a pool of warm worker processes, so concurrent
+requests run in parallel.
+
+Protocol (all bodies are UTF-8):
+
+* `GET /ping`: `200` with the wdlfmt version.
+* `POST /format`: the body is the WDL source. `200` with the formatted text
+  (no footer) if it changed, `204` if it was already formatted, `400` with
+  the error message if it could not be formatted. Syntax errors the parser
+  recovered from are sent as a JSON list in the `X-Syntax-Errors` header.
+* `POST /check`: the body is the WDL source. `200` with a JSON object holding
+  `changed`, `syntax_errors` and the style checker `results` for the
+  formatted text, or `400` as above.
+
+The parse mode and verify mode (see `wdlfmt.verify`) can be chosen per
+request with the `X-Parse-Mode` and `X-Verify` headers.
+
+This module only imports the formatter in the server, so the client side
+stays cheap to import.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 45485
+DEFAULT_ADDRESS = f"{DEFAULT_HOST}:{DEFAULT_PORT}"
+
+ADDRESS_ENV = "WDLFMTD_ADDRESS"
+
+# Formatted in each worker at start-up to load the grammar and warm the caches.
+_WARM_UP = """version 1.0
+
+task WarmUp {
+    input {
+        String name = "wdlfmt"
+    }
+    command <<<
+        echo ~{name}
+    >>>
+    output {
+        String out = read_string(stdout())
+    }
+    runtime {
+        docker: "debian:stable-slim"
+    }
+}
+
+workflow Main {
+    call WarmUp {
+        input:
+            name = "wdlfmtd"
+    }
+}
+"""
+
+
+class DaemonError(Exception):
+    """The daemon could not be reached or answered unexpectedly."""
+
+
+def parse_address(address: str) -> Tuple[str, object]:
+    """Split an address into `("unix", path)` or `("tcp", (host, port))`.
+
+    Accepts `unix:/path/to.sock`, `host:port`, `:port` or a bare port.
+    """
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or DEFAULT_HOST, int(port))
+
+
+def default_address() -> str:
+    return os.environ.get(ADDRESS_ENV) or DEFAULT_ADDRESS
+
+
+# ── server ────────────────────────────────────────────────────────────────────
+
+def _warm_worker():
+    from .batch import format_text
+
+    format_text(_WARM_UP, report_errors=False)
+
+
+def _ready():
+    return True
+
+
+def _format_request(source: str, parse_mode: str, check_style: bool, verify: str):
+    from .batch import format_text
+
+    result = format_text(
+        source, parse_mode=parse_mode, check_style=check_style, report_errors=False, verify=verify
+    )
+    # Exceptions are not reliably picklable, only the message is sent back.
+    result.exception = None
+    return result
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "wdlfmtd"
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket peers have no address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _reply(self, status: int, body: bytes = b"", content_type: str = "text/plain", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if status != 204:
+            self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status != 204:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/ping":
+            self._reply(404, b"not found\n")
+            return
+        from .cache import wdlfmt_version
+
+        self._reply(200, f"wdlfmtd {wdlfmt_version()}\n".encode())
+
+    def do_POST(self):
+        if self.path not in ("/format", "/check"):
+            # The body is left unread, so it must not be parsed as the next request.
+            self.close_connection = True
+            self._reply(404, b"not found\n")
+            return
+        # Read the body before any other validation so that the connection
+        # can be kept alive after an error reply.
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError as e:
+            self.close_connection = True
+            self._reply(400, f"bad request: {e}\n".encode())
+            return
+        body = self.rfile.read(length)
+
+        from .modes import PARSE_MODES, VERIFY_MODES
+
+        parse_mode = self.headers.get("X-Parse-Mode", self.server.parse_mode)
+        if parse_mode not in PARSE_MODES:
+            self._reply(400, f"unknown parse mode {parse_mode!r}\n".encode())
+            return
+        verify = self.headers.get("X-Verify", self.server.verify)
+        if verify not in VERIFY_MODES:
+            self._reply(400, f"unknown verify mode {verify!r}\n".encode())
+            return
+        try:
+            source = body.decode("utf-8")
+        except UnicodeDecodeError as e:
+            self._reply(400, f"bad request: {e}\n".encode())
+            return
+
+        check = self.path == "/check"
+        try:
+            result = self.server.run(_format_request, source, parse_mode, check, verify)
+        except Exception as e:
+            # A worker died again, or the pool is shutting down.
+            self._reply(500, f"{type(e).__name__}: {e}\n".encode())
+            return
+        if result.error is not None:
+            self._reply(400, (result.error + "\n").encode())
+            return
+
+        if check:
+            body = {
+                "changed": result.changed,
+                "syntax_errors": result.syntax_errors,
+                "results": [
+                    {"rule": r.rule, "status": r.status.value, "details": r.details}
+                    for r in result.check_results
+                ],
+            }
+            self._reply(200, json.dumps(body).encode(), content_type="application/json")
+            return
+
+        headers = {}
+        if result.syntax_errors:
+            headers["X-Syntax-Errors"] = json.dumps(result.syntax_errors)
+        if result.changed:
+            self._reply(200, result.formatted.encode("utf-8"), headers=headers)
+        else:
+            self._reply(204, headers=headers)
+
+
+def _make_pool(jobs: int) -> Executor:
+    """A warm pool of `jobs` worker processes, or with `1` a single thread."""
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=_warm_worker)
+        # Start (and warm) every worker now rather than on the first requests.
+        for future in [pool.submit(_ready) for _ in range(jobs)]:
+            future.result()
+    else:
+        # The parser caches are not thread-safe, so one formatting thread.
+        pool = ThreadPoolExecutor(max_workers=1)
+        pool.submit(_warm_worker).result()
+    return pool
+
+
+class _ServerMixin:
+    daemon_threads = True
+    pool: Executor
+    jobs: int
+    parse_mode: str
+    verify: str
+    verbose: bool
+    _pool_lock: threading.Lock
+
+    def run(self, fn, *args):
+        """Run `fn(*args)` in the pool and return its result.
+
+        A worker that died (killed, out of memory, a crash in shfmt) breaks
+        the whole process pool, so it is replaced with a fresh one and the
+        call is tried once more.
+        """
+        pool = self.pool
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+        return self.pool.submit(fn, *args).result()
+
+    def _replace_pool(self, broken: Executor) -> None:
+        with self._pool_lock:
+            # Another request may have replaced it already.
+            if self.pool is broken:
+                broken.shutdown(wait=False)
+                self.pool = _make_pool(self.jobs)
+                if self.verbose:
+                    sys.stderr.write("wdlfmtd: a worker died, restarted the worker pool\n")
+
+
+class TCPServer(_ServerMixin, ThreadingHTTPServer):
+    pass
+
+
+class UnixServer(_ServerMixin, socketserver.ThreadingUnixStreamServer):
+    def server_bind(self):
+        # Replace a socket left behind by a daemon that did not shut down.
+        if os.path.exists(self.server_address):
+            try:
+                os.remove(self.server_address)
+            except OSError:
+                pass
+        super().server_bind()
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.server_address)
+        except OSError:
+            pass
+
+
+def make_server(address: str = DEFAULT_ADDRESS, jobs: int = 1, parse_mode: Optional[str] = None,
+                verbose: bool = False, verify: Optional[str] = None):
+    """Create (but do not start) a daemon bound to `address`.
+
+    Args:
+        address: `unix:/path`, `host:port` or a port number.
+        jobs: Worker processes. With `1` requests are formatted one at a time
+            in the server process itself.
+        parse_mode: The parse mode when a request does not set one.
+        verbose: Log every request to stderr.
+        verify: The verify mode when a request does not set one.
+    """
+    from .verify import DEFAULT_VERIFY_MODE, check_verify_mode
+    from .visitor import DEFAULT_PARSE_MODE
+
+    verify = verify or DEFAULT_VERIFY_MODE
+    check_verify_mode(verify)
+
+    kind, target = parse_address(address)
+    server = UnixServer(target, _Handler) if kind == "unix" else TCPServer(target, _Handler)
+    server.pool = _make_pool(jobs)
+    server.jobs = jobs
+    server._pool_lock = threading.Lock()
+    server.parse_mode = parse_mode or DEFAULT_PARSE_MODE
+    server.verify = verify
+    server.verbose = verbose
+    return server
+
+
+def main(argv: Optional[List[str]] = None):
+    """Entry point for `wdlfmtd`."""
+    from .batch import default_jobs
+    from .modes import DEFAULT_PARSE_MODE, DEFAULT_VERIFY_MODE, PARSE_MODES, VERIFY_MODES
+
+    parser = argparse.ArgumentParser(description="Serve wdlfmt over HTTP with a warm parser.")
+    parser.add_argument(
+        "--bind",
+        metavar="ADDR",
+        default=default_address(),
+        help="unix:/path/to.sock, host:port or port (default: $WDLFMTD_ADDRESS or %(default)s)",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--parse-mode",
+        choices=PARSE_MODES,
+        default=DEFAULT_PARSE_MODE,
+        help="Parse mode for requests that do not set X-Parse-Mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--verify",
+        choices=VERIFY_MODES,
+        default=DEFAULT_VERIFY_MODE,
+        help="Verify mode for requests that do not set X-Verify (default: %(default)s)",
+    )
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args(argv)
+
+    server = make_server(
+        args.bind, jobs=args.jobs, parse_mode=args.parse_mode, verbose=args.verbose, verify=args.verify
+    )
+    # Shut down cleanly (removing the socket file) when terminated.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    sys.stderr.write(f"wdlfmtd listening on {args.bind}\n")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.pool.shutdown(cancel_futures=True)
+
+
+# ── client ────────────────────────────────────────────────────────────────────
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class DaemonClient:
+    """A client for a running `wdlfmtd`.
+
+    Args:
+        address: `unix:/path`, `host:port` or a port number.
+        timeout: Seconds to wait for a connection or a reply.
+    """
+
+    def __init__(self, address: Optional[str] = None, timeout: float = 60.0):
+        self.address = address or default_address()
+        self.timeout = timeout
+        self._kind, self._target = parse_address(self.address)
+
+    def _connection(self):
+        if self._kind == "unix":
+            return _UnixHTTPConnection(self._target, self.timeout)
+        host, port = self._target
+        return http.client.HTTPConnection(host, port, timeout=self.timeout)
+
+    def _request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[str] = None,
+        parse_mode: Optional[str] = None,
+        verify: Optional[str] = None,
+    ):
+        headers = {}
+        if parse_mode is not None:
+            headers["X-Parse-Mode"] = parse_mode
+        if verify is not None:
+            headers["X-Verify"] = verify
+        data = body.encode("utf-8") if body is not None else None
+        connection = self._connection()
+        try:
+            connection.request(method, path, body=data, headers=headers)
+            response = connection.getresponse()
+            return response.status, response.getheaders(), response.read().decode("utf-8")
+        except OSError as e:
+            raise DaemonError(f"cannot reach wdlfmtd at {self.address}: {e}") from e
+        finally:
+            connection.close()
+
+    def ping(self) -> str:
+        """Return the daemon's version string."""
+        status, _, body = self._request("GET", "/ping")
+        if status != 200:
+            raise DaemonError(f"unexpected reply from wdlfmtd: {status}")
+        return body.strip()
+
+    def format(self, source: str, parse_mode: Optional[str] = None, verify: Optional[str] = None):
+        """Format `source`.
+
+        Returns:
+            A `(formatted, syntax_errors, error)` tuple. `formatted` is the
+            formatted text (equal to `source` if it was already formatted) or
+            `None` if `error` is set.
+        """
+        status, headers, body = self._request("POST", "/format", source, parse_mode, verify)
+        syntax_errors = json.loads(dict(headers).get("X-Syntax-Errors", "[]"))
+        if status == 200:
+            return body, syntax_errors, None
+        if status == 204:
+            return source, syntax_errors, None
+        if status == 400:
+            return None, syntax_errors, body.strip()
+        raise DaemonError(f"unexpected reply from wdlfmtd: {status} {body.strip()}")
+
+    def check(self, source: str, parse_mode: Optional[str] = None, verify: Optional[str] = None) -> dict:
+        """Return the `/check` reply for `source` as a dict."""
+        status, _, body = self._request("POST", "/check", source, parse_mode, verify)
+        if status == 200:
+            return json.loads(body)
+        if status == 400:
+            return {"error": body.strip()}
+        raise DaemonError(f"unexpected reply from wdlfmtd: {status} {body.strip()}")
+
+
+def format_files_with_daemon(
+    paths,
+    client: DaemonClient,
+    parse_mode: Optional[str] = None,
+    check_style: bool = False,
+    verify: Optional[str] = None,
+):
+    """Like `wdlfmt.batch.format_files`, but formatting through `client`.
+
+    Yields one `FileResult` per path, in order. Style checks run locally.
+    """
+    from .checker import StyleChecker
+    from .results import FileResult
+
+    for path in paths:
+        try:
+            with open(path, "r") as f:
+                source = f.read()
+        except OSError as e:
+            yield FileResult(path, error=f"{type(e).__name__}: {e}")
+            continue
+        formatted, syntax_errors, error = client.format(source, parse_mode, verify)
+        result = FileResult(path, source=source, formatted=formatted, error=error, syntax_errors=syntax_errors)
+        if check_style and formatted is not None:
+            result.check_results = StyleChecker(formatted).run_all()
+        yield result
+
+
+if __name__ == "__main__":
+    main()
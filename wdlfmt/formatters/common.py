@@ -1,57 +1,39 @@
-from ..grammar.WdlV1Parser import (
-    WdlV1Parser,
-    ParserRuleContext,
-    ParseTreeListener,
-    ParseTreeVisitor,
-)
 from abc import ABC, abstractmethod
+from types import MappingProxyType
+from typing import Mapping
 
+from ..syntax import Node
 from ..utils import init_logger
+from . import layout
 
 DEBUG = True
 
 
-class CommentContext(ParserRuleContext):
-    __slots__ = "parser"
-
-    def __init__(self, token):
-        super().__init__(None, -1)
-        self.token = token
-
-    def getRuleIndex(self):
-        return WdlV1Parser.RULE_task
-
-    def getText(self):
-        return self.token.text
-
-    def enterRule(self, listener: ParseTreeListener):
-        if hasattr(listener, "enterTask"):
-            listener.enterTask(self)
-
-    def exitRule(self, listener: ParseTreeListener):
-        if hasattr(listener, "exitTask"):
-            listener.exitTask(self)
-
-    def accept(self, visitor: ParseTreeVisitor):
-        if hasattr(visitor, "visitComment"):
-            return visitor.visitComment(self)
-        else:
-            return visitor.visitChildren(self)
-
-
 class Formatter(ABC):
     def __init__(self):
         self.log = init_logger(name=__name__)
 
+    def __init_subclass__(cls, **kwargs):
+        # Concrete subclasses register themselves, so defining (and importing)
+        # a formatter is all it takes to make it available.
+        super().__init_subclass__(**kwargs)
+        if not isinstance(getattr(cls, "formats", None), property):
+            registry.register(cls)
+
     @abstractmethod
-    def format(self, input: ParserRuleContext, indent: int = 0) -> str:
+    def format(self, input: Node, indent: int = 0) -> str:
         """Logic for formatting the input"""
         pass
 
+    def doc(self, input: Node) -> layout.Doc:
+        """The formatted input as a layout document (see `layout.py`), without
+        the line break that ends it. By default, the lines of `format`."""
+        return layout.lines(self.format(input))
+
     @property
     @abstractmethod
     def formats(self):
-        """Class of the input to format"""
+        """Class of the input to format (a `wdlfmt.syntax` node class)"""
         pass
 
     @property
@@ -61,6 +43,36 @@ class Formatter(ABC):
         pass
 
 
+class LayoutFormatter(Formatter):
+    """A formatter that builds a layout document (see `layout.py`).
+
+    Subclasses implement `doc`; `format` prints the document once, with
+    `indent` levels of indentation, in lines of at most `width` characters
+    where the document allows. Blocks embed the documents of their elements
+    rather than their text, so a whole task or workflow is laid out in a
+    single pass.
+    """
+
+    @abstractmethod
+    def doc(self, input: Node) -> layout.Doc:
+        pass
+
+    def format(self, input: Node, indent: int = 0, width: int = layout.WIDTH) -> str:
+        return layout.render(self.doc(input), width, indent * layout.INDENT) + "\n"
+
+
+def block(header: str, elements) -> layout.Doc:
+    """`header`, the documents of `elements` on their own lines one level
+    deeper, and a closing brace followed by a blank line."""
+    return [
+        header,
+        layout.nest(layout.INDENT, [[layout.HARDLINE, element] for element in elements]),
+        layout.HARDLINE,
+        "}",
+        layout.HARDLINE,
+    ]
+
+
 def subset_children(children, types):
     if isinstance(types, list):
         out = []
@@ -75,88 +87,91 @@ def indent_text(text, level=0, spaces=4):
     return "".join([f"{' '*spaces*level}{line}" for line in text.splitlines(True)])
 
 
-def create_formatters_dict():
-    """Create a dictionary of all formatters"""
-    formatters = {}
-    for formatter in Formatter.__subclasses__():
-        formatters[formatter().formats] = formatter()
-    return formatters
+class FormatterRegistry:
+    """Type-keyed dispatch table from syntax node classes to formatters.
 
+    Every registered `Formatter` class is instantiated once and shared. The
+    tables handed out by `all` and `public` are read-only snapshots keyed by
+    node class, so dispatching a node is a single dict lookup on `type(node)`.
+    Registering a formatter invalidates the snapshots and new ones are built
+    on next access; a snapshot already handed out never changes.
+    """
 
-def flatten_tree_and_insert_comments(
-    tree, comments, idxs, found=[], found_comments=[], toplevel=True
-):
-    """Flatten the tree and insert comments in the right place"""
+    def __init__(self):
+        self._classes = []
+        self._instances = {}
+        self._all = None
+        self._public = None
+
+    def register(self, formatter_class):
+        """Register `formatter_class` for the node class(es) in its `formats`.
+
+        A later registration for the same node class replaces the earlier one.
+        Returns the class, so this can be used as a decorator.
+        """
+        self._classes.append(formatter_class)
+        self._all = self._public = None
+        return formatter_class
+
+    def _build(self):
+        # Instances are created here rather than in register(): register()
+        # runs from __init_subclass__, before ABCMeta has finished the class.
+        table, public = {}, {}
+        for formatter_class in self._classes:
+            instance = self._instances.get(formatter_class)
+            if instance is None:
+                instance = self._instances[formatter_class] = formatter_class()
+            formats = instance.formats
+            for node_class in formats if isinstance(formats, list) else [formats]:
+                table[node_class] = instance
+                if instance.public:
+                    public[node_class] = instance
+                else:
+                    public.pop(node_class, None)
+        self._all = MappingProxyType(table)
+        self._public = MappingProxyType(public)
 
-    print(f"Initial found: {found}")
+    @property
+    def all(self) -> Mapping[type, "Formatter"]:
+        """Every registered formatter, keyed by the node class it formats."""
+        if self._all is None:
+            self._build()
+        return self._all
 
-    # If we've already found the comment, don't do anything
-    for f in found:
-        if f in idxs:
-            idxs.remove(f)
+    @property
+    def public(self) -> Mapping[type, "Formatter"]:
+        """Only the top-level (`public = True`) formatters used by `WdlVisitor`."""
+        if self._public is None:
+            self._build()
+        return self._public
 
-    for f in found_comments:
-        if f in comments:
-            comments.remove(f)
 
-    for idx, comment in zip(idxs, comments):
-        print("Checking idx: ", idx)
-        # set = False
+registry = FormatterRegistry()
 
-        # If we've already found the comment, don't do anything
 
-        # if idx == 18:
-        #     breakpoint()
+def register_formatter(formatter_class):
+    """Register a `Formatter` subclass (usable as a class decorator).
 
-        for child in tree.children:
+    Subclasses of `Formatter` are registered automatically when they are
+    defined; this is for formatters built some other way, or to register a
+    class again so it takes precedence.
+    """
+    return registry.register(formatter_class)
 
-            # if set:
-            #     break
 
-            if idx in found:
-                continue
+def all_formatters() -> Mapping[type, "Formatter"]:
+    """The dispatch table of all formatters, keyed by node class."""
+    return registry.all
 
-            # If the child is a comment, skip it
-            # I know... this is a hack
-            if isinstance(child, CommentContext) or "Comment" in str(type(child)):
-                continue
 
-            if hasattr(child, "children"):
-                # Check if the comment is in the children
-                tkn_index = child.start.tokenIndex
+def public_formatters() -> Mapping[type, "Formatter"]:
+    """The dispatch table of top-level formatters, keyed by node class."""
+    return registry.public
 
-                if tkn_index >= idx:
-                    # If it is, insert the comment
-                    breakpoint()
-                    comment.top_level = toplevel
-                    tree.children.insert(tree.children.index(child), comment)
-                    found.append(idx)
-                    found_comments.append(comment)
-                    break
-                else:
-                    # If it isn't, recurse
-                    nfound = len(found)
-                    child, found, found_comments = flatten_tree_and_insert_comments(
-                        child, comments, idxs, found, found_comments, False
-                    )
-                    if len(found) > nfound:
-                        print(f"Found comment: {found[-1]}")
-                        # set = True
-                        tree.children[tree.children.index(child)] = child
-                        break
-
-            else:
-                tkn_idx = child.symbol.tokenIndex
-                if tkn_idx >= idx:
-                    print(f"Adding at {tkn_idx} {comment}")
-                    breakpoint()
-                    comment.top_level = toplevel
-                    tree.children.insert(tree.children.index(child), comment)
-                    found += [idx]
-                    found_comments += [comment]
-                    break
-
-    return tree, found, found_comments
+
+def create_formatters_dict():
+    """Create a dictionary of all formatters"""
+    return dict(registry.all)
 
 
 def get_position(node):
@@ -166,19 +181,6 @@ def get_position(node):
         return node.symbol.tokenIndex
 
 
-def flatten_context_tree(tree, flat=None):
-    if flat is None:
-        flat = []
-    for child in tree.children:
-        if has_children(child):
-            flat.append(get_position(child))
-            flat = flatten_context_tree(child, flat)
-        else:
-            flat.append(get_position(child))
-
-    return flat
-
-
 def has_children(elm):
     if hasattr(elm, "children"):
         if elm.children is not None:
@@ -186,96 +188,59 @@ def has_children(elm):
     return False
 
 
-def find_elm_with_given_index_in_tree(tree, idx):
-    """Find the element with the given index in the tree"""
-
-    # Prefer top-level elements, because this means
-    # that the comment is before the first element
-    # in the subtree
-    if get_position(tree) == idx:
-        return tree
+def index_tree_positions(tree):
+    """Map each token index to the first node, in pre-order, that starts there.
 
-    else:
-        for child in tree.children:
-            if has_children(child):
-                elm = find_elm_with_given_index_in_tree(child, idx)
-                if elm:
-                    return elm
-            else:
-                if get_position(child) == idx:
-                    return child
-    return None
-
-
-def find_comment_neighbours(comment_idxs, all_idxs, tree):
-    """Find the neighbour elements of a comment in the tree"""
-    neighbours = []
-    found = False
-    for cidx in comment_idxs:
-        for idx in all_idxs:
-            if idx > cidx:
-                neighbours.append(find_elm_with_given_index_in_tree(tree, idx))
-                found = True
-                break
-
-        if not found:
-            neighbours.append(find_elm_with_given_index_in_tree(tree, all_idxs[-1]))
+    Returns a dict of `token index -> (node, parent)`. The root itself is not
+    included: a comment can only be placed inside it.
+    """
+    first = {}
+    stack = [(child, tree) for child in reversed(tree.children or [])]
+    while stack:
+        node, parent = stack.pop()
+        position = get_position(node)
+        if position not in first:
+            first[position] = (node, parent)
+        if has_children(node):
+            stack.extend((child, node) for child in reversed(node.children))
+    return first
+
+
+def comment_neighbours(tree, comment_idxs):
+    """Where each comment belongs in the tree.
+
+    A comment belongs immediately before its neighbour: the outermost node
+    starting at the first token after the comment (the last node of the tree
+    for comments at the end). Comments arrive in token order, so one forward
+    sweep over the token indices finds every neighbour, in
+    O(tokens + nodes + comments).
 
+    Returns:
+        A `(neighbour, parent)` tuple for each of `comment_idxs`, in the same
+        order.
+    """
+    nodes = index_tree_positions(tree)
+    last = max(nodes)
+
+    order = sorted(range(len(comment_idxs)), key=lambda i: comment_idxs[i])
+    neighbours = [None] * len(comment_idxs)
+    position = 0
+    for i in order:
+        position = max(position, comment_idxs[i] + 1)
+        while position < last and position not in nodes:
+            position += 1
+        neighbours[i] = nodes[min(position, last)]
     return neighbours
 
 
-def insert_comment_into_tree(tree, comment, neighbour):
-    """Find the neighbour in the tree and insert the comment
-    at the same scope level"""
-
-    if tree == neighbour:
-        comment.top_level = "DocumentContext" in str(type(tree.parentCtx))
-        tree.parentCtx.children.insert(tree.parentCtx.children.index(tree), comment)
-        return tree.parentCtx
-
-    else:
-        if has_children(tree) and "Comment" not in str(type(tree)):
-            for child in tree.children:
-                if child == neighbour:
-                    comment.top_level = "DocumentContext" in str(type(tree))
-                    # breakpoint()
-                    tree.children.insert(tree.children.index(child), comment)
-                    return tree
-                else:
-                    child_index = tree.children.index(child)
-                    child = insert_comment_into_tree(child, comment, neighbour)
-                    tree.children[child_index] = child
-
-        return tree
-
-
-def insert_comments(tree, comments, comment_idxs):
-    """Insert comments in the tree"""
-    # Find the neighbour elements of the comments
-    all_idxs = flatten_context_tree(tree)
-    neighbours = find_comment_neighbours(comment_idxs, all_idxs, tree)
-
-    # Insert the comments in the tree
-    for comment, neighbour in zip(comments, neighbours):
-        tree = insert_comment_into_tree(tree, comment, neighbour)
-
-    return tree
-
-
 def collect_formatters(only_public: bool = True):
-    """Collect all the formatters for tasks"""
-    formatters = {}
-    for formatter in Formatter.__subclasses__():
-        if only_public and not formatter.public:
-            continue
-
-        if isinstance(formatter().formats, list):
-            for format in formatter().formats:
-                formatters[str(format)] = formatter()
-        else:
-            formatters[str(formatter().formats)] = formatter()
+    """Collect the formatters keyed by `str(node_class)`.
 
-    return formatters
+    Kept for code written against the old string-keyed registry; new code
+    should use `all_formatters()` / `public_formatters()` and `type(node)`.
+    """
+    table = registry.public if only_public else registry.all
+    return {str(node_class): formatter for node_class, formatter in table.items()}
 
 
 def create_public_formatters_dict():
@@ -292,4 +257,4 @@ def create_public_formatters_dict():
     Returns:
         dict: Dictionary of all public formatters
     """
-    return {**collect_formatters()}
+    return dict(registry.public)
@@ -0,0 +1,209 @@
+"""A document IR for laying out formatted WDL, and a linear-time printer.
+
+Formatters describe their output as a document instead of building strings
+(see `LayoutFormatter`). A document is one of:
+
+* a `str`: text without line breaks;
+* a `list` or `tuple` of documents, one after the other (`concat`);
+* `HARDLINE`: a line break;
+* `LINE` or `SOFTLINE`: a line break, or a space (`LINE`) or nothing
+  (`SOFTLINE`) when the group around it is laid out flat;
+* `group(*docs)`: laid out flat if it fits in the rest of the line,
+  otherwise with its line breaks;
+* `nest(indent, *docs)`: line breaks inside it are followed by `indent`
+  more spaces than the ones around it.
+
+A line break is always followed by the indentation, even when the next line
+is empty. `fill` puts a group around every separator, so each one breaks
+only if the part after it does not fit.
+
+`render` prints a document in two linear passes, as in Oppen's algorithm: a
+group fits if its flat width, plus the text after it up to the next possible
+line break, fits in the remaining width. This needs no backtracking and no
+lookahead at print time, and nothing is re-indented after it has been
+printed. Documents are walked with an explicit stack, so
+nesting depth is not limited by Python's recursion limit.
+"""
+
+from typing import List, Sequence, Tuple, Union
+
+# The line length of the style guide (see `StyleChecker.check_line_length`).
+WIDTH = 100
+# The indentation of a block, and of the continuation lines of a broken
+# expression.
+INDENT = 4
+
+
+class _Line:
+    __slots__ = ("flat",)
+
+    def __init__(self, flat):
+        self.flat = flat
+
+
+class Group:
+    __slots__ = ("docs",)
+
+    def __init__(self, docs):
+        self.docs = docs
+
+
+class Nest:
+    __slots__ = ("indent", "docs")
+
+    def __init__(self, indent, docs):
+        self.indent = indent
+        self.docs = docs
+
+
+Doc = Union[str, list, tuple, _Line, Group, Nest]
+
+HARDLINE = _Line(None)
+LINE = _Line(" ")
+SOFTLINE = _Line("")
+
+
+def concat(*docs: Doc) -> Doc:
+    return list(docs)
+
+
+def group(*docs: Doc) -> Doc:
+    return Group(docs)
+
+
+def nest(indent: int, *docs: Doc) -> Doc:
+    return Nest(indent, docs)
+
+
+def join(separator: Doc, docs: Sequence[Doc]) -> Doc:
+    """`docs` with `separator` between each pair."""
+    joined = []
+    for i, doc in enumerate(docs):
+        if i:
+            joined.append(separator)
+        joined.append(doc)
+    return joined
+
+
+def fill(docs: Sequence[Doc], separator: Doc = LINE) -> Doc:
+    """`docs` separated by `separator`, breaking a line only before a part
+    that would not fit on it."""
+    return join(group(separator), docs)
+
+
+def lines(text: str) -> Doc:
+    """The lines of `text` (without the line break that ends it), with a
+    `HARDLINE` between each pair."""
+    if text.endswith("\n"):
+        text = text[:-1]
+    return join(HARDLINE, text.split("\n"))
+
+
+# The ends of groups and nests in the instructions for the printer.
+_END_GROUP = object()
+_END_NEST = object()
+
+
+def _instructions(doc: Doc) -> Tuple[list, List[float]]:
+    """The document as a flat list of strings, `_Line`s, `Group`s and `Nest`s
+    (standing for their start) and `_END_GROUP` and `_END_NEST`, and the
+    width each group needs to be laid out flat, in order: its flat width
+    plus the text after it up to the next line break. A group holding a
+    `HARDLINE` never fits."""
+    out = []
+    append = out.append
+    sizes = []
+    # For each open group: its index in `sizes`, the flat width and the
+    # number of hard line breaks before it.
+    open_groups = []
+    # The groups whose trailing text is still to be measured, as (index in
+    # `sizes`, text width before the end of the group).
+    pending = []
+    position = text = hard = 0
+    stack = [doc]
+    pop, push, extend = stack.pop, stack.append, stack.extend
+    while stack:
+        doc = pop()
+        kind = type(doc)
+        if kind is str:
+            if doc:
+                append(doc)
+                position += len(doc)
+                text += len(doc)
+        elif kind is list or kind is tuple:
+            extend(reversed(doc))
+        elif kind is _Line:
+            append(doc)
+            if doc.flat is None:
+                hard += 1
+            else:
+                position += len(doc.flat)
+            if pending:
+                for index, before in pending:
+                    sizes[index] += text - before
+                pending.clear()
+        elif kind is Group:
+            append(doc)
+            open_groups.append((len(sizes), position, hard))
+            sizes.append(0)
+            push(_END_GROUP)
+            extend(reversed(doc.docs))
+        elif kind is Nest:
+            append(doc)
+            push(_END_NEST)
+            extend(reversed(doc.docs))
+        elif doc is _END_GROUP:
+            append(doc)
+            index, start, hard_before = open_groups.pop()
+            if hard > hard_before:
+                sizes[index] = float("inf")
+            else:
+                sizes[index] = position - start
+                pending.append((index, text))
+        elif doc is _END_NEST:
+            append(doc)
+        else:
+            raise TypeError(f"Not a document: {doc!r}")
+    for index, before in pending:
+        sizes[index] += text - before
+    return out, sizes
+
+
+def render(doc: Doc, width: int = WIDTH, indent: int = 0) -> str:
+    """Print `doc` in lines of at most `width` characters where its groups
+    allow, starting at column `indent` (the first line is indented too).
+
+    The result does not end in a line break unless the document does.
+    """
+    instructions, sizes = _instructions(doc)
+
+    out = [" " * indent]
+    append = out.append
+    column = indent
+    indents = [indent]
+    flat = False
+    modes = []
+    groups = iter(sizes)
+    for instruction in instructions:
+        kind = type(instruction)
+        if kind is str:
+            append(instruction)
+            column += len(instruction)
+        elif kind is _Line:
+            if flat:
+                append(instruction.flat)
+                column += len(instruction.flat)
+            else:
+                column = indents[-1]
+                append("\n" + " " * column)
+        elif kind is Group:
+            modes.append(flat)
+            size = next(groups)
+            flat = flat or size <= width - column
+        elif kind is Nest:
+            indents.append(indents[-1] + instruction.indent)
+        elif instruction is _END_GROUP:
+            flat = modes.pop()
+        else:
+            indents.pop()
+    return "".join(out)
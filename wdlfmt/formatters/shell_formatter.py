@@ -1,10 +1,16 @@
+import hashlib
 import os
 import re
 import subprocess
 import sys
+import tempfile
+import uuid
 from abc import ABC, abstractmethod
-from os import remove
-from tempfile import NamedTemporaryFile
+from collections import OrderedDict, namedtuple
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from .. import profiling
 
 
 def _find_bin(name: str) -> str:
@@ -15,6 +21,309 @@ def _find_bin(name: str) -> str:
     return name
 
 
+# Number of formatted command blocks kept in memory by each `ShfmtRunner`.
+DEFAULT_SHFMT_CACHE_SIZE = 4096
+
+SHFMT_CACHE_SIZE_ENV = "WDLFMT_SHFMT_CACHE_SIZE"
+
+ShfmtCacheInfo = namedtuple("ShfmtCacheInfo", ["hits", "misses", "maxsize", "currsize", "processes"])
+
+
+def _default_cache_size() -> int:
+    value = os.environ.get(SHFMT_CACHE_SIZE_ENV)
+    if value is None:
+        return DEFAULT_SHFMT_CACHE_SIZE
+    return int(value)
+
+
+class ShfmtCache:
+    """Formatted scripts keyed by a hash of shfmt's version and the input script.
+
+    An LRU in memory, optionally backed by one file per script under
+    `directory` so results survive between runs and are shared by worker
+    processes. Keys are content hashes, so entries never go stale: a different
+    script or a different shfmt gets a different key.
+
+    Args:
+        maxsize: Entries kept in memory. The on-disk cache is not bounded.
+        directory: Where to keep the on-disk cache, or `None` for memory only.
+    """
+
+    def __init__(self, maxsize: int = None, directory: Union[str, Path, None] = None):
+        self.maxsize = _default_cache_size() if maxsize is None else maxsize
+        self.directory = Path(directory) if directory is not None else None
+        self._entries: "OrderedDict[str, str]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def get(self, key: str) -> Optional[str]:
+        formatted = self._entries.get(key)
+        if formatted is not None:
+            self._entries.move_to_end(key)
+            return formatted
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), "r", encoding="utf-8", newline="") as f:
+                formatted = f.read()
+        except OSError:
+            return None
+        self._remember(key, formatted)
+        return formatted
+
+    def put(self, key: str, formatted: str) -> None:
+        self._remember(key, formatted)
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+        except OSError:
+            # A read-only cache directory only costs us the reuse.
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+                f.write(formatted)
+            os.replace(tmp, path)
+        except OSError:
+            # Nor does a full one.
+            pass
+        finally:
+            # Gone after a successful replace; left behind by a failed write.
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def _remember(self, key: str, formatted: str) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = formatted
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+# Characters after which a `#` starts a comment rather than continuing a word.
+_WORD_BREAKS = frozenset(" \t\n;&|()<>")
+
+
+def _quotes_balanced(script: str) -> bool:
+    """True if every quote and backquote in `script` is closed by its end.
+
+    Only quoting is followed, which is enough to tell whether a line after
+    the script would be read as a line of its own. Scripts it gets wrong
+    (e.g. `$'...'` with an escaped quote) are only formatted on their own.
+    """
+    i, n = 0, len(script)
+    quote = None
+    while i < n:
+        c = script[i]
+        if quote == "'":
+            if c == "'":
+                quote = None
+        elif c == "\\":
+            i += 1
+        elif quote is not None:
+            if c == quote:
+                quote = None
+        elif c in "'\"`":
+            quote = c
+        elif c == "#" and (i == 0 or script[i - 1] in _WORD_BREAKS):
+            end = script.find("\n", i)
+            if end < 0:
+                break
+            i = end
+        i += 1
+    return quote is None
+
+
+class ShfmtRunner:
+    """Runs shfmt over stdin/stdout, batching many scripts into one process.
+
+    shfmt has no server mode, so the cost of starting it is amortized instead:
+    `format_many` joins scripts with a unique separator comment, formats them
+    in a single shfmt run and splits the output again. A top-level comment
+    line is left at column 0 and never merged with its neighbours, so the
+    chunks come back exactly as if each script had been formatted alone. If
+    the separators do not come back intact (for example one follows a
+    trailing pipe), or the process fails or is killed, each script is
+    formatted on its own instead. Scripts containing heredocs or an unclosed
+    quote, which would carry the separator into a string and hide a bad
+    split, are always formatted on their own.
+
+    Every result is stored in a `ShfmtCache`, so a script that was formatted
+    before, in this document or another one, never starts shfmt again.
+
+    Args:
+        bin: The shfmt binary.
+        cache: Where to keep results. Defaults to an in-memory `ShfmtCache`.
+
+    Attributes:
+        hits: Scripts answered from the cache.
+        misses: Scripts that had to be formatted by shfmt.
+        processes: Number of shfmt processes started.
+        fallbacks: Number of batches that had to be redone script by script.
+    """
+
+    def __init__(self, bin: str = _find_bin("shfmt"), cache: Optional[ShfmtCache] = None):
+        self.bin = bin
+        self.cache = cache if cache is not None else ShfmtCache()
+        self.hits = 0
+        self.misses = 0
+        self.processes = 0
+        self.fallbacks = 0
+        self._version = None
+        self._prefetched: Dict[str, str] = {}
+
+    def cache_info(self) -> ShfmtCacheInfo:
+        """Hit and miss counts and cache size, in the style of `functools.lru_cache`."""
+        return ShfmtCacheInfo(self.hits, self.misses, self.cache.maxsize, len(self.cache), self.processes)
+
+    @property
+    def version(self) -> str:
+        """The output of `shfmt --version`, asked for once per runner."""
+        if self._version is None:
+            self._version = self._run_args(["--version"], b"").strip()
+        return self._version
+
+    def key(self, script: str) -> str:
+        """The cache key for a placeholder-substituted script."""
+        return hashlib.sha256(f"{self.version}\0{script}".encode("utf-8")).hexdigest()
+
+    def _run_args(self, args: List[str], input: bytes, capture_stderr: bool = False) -> str:
+        self.processes += 1
+        profiling.count("shfmt_processes")
+        with profiling.stage("shfmt"):
+            completed = subprocess.run(
+                [self.bin, *args],
+                input=input,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE if capture_stderr else None,
+                check=True,
+            )
+        return completed.stdout.decode("utf-8")
+
+    def _run(self, script: str, capture_stderr: bool = False) -> str:
+        return self._run_args([], script.encode("utf-8"), capture_stderr)
+
+    def format(self, script: str) -> str:
+        """Format one script, from the cache if it has been formatted before."""
+        key = self.key(script)
+        formatted = self._prefetched.pop(key, None)
+        if formatted is not None:
+            # Formatted ahead of time for this call, so still a miss.
+            self.misses += 1
+            profiling.count("shfmt_cache_misses")
+            return formatted
+
+        formatted = self.cache.get(key)
+        if formatted is not None:
+            self.hits += 1
+            profiling.count("shfmt_cache_hits")
+            return formatted
+
+        self.misses += 1
+        profiling.count("shfmt_cache_misses")
+        formatted = self._run(script)
+        self.cache.put(key, formatted)
+        return formatted
+
+    def format_many(self, scripts: Iterable[str]) -> List[str]:
+        """Format `scripts`, returning the results in the same order.
+
+        Raises:
+            subprocess.CalledProcessError: If shfmt rejects one of the scripts.
+        """
+        scripts = list(scripts)
+        self.prefetch(scripts)
+        return [self.format(script) for script in scripts]
+
+    def prefetch(self, scripts: Iterable[str]) -> None:
+        """Format the uncached `scripts` in one batch ahead of the `format`
+        calls for them.
+
+        Scripts that cannot be batched are left for `format` to run (and
+        report errors for) individually.
+        """
+        keys = {}
+        for script in scripts:
+            key = self.key(script)
+            if key not in keys and self.cache.get(key) is None:
+                keys[key] = script
+
+        self._prefetched = {}
+        for key, formatted in zip(keys, self._run_batch(list(keys.values())) or []):
+            if formatted is not None:
+                self.cache.put(key, formatted)
+                self._prefetched[key] = formatted
+
+    def _run_batch(self, scripts: List[str]) -> Optional[List[Optional[str]]]:
+        """Format `scripts` in one process. Scripts that were not batched come
+        back as `None`, and `None` is returned if the batch failed."""
+        # An unterminated heredoc or quote would swallow the separator and the
+        # start of the next script without any error, so neither is batched.
+        batched = [i for i, script in enumerate(scripts) if "<<" not in script and _quotes_balanced(script)]
+        if len(batched) < 2:
+            return None
+
+        separator = f"# WDLFMT_SHFMT_SEPARATOR_{uuid.uuid4().hex}"
+        joined = f"\n{separator}\n".join(scripts[i].strip("\n") for i in batched) + "\n"
+        try:
+            output = self._run(joined, capture_stderr=True)
+        except (OSError, subprocess.SubprocessError):
+            self.fallbacks += 1
+            return None
+
+        chunks = [[]]
+        for line in output.split("\n"):
+            if line == separator:
+                chunks.append([])
+            else:
+                chunks[-1].append(line)
+        if len(chunks) != len(batched):
+            self.fallbacks += 1
+            return None
+
+        results = [None] * len(scripts)
+        for i, chunk in zip(batched, chunks):
+            results[i] = "\n".join(chunk).strip("\n") + "\n"
+        return results
+
+
+_runner = None
+
+
+def get_shfmt_runner() -> ShfmtRunner:
+    """Return the process-wide `ShfmtRunner`, creating it on first use."""
+    global _runner
+    if _runner is None:
+        _runner = ShfmtRunner()
+    return _runner
+
+
+def configure_shfmt_cache(directory: Union[str, Path, None] = None, maxsize: int = None) -> ShfmtRunner:
+    """Replace the process-wide runner with one using a fresh cache.
+
+    Args:
+        directory: Keep formatted command blocks on disk here as well as in
+            memory, or `None` for memory only.
+        maxsize: Entries kept in memory (default: `DEFAULT_SHFMT_CACHE_SIZE`).
+    """
+    global _runner
+    previous = _runner
+    _runner = ShfmtRunner(cache=ShfmtCache(maxsize=maxsize, directory=directory))
+    if previous is not None and previous.bin == _runner.bin:
+        # Same binary, so no need to ask for its version again.
+        _runner._version = previous._version
+    return _runner
+
+
 class ShellFormatter(ABC):
     def __init__(self, command, bin=_find_bin("shfmt")):
         self.command = command
@@ -34,9 +343,67 @@ class ShellFormatter(ABC):
         pass
 
 
+# The opening of a WDL interpolation. `${...}` is only an interpolation in
+# `command { }` blocks; in `command <<< >>>` blocks it is left to the shell.
+_TILDE_OPEN = re.compile(r"~\{")
+_ANY_OPEN = re.compile(r"[~$]\{")
+# Inside an interpolation, the next character that changes the nesting.
+_EXPR_SPECIAL = re.compile(r"[{}\"']")
+_STRING_END = {
+    '"': re.compile(r'[^"\\]*(?:\\.[^"\\]*)*"', re.S),
+    "'": re.compile(r"[^'\\]*(?:\\.[^'\\]*)*'", re.S),
+}
+_PLACEHOLDER = re.compile(r"WDLFMT_EXPRESSION_PLACEHOLDER_\d+_")
+
+
+def find_interpolations(cmd: str, dollar: bool = False) -> List[Tuple[int, int]]:
+    """Return the `(start, stop)` spans of the WDL interpolations in `cmd`.
+
+    Each span runs from the `~{` (or `${` when `dollar` is set) to just past
+    its matching `}`, skipping braces nested inside the expression and inside
+    its string literals, so `~{sep="}" xs}` and `~{if a then "{" else b}`
+    are each one span. Scanning never moves backwards, so the cost is linear
+    in the length of the script. An interpolation that is never closed ends
+    the scan and is left as it is.
+    """
+    opener = _ANY_OPEN if dollar else _TILDE_OPEN
+    spans = []
+    pos = 0
+    while True:
+        match = opener.search(cmd, pos)
+        if match is None:
+            return spans
+
+        i = match.end()
+        depth = 1
+        while depth:
+            special = _EXPR_SPECIAL.search(cmd, i)
+            if special is None:
+                return spans
+            char = special.group()
+            i = special.end()
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+            else:
+                closing = _STRING_END[char].match(cmd, i)
+                if closing is None:
+                    return spans
+                i = closing.end()
+
+        spans.append((match.start(), i))
+        pos = i
+
+
 class ShfmtFormatter(ShellFormatter):
     enabled = True
 
+    def __init__(self, command, bin=_find_bin("shfmt"), dollar_interpolation: bool = False):
+        super().__init__(command, bin)
+        # True for `command { }` blocks, where `${...}` is WDL, not shell.
+        self.dollar_interpolation = dollar_interpolation
+
     def generate_placeholder(self):
         placeholder = f"WDLFMT_EXPRESSION_PLACEHOLDER_{self.placeholder_n}_"
         self.placeholder_n += 1
@@ -44,56 +411,47 @@ class ShfmtFormatter(ShellFormatter):
 
     def find_and_replace_WDL_expressions(self, cmd):
         """Replaces ~ expressions with non-shell syntax with placeholders"""
-        start_idxs = [match.start() for match in re.finditer("~{", cmd)]
         self.placeholder_n = 0
         self.placeholder_dict = {}
 
-        # Begin at the start index and search forward until a match is found
-        placeholders = {"starts": start_idxs, "stops": []}
-        for starts in start_idxs:
-            offset = 1
-            for char in cmd[starts:]:
-                if char == "}":
-                    placeholders["stops"].append(starts + offset)
-                    break
-                else:
-                    offset += 1
-
-        assert len(placeholders["starts"]) == len(placeholders["stops"])
-
-        expressions = []
-        for p in range(len(placeholders["starts"])):
-            start, stop = placeholders["starts"][p], placeholders["stops"][p]
-            expressions.append(cmd[start:stop])
-
-        for exp in expressions:
+        parts = []
+        last = 0
+        for start, stop in find_interpolations(cmd, self.dollar_interpolation):
             placeholder = self.generate_placeholder()
-            cmd = cmd.replace(exp, placeholder, 1)
-            self.placeholder_dict[placeholder] = exp
+            expression = cmd[start:stop]
+            if self.dollar_interpolation and expression.startswith("$"):
+                # The block is written back as `command <<< >>>`, where only
+                # `~{...}` is a WDL interpolation.
+                expression = "~" + expression[1:]
+            self.placeholder_dict[placeholder] = expression
+            parts.append(cmd[last:start])
+            parts.append(placeholder)
+            last = stop
+        parts.append(cmd[last:])
 
-        # Now replace the
-        return cmd
+        return "".join(parts)
 
     def restore_from_placeholders(self, cmd):
         """Put the original WDL expressions back"""
+        if not self.placeholder_dict:
+            return cmd
+
+        def original(match):
+            return self.placeholder_dict.get(match.group(), match.group())
 
-        for placeholder, exp in self.placeholder_dict.items():
-            cmd = cmd.replace(placeholder, exp)
+        return _PLACEHOLDER.sub(original, cmd)
 
-        return cmd
+    def substituted(self) -> str:
+        """The script as shfmt sees it, with WDL expressions replaced."""
+        return self.find_and_replace_WDL_expressions(self.command)
 
     def format(self) -> str:
-        cmd = self.command
-        cmd_sub = self.find_and_replace_WDL_expressions(cmd)
-        try:
-            with NamedTemporaryFile(delete=False) as tmpfile:
-                tmpfile.write(cmd_sub.encode("utf-8"))
-                tmpfile.flush()  # necessary
-                formatted = subprocess.check_output([self.bin, tmpfile.name]).decode(
-                    "utf-8"
-                )
-        finally:
-            remove(tmpfile.name)
+        cmd_sub = self.substituted()
+        runner = get_shfmt_runner()
+        if runner.bin == self.bin:
+            formatted = runner.format(cmd_sub)
+        else:
+            formatted = ShfmtRunner(self.bin).format(cmd_sub)
 
         restored = self.restore_from_placeholders(formatted)
 
@@ -1,43 +1,21 @@
 # A module for struct formatters
-from ..grammar.WdlV1Parser import WdlV1Parser
 from wdlfmt.formatters.common import (
-    Formatter,
-    indent_text,
-    CommentContext,
-    collect_formatters,
+    LayoutFormatter,
+    all_formatters,
+    block,
 )
-from ..utils import get_raw_text
+from . import layout
+from .. import syntax
 
 
-class StructFormatter(Formatter):
-    formats = WdlV1Parser.StructContext
+class StructFormatter(LayoutFormatter):
+    formats = syntax.Struct
     public = True
 
-    def format(self, input: WdlV1Parser.StructContext, indent: int = 0) -> str:
-        """Format a struct."""
+    def doc(self, input: syntax.Struct) -> layout.Doc:
+        """Lay out a struct."""
+        formatters = all_formatters()
 
-        formatted = f"struct {input.Identifier().getText()} {{\n"
-        formatters = collect_formatters(False)
-
-        for child in input.children:
-            if isinstance(child, CommentContext):
-                formatted += formatters[str(type(child))].format(
-                    child, indent + 1, True
-                )
-                continue
-
-            try:
-                formatted += formatters[str(type(child))].format(child, indent + 1)
-            except KeyError:
-                pass
-
-        formatted += "}\n\n"
-        return formatted
-
-
-class StructDeclsContext(Formatter):
-    formats = WdlV1Parser.Unbound_declsContext
-    public = False
-
-    def format(self, input: WdlV1Parser.Unbound_declsContext, indent: int = 0):
-        return indent_text(" ".join(get_raw_text(input).split()) + "\n", indent)
+        # Comments and members, whose declarations keep the source spelling
+        # of their type (see lowering.py)
+        return block(f"struct {input.name} {{", [formatters[type(element)].doc(element) for element in input.body])
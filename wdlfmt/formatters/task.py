@@ -1,185 +1,165 @@
-from ..grammar.WdlV1Parser import WdlV1Parser
-from .shell_formatter import ShfmtFormatter
+from .shell_formatter import ShfmtFormatter, get_shfmt_runner
 from wdlfmt.formatters.common import (
-    Formatter,
-    indent_text,
-    subset_children,
-    CommentContext,
-    collect_formatters,
+    LayoutFormatter,
+    all_formatters,
+    block,
 )
-import wdlfmt
+from . import layout
+from .layout import HARDLINE, SOFTLINE
+from .. import syntax
 
-from ..utils import get_raw_text
 
-
-class VersionFormatter(Formatter):
-    formats = WdlV1Parser.VersionContext
+class VersionFormatter(LayoutFormatter):
+    formats = syntax.Version
     public = True
 
-    def format(self, input: WdlV1Parser.VersionContext, indent: int = 0) -> str:
-        return f"{input.VERSION().getText()} {input.ReleaseVersion().getText()}\n\n\n"
-
+    def doc(self, input: syntax.Version) -> layout.Doc:
+        return [f"version {input.version}", HARDLINE, HARDLINE]
 
-class TaskFormatter(Formatter):
-    formats = WdlV1Parser.TaskContext
-    public = True
 
-    def format(self, input: WdlV1Parser.TaskContext, indent: int = 0) -> str:
-        """Format a task."""
-        formatted = f"task {input.Identifier().getText()} {{\n"
-        formatters = collect_formatters(False)
-
-        for child in input.children:
-
-            # If the child itself has children then
-            # it is a block section and must be formatted separately
-
-            if "Comment" in str(type(child)):
-                formatted += formatters[str(type(child))].format(
-                    child, indent + 1, True
-                )
-                continue
-
-            if hasattr(child, "children"):
-                if len(child.children) == 1:
-                    # If the child has only one child then it is a section
-                    grandchild = child.children[0]
-                    if str(type(grandchild)) in formatters:
-                        formatted += formatters[str(type(grandchild))].format(
-                            grandchild, indent + 1
-                        )
-                else:
-                    # I don't know what case would have multiple
-                    # children yet but I'm sure it will come up
-                    raise NotImplementedError("Multiple children not implemented")
-
-            else:
-                # If the child has no children then it is a single line
-                # and can be formatted directly
-                if str(type(child)) in formatters:
-                    formatted += formatters[str(type(child))].format(child, indent + 1)
-
-        formatted += "}\n\n"
-        return formatted
-
-
-class OutputFormatter(Formatter):
-    formats = [WdlV1Parser.Task_outputContext, WdlV1Parser.Workflow_outputContext]
+class ImportFormatter(LayoutFormatter):
+    formats = syntax.Import
     public = True
 
-    def format(self, input: WdlV1Parser.Task_outputContext, indent: int = 1) -> str:
-        formatters = collect_formatters(False)
-
-        formatted = ""
-
-        for child in input.children:
-            if isinstance(child, CommentContext):
-                formatted += formatters[str(type(child))].format(child, indent, True)
+    def doc(self, input: syntax.Import) -> layout.Doc:
+        line = f"import {input.uri}"
+        if input.alias is not None:
+            line += f" as {input.alias}"
+        for struct, alias in input.aliases:
+            line += f" alias {struct} as {alias}"
+        return [line, HARDLINE]
 
-            if isinstance(child, WdlV1Parser.Bound_declsContext):
-                formatted += formatters[str(type(child))].format(child, indent)
 
-        return indent_text(
-            f"output {{\n{indent_text(''.join(formatted))}}}\n\n", indent
-        )
-
-
-class InputFormatter(Formatter):
-    formats = [WdlV1Parser.Task_inputContext, WdlV1Parser.Workflow_inputContext]
+class TaskFormatter(LayoutFormatter):
+    formats = syntax.Task
     public = True
 
-    def format(self, input: WdlV1Parser.Task_inputContext, indent: int = 1) -> str:
-        formatters = collect_formatters(False)
+    def doc(self, input: syntax.Task) -> layout.Doc:
+        """Lay out a task."""
+        formatters = all_formatters()
 
-        formatted = ""
+        # Comments, sections and declarations, in order
+        return block(f"task {input.name} {{", [formatters[type(element)].doc(element) for element in input.body])
 
-        for child in input.children:
-            if isinstance(child, CommentContext):
-                formatted += formatters[str(type(child))].format(child, indent, True)
 
-            if isinstance(child, WdlV1Parser.Any_declsContext):
-                formatted += formatters[str(type(child))].format(child, indent)
+def _section(name: str, input) -> layout.Doc:
+    formatters = all_formatters()
+    return block(f"{name} {{", [formatters[type(element)].doc(element) for element in input.body])
 
-        # decls = "".join(
-        #     [
-        #         formatters[declsContext.__class__].format(declsContext)
-        #         for declsContext in declsContexts
-        #     ]
-        # )
 
-        # breakpoint()
+class OutputFormatter(LayoutFormatter):
+    formats = syntax.Output
+    public = True
 
-        return indent_text(f"input {{\n{indent_text(''.join(formatted))}}}\n\n", indent)
+    def doc(self, input: syntax.Output) -> layout.Doc:
+        # Comments and declarations
+        return _section("output", input)
 
 
-class CommandFormatter(Formatter):
-    formats = WdlV1Parser.Task_commandContext
+class InputFormatter(LayoutFormatter):
+    formats = syntax.Input
     public = True
 
-    def format(self, input: WdlV1Parser.Task_commandContext, indent: int = 2) -> str:
+    def doc(self, input: syntax.Input) -> layout.Doc:
+        # Comments and declarations
+        return _section("input", input)
 
-        commands = subset_children(
-            input.children,
-            [
-                WdlV1Parser.Task_command_string_partsContext,
-                WdlV1Parser.Task_command_expr_with_stringContext,
-            ],
-        )
 
-        shell_script = "".join([get_raw_text(i).lstrip() for i in commands])
+def command_shfmt_formatter(input: syntax.Command) -> ShfmtFormatter:
+    """A `ShfmtFormatter` for the script inside a command block."""
+    return ShfmtFormatter(input.script, dollar_interpolation=input.dollar_interpolation)
 
-        shell_script = "\n".join([line.lstrip() for line in shell_script.split("\n")])
 
-        formatted_command = ShfmtFormatter(shell_script).format()
-        formatted = "command <<<\n"
-        formatted += indent_text(formatted_command, 1)
-        formatted += ">>>\n\n"
+def prefetch_commands(*nodes) -> None:
+    """Format every command block in `nodes` (syntax nodes) with a single
+    shfmt run.
 
-        return indent_text(formatted, 1)
+    `CommandFormatter` then picks the results up instead of starting shfmt
+    once per task.
+    """
+    scripts = []
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, syntax.Command):
+            scripts.append(command_shfmt_formatter(node).substituted())
+            continue
+        stack.extend(getattr(node, "body", None) or [])
+    get_shfmt_runner().prefetch(scripts)
 
 
-class RuntimeFormatter(Formatter):
-    formats = WdlV1Parser.Task_runtimeContext
+class CommandFormatter(LayoutFormatter):
+    formats = syntax.Command
     public = True
 
-    def format(self, input: WdlV1Parser.Task_runtimeContext, indent: int = 1) -> str:
-        formatters = collect_formatters(False)
-
-        formatted = ""
-
-        for child in input.children:
-            if isinstance(child, CommentContext):
-                formatted += formatters[str(type(child))].format(child, indent, True)
-
-            if isinstance(child, WdlV1Parser.Task_runtime_kvContext):
-                formatted += formatters[str(type(child))].format(child, indent)
+    def doc(self, input: syntax.Command) -> layout.Doc:
+        script = command_shfmt_formatter(input).format()
+        return [
+            "command <<<",
+            layout.nest(layout.INDENT, HARDLINE, layout.lines(script)) if script else [],
+            # shfmt ends the script with a line break; without one, `>>>`
+            # stays on its last line.
+            HARDLINE if script.endswith("\n") or not script else [],
+            ">>>",
+            HARDLINE,
+        ]
+
+
+class RuntimeFormatter(LayoutFormatter):
+    formats = syntax.Runtime
+    public = True
 
-        return indent_text(
-            f"runtime {{\n{indent_text(''.join(formatted))}}}\n\n", indent
-        )
+    def doc(self, input: syntax.Runtime) -> layout.Doc:
+        # Comments and entries
+        return _section("runtime", input)
 
 
-class RuntimeKVContext(Formatter):
-    formats = WdlV1Parser.Task_runtime_kvContext
+class RuntimeEntryFormatter(LayoutFormatter):
+    formats = syntax.RuntimeEntry
     public = False
 
-    def format(self, input: WdlV1Parser.Task_runtime_kvContext, indent: int = 1) -> str:
-        formatters = collect_formatters(False)
-
-        key = input.Identifier().getText()
-        value = subset_children(input.children, WdlV1Parser.ExprContext)[0]
-
-        return indent_text(
-            f"{key}: {formatters[str(value.__class__)].format(value)}\n", indent
-        )
-
-
-class ExprContextFormatter(Formatter):
-    formats = WdlV1Parser.ExprContext
+    def doc(self, input: syntax.RuntimeEntry) -> layout.Doc:
+        if input.inline:
+            return inline_doc(input.parts())
+        value = input.value
+        return [f"{input.key}: ", all_formatters()[type(value)].doc(value)]
+
+
+def expression_doc(text: str, breaks) -> layout.Doc:
+    """An expression's text, which may break at `breaks` (offsets into
+    `text`, see `syntax.Expression`): only where the rest of the line would
+    not fit, onto continuation lines indented one level deeper."""
+    if not breaks:
+        return text
+    parts = [text[start:stop] for start, stop in zip((0, *breaks), (*breaks, len(text)))]
+    return layout.nest(layout.INDENT, layout.fill(parts, SOFTLINE))
+
+
+def inline_doc(parts) -> layout.Doc:
+    """The `parts` of a one-line construct that has inline comments (see
+    `syntax.Declaration`), separated by spaces. Each comment ends its line,
+    and the parts after it go on the next one, indented one level deeper."""
+    lines = [""]
+    for part in parts:
+        if not part:
+            # Missing after error recovery
+            continue
+        if lines[-1] and part != ":":
+            lines[-1] += " "
+        lines[-1] += part
+        if part.startswith("#"):
+            lines.append("")
+    if not lines[-1]:
+        lines.pop()
+    return [lines[0], layout.nest(layout.INDENT, [[HARDLINE, line] for line in lines[1:]])]
+
+
+class ExpressionFormatter(LayoutFormatter):
+    formats = syntax.Expression
     public = False
 
-    def format(self, input: WdlV1Parser.ExprContext, indent: int = 0) -> str:
-        expression = " ".join([child.getText() for child in input.children])
+    def doc(self, input: syntax.Expression) -> layout.Doc:
+        expression = input.text
 
         # Remove the extra space at the end of the expression
         expression = expression.strip()
@@ -192,40 +172,25 @@ class ExprContextFormatter(Formatter):
         expression[-1] = expression[-1].replace("'", '"')
         expression = "".join(expression)
 
-        return expression
+        return expression_doc(expression, input.breaks)
 
 
-class BoundContextFormatter(Formatter):
-    formats = WdlV1Parser.Bound_declsContext
+class DeclarationFormatter(LayoutFormatter):
+    formats = syntax.Declaration
     public = True
 
-    def format(self, input: WdlV1Parser.Bound_declsContext, indent: int = 1) -> str:
-        formatted = indent_text(
-            " ".join([child.getText() for child in input.children]), level=indent
-        )
-        return f"{formatted}\n"
-
-
-class AnyContextFormatter(Formatter):
-    formats = WdlV1Parser.Any_declsContext
-    public = False
-
-    def format(self, input: WdlV1Parser.Any_declsContext, indent: int = 2) -> str:
-        formatted = indent_text(
-            " ".join([child.getText() for child in input.children[0].children]),
-            level=indent,
-        )
-        return f"{formatted}\n"
+    def doc(self, input: syntax.Declaration) -> layout.Doc:
+        expression = input.expression
+        if input.inline:
+            return inline_doc(input.parts())
+        if expression is None:
+            return " ".join(input.parts())
+        return [f"{input.type} {input.name} = ", expression_doc(expression.text, expression.breaks)]
 
 
-class CommentFormatter(Formatter):
-    formats = wdlfmt.formatters.common.CommentContext
+class CommentFormatter(LayoutFormatter):
+    formats = syntax.Comment
     public = True
 
-    def format(
-        self, input: CommentContext, indent: int = 0, force: bool = False
-    ) -> str:
-        if input.top_level or force:
-            return indent_text("#" + input.getText().strip().strip("#") + "\n", indent)
-        else:
-            return ""
+    def doc(self, input: syntax.Comment) -> layout.Doc:
+        return "#" + input.text.strip().strip("#")
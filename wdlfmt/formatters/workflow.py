@@ -1,19 +1,20 @@
-from ..grammar.WdlV1Parser import WdlV1Parser
 from wdlfmt.formatters.common import (
-    Formatter,
-    indent_text,
-    subset_children,
-    collect_formatters,
+    LayoutFormatter,
+    all_formatters,
+    block,
 )
-from ..utils import get_raw_text
+from . import layout
+from .layout import HARDLINE
+from .task import expression_doc, inline_doc
+from .. import syntax
 
 
-class WorkflowFormatter(Formatter):
-    formats = WdlV1Parser.WorkflowContext
+class WorkflowFormatter(LayoutFormatter):
+    formats = syntax.Workflow
     public = True
 
-    def format(self, input: WdlV1Parser.WorkflowContext, indent: int = 0) -> str:
-        """Format a workflow.
+    def doc(self, input: syntax.Workflow) -> layout.Doc:
+        """Lay out a workflow.
         This is an opinionated formatter that will format the workflow as follows:
         - Input
         - Output
@@ -23,145 +24,117 @@ class WorkflowFormatter(Formatter):
         - WorkflowElement
         The order of the sections is not configurable.
         """
-        formatted = f"\nworkflow {input.Identifier().getText()} {{\n"
-        formatters = collect_formatters(False)
+        formatters = all_formatters()
 
-        for child in input.children:
+        # Comments, sections and inner elements, in order
+        elements = [formatters[type(element)].doc(element) for element in input.body]
 
-            # If the child itself has children then
-            # it is a block section and must be formatted separately
+        return [HARDLINE, block(f"workflow {input.name} {{", elements)]
 
-            if "Comment" in str(type(child)):
-                formatted += formatters[str(type(child))].format(
-                    child, indent + 1, True
-                )
-                continue
-
-            if hasattr(child, "children"):
-                if len(child.children) == 1:
-                    # If the child has only one child then it is a section
-                    grandchild = child.children[0]
-                    if str(type(grandchild)) in formatters:
-                        formatted += formatters[str(type(grandchild))].format(
-                            grandchild, indent + 1
-                        )
-                else:
-                    # I don't know what case would have multiple
-                    # children yet but I'm sure it will come up
-                    pass
-            else:
-                # If the child has no children then it is a section
-                if str(type(child)) in formatters:
-                    formatted += formatters[str(type(child))].format(child, indent + 1)
 
-        formatted += "}\n\n"
-        return formatted
+def _meta_section(name: str, input) -> layout.Doc:
+    formatters = all_formatters()
 
+    body = []
+    for element in input.body:
+        if isinstance(element, syntax.Comment):
+            # Comments stay at the level of the section
+            body += [HARDLINE, element.text]
+        else:
+            body.append(layout.nest(layout.INDENT, HARDLINE, formatters[type(element)].doc(element)))
 
-class ParameterMetaFormatter(Formatter):
-    formats = WdlV1Parser.Parameter_metaContext
-    public = False
-
-    def format(self, input: WdlV1Parser.Parameter_metaContext, indent: int = 0) -> str:
-        formatters = collect_formatters(False)
-
-        formatted = "parameter_meta {\n"
-        for child in input.children:
-            if "Comment" in str(type(child)):
-                formatted += f"{child.getText()}\n"
-            elif "Meta_kvContext" in str(type(child)):
-                formatted += formatters[str(type(child))].format(child, indent)
-
-        formatted += "}\n\n"
-        formatted = indent_text(formatted, indent)
-        return formatted
+    return [f"{name} {{", body, HARDLINE, "}", HARDLINE]
 
 
-class MetaKVFormatter(Formatter):
-    formats = WdlV1Parser.Meta_kvContext
+class ParameterMetaFormatter(LayoutFormatter):
+    formats = syntax.ParameterMeta
     public = False
 
-    def format(self, input: WdlV1Parser.Meta_kvContext, indent: int = 0) -> str:
-        name = input.children[0].getText()
-        value = input.children[2].getText()
-        formatted = indent_text(f"{name}: {value}\n", indent)
-        return formatted
+    def doc(self, input: syntax.ParameterMeta) -> layout.Doc:
+        return _meta_section("parameter_meta", input)
 
 
-class Inner_workflowFormatter(Formatter):
-    formats = WdlV1Parser.Inner_workflow_elementContext
+class MetaFormatter(LayoutFormatter):
+    formats = syntax.Meta
     public = False
 
-    def format(
-        self, input: WdlV1Parser.Inner_workflow_elementContext, indent: int = 0
-    ) -> str:
-        formatted = ""
-        formatters = collect_formatters(False)
+    def doc(self, input: syntax.Meta) -> layout.Doc:
+        return _meta_section("meta", input)
 
-        for child in input.children:
-            if "Comment" in str(type(child)):
-                formatted += f"{child.getText()}\n"
 
-            else:
-                formatted += formatters[str(type(child))].format(child, indent)
+class MetaEntryFormatter(LayoutFormatter):
+    formats = syntax.MetaEntry
+    public = False
 
-        return formatted
+    def doc(self, input: syntax.MetaEntry) -> layout.Doc:
+        if input.inline:
+            return inline_doc(input.parts())
+        return f"{input.key}: {input.value}"
 
 
-class CallFormatter(Formatter):
-    formats = WdlV1Parser.CallContext
+class CallFormatter(LayoutFormatter):
+    formats = syntax.Call
     public = False
 
-    def format(self, input: WdlV1Parser.CallContext, indent: int = 0) -> str:
-
-        name_context = subset_children(input.children, WdlV1Parser.Call_nameContext)[
-            0
-        ].getText()
-        alias_context = subset_children(input.children, WdlV1Parser.Call_aliasContext)
-        body_context = subset_children(input.children, WdlV1Parser.Call_bodyContext)[0]
+    def doc(self, input: syntax.Call) -> layout.Doc:
+        if input.body is None:
+            # A call without braces is not supported yet
+            raise IndexError(f"call {input.target} has no body")
 
         # If there's an alias, we have to format it as such
-        if len(alias_context) > 0:
-            alias_name = get_raw_text(alias_context[0]).strip().split()[1]
-            formatted = f"call {name_context} as {alias_name} {{\n"
+        if input.inline:
+            header = inline_doc(input.parts())
+
+        elif input.alias is not None:
+            header = f"call {input.target} as {input.alias} {{"
 
         else:
-            formatted = f"call {name_context} {{\n"
+            header = f"call {input.target} {{"
 
-        formatters = collect_formatters(False)
+        formatters = all_formatters()
 
-        # Now go through the statements in the body and format them
-        for child in body_context.children:
-            if "Comment" in str(type(child)):
-                formatted += f"{child.getText()}\n"
+        # Now go through the statements in the body and lay them out
+        body = []
+        for i, element in enumerate(input.body):
+            if isinstance(element, syntax.Comment):
+                # Comments stay at the level of the call
+                body += [HARDLINE, element.text]
 
-            elif str(type(child)) == "<class 'antlr4.tree.Tree.TerminalNodeImpl'>":
-                pass
+            elif isinstance(element, syntax.CallInputs):
+                # The last input of the call takes no comma
+                last = i == len(input.body) - 1
+                body.append(layout.nest(layout.INDENT, HARDLINE, formatters[type(element)].doc(element, not last)))
 
             else:
-                formatted += formatters[str(type(child))].format(child, indent)
+                body.append(layout.nest(layout.INDENT, HARDLINE, formatters[type(element)].doc(element)))
 
-        # Remove the last comma
-        formatted = formatted.rstrip(",\n")
-        formatted += "\n}\n\n"
-        formatted = indent_text(formatted, indent)
-        return formatted
+        return [header, body, HARDLINE, "}", HARDLINE]
 
 
-class CallInputFormatter(Formatter):
-    formats = WdlV1Parser.Call_inputsContext
+class CallInputsFormatter(LayoutFormatter):
+    formats = syntax.CallInputs
     public = False
 
-    def format(self, input: WdlV1Parser.Call_inputsContext, indent: int = 0) -> str:
-        formatted = "input:\n"
-
-        inputs = subset_children(input.children, WdlV1Parser.Call_inputContext)
-
-        for input in inputs:
-            name = input.getText().split("=")[0].strip()
-            expr = subset_children(input.children, WdlV1Parser.ExprContext)[0].getText()
-            formatted += indent_text(f"{name} = {str(expr)},\n", indent)
-
-        return indent_text(formatted, indent)
-
-        # There may not be an alias
+    def doc(self, input: syntax.CallInputs, trailing_comma: bool = True) -> layout.Doc:
+        """Lay out the inputs and the comments between them, each input
+        followed by a comma except, without `trailing_comma`, the last one."""
+        remaining = sum(isinstance(element, syntax.CallInput) for element in input.body)
+        inputs = []
+        for element in input.body:
+            if isinstance(element, syntax.Comment):
+                inputs += [HARDLINE, element.text]
+                continue
+            remaining -= 1
+            comma = "," if trailing_comma or remaining else ""
+            if element.inline:
+                inputs.append([HARDLINE, inline_doc(element.parts()), comma])
+                continue
+            expression = element.expression
+            inputs.append([
+                HARDLINE,
+                f"{element.name} = ",
+                expression_doc(expression.text, expression.breaks),
+                comma,
+            ])
+
+        return ["input:", layout.nest(layout.INDENT, inputs)]
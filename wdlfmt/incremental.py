@@ -0,0 +1,199 @@
+"""Re-format successive versions of a document, reusing unchanged elements.
+
+Editors and watch loops format the same document again after every save,
+usually with a single task or workflow changed. `IncrementalFormatter` keeps
+the formatted output and source span of each top-level element of the
+previous version (the version statement, imports, structs, tasks, the
+workflow and top-level comments), and on the next call:
+
+1. Finds the longest common prefix and suffix of the old and new source.
+   Elements lying entirely inside them are unchanged and are neither lexed
+   nor parsed again.
+2. Lexes and parses only the region in between, as a small document of its
+   own behind the original `version` line.
+3. Formats each element of that region, unless an element with the same
+   type and raw source text (compared by hash) was formatted last time.
+
+Formatting an element does not depend on its neighbours, so the result is
+always identical to `format_wdl_str`. Each element is verified (see
+`verify.py`) against its own tokens when it is formatted. Whenever the region cannot be handled
+on its own (it has syntax errors, or the document would end up with two
+workflows) the whole document is formatted instead, so errors are reported
+exactly as a full format would report them. A document with syntax errors is
+never used as the base for the next call.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, NamedTuple, Optional
+
+from . import syntax
+from .cache import content_hash
+from .formatters import task
+from .input_stream import ArrayInputStream
+from .verify import DEFAULT_VERIFY_MODE, check_verify_mode, verify_output, verify_tokens
+from .visitor import DEFAULT_PARSE_MODE, WdlVisitor
+
+
+class Element(NamedTuple):
+    """A formatted top-level element and where its source lies."""
+
+    start: int
+    stop: int
+    kind: type
+    key: str
+    formatted: str
+
+
+def element_key(node: syntax.Node, source: str) -> str:
+    """Hash of a top-level element's type and source text (`source` is the
+    text it was parsed from)."""
+    return content_hash(f"{type(node).__name__}\0{source[node.start:node.stop]}")
+
+
+def _common_prefix_length(a: str, b: str, limit: int) -> int:
+    # Compare in halving blocks so the work is done by C string comparisons.
+    length = 0
+    step = 1 << 16
+    while step:
+        while length + step <= limit and a[length:length + step] == b[length:length + step]:
+            length += step
+        step >>= 1
+    return length
+
+
+def _common_affixes(old: str, new: str):
+    """Lengths of the common prefix and (non-overlapping) common suffix."""
+    limit = min(len(old), len(new))
+    prefix = _common_prefix_length(old, new, limit)
+    suffix = _common_prefix_length(old[::-1], new[::-1], limit - prefix)
+    return prefix, suffix
+
+
+class IncrementalFormatter:
+    """Formats one document over and over, re-formatting only what changed.
+
+    Args:
+        parse_mode: Passed through to `WdlVisitor`.
+        report_errors: Print syntax errors to stderr as they are found.
+        verify: How to check the output, as for `WdlVisitor`. `"full"`
+            checks the whole document after every `format`.
+
+    Attributes:
+        reused: Elements copied from the previous output by the last `format`.
+        formatted: Elements passed to the formatters by the last `format`.
+        parsed_chars: Characters lexed and parsed by the last `format`.
+        syntax_errors: The syntax errors in the document given to the last
+            `format`, as `"line L:C message"` strings.
+    """
+
+    def __init__(
+        self, parse_mode: str = DEFAULT_PARSE_MODE, report_errors: bool = True, verify: str = DEFAULT_VERIFY_MODE
+    ):
+        check_verify_mode(verify)
+        self.parse_mode = parse_mode
+        self.report_errors = report_errors
+        self.verify = verify
+        self.reused = 0
+        self.formatted = 0
+        self.parsed_chars = 0
+        self.syntax_errors: List[str] = []
+        self._source: Optional[str] = None
+        self._elements: List[Element] = []
+
+    def format(self, wdl: str) -> str:
+        """Format `wdl`, the latest version of the document."""
+        elements = None
+        self.syntax_errors = []
+        if self._source is not None:
+            self.reused = self.formatted = 0
+            elements = self._format_changes(wdl)
+        if elements is None:
+            self.reused = self.formatted = 0
+            visitor = WdlVisitor(
+                ArrayInputStream(wdl), parse_mode=self.parse_mode, report_errors=self.report_errors
+            )
+            elements = self._format_region(visitor, wdl, 0, 0)
+            self.parsed_chars = len(wdl)
+            self.syntax_errors = visitor.syntax_error_messages
+            if visitor.syntax_errors:
+                # The tree came out of error recovery, which can depend on
+                # any part of the document, so none of it is safe to reuse.
+                self.reset()
+                return "".join(element.formatted for element in elements)
+
+        formatted = "".join(element.formatted for element in elements)
+        if self.verify == "full":
+            verify_output(formatted)
+        self._source = wdl
+        self._elements = elements
+        return formatted
+
+    def reset(self) -> None:
+        """Forget the previous version; the next `format` does all the work."""
+        self._source = None
+        self._elements = []
+
+    @property
+    def elements(self) -> List[Element]:
+        """The top-level elements of the last document formatted without
+        syntax errors, with their spans in that document."""
+        return self._elements
+
+    def _format_changes(self, wdl: str) -> Optional[List[Element]]:
+        old = self._source
+        prefix, suffix = _common_affixes(old, wdl)
+        delta = len(wdl) - len(old)
+
+        # An element is unchanged if it and the character after (or before)
+        # it are untouched, so no token can run across its boundary.
+        head = [e for e in self._elements if e.stop < prefix]
+        tail = [e for e in self._elements if e.start > len(old) - suffix]
+        version = next((e for e in head if issubclass(e.kind, syntax.Version)), None)
+        if version is None:
+            return None
+
+        start = head[-1].stop
+        stop = tail[0].start + delta if tail else len(wdl)
+
+        # The changed region, behind the version statement so it parses as
+        # a document. It starts and ends between elements, where the lexer
+        # is back in its default mode.
+        version = wdl[version.start:version.stop] + "\n"
+        region = version + wdl[start:stop]
+        # Errors are not reported here: the full format that follows reports
+        # them against the real document.
+        visitor = WdlVisitor(ArrayInputStream(region), parse_mode=self.parse_mode, report_errors=False)
+        self.parsed_chars = len(region)
+        if visitor.syntax_errors:
+            return None
+
+        middle = self._format_region(visitor, region, start - len(version), skip=1)
+        elements = head + middle + [e._replace(start=e.start + delta, stop=e.stop + delta) for e in tail]
+        if sum(issubclass(e.kind, syntax.Workflow) for e in elements) > 1:
+            return None
+        self.reused += len(head) + len(tail)
+        return elements
+
+    def _format_region(self, visitor: WdlVisitor, source: str, offset: int, skip: int) -> List[Element]:
+        """Format the top-level elements of `visitor`'s document (parsed from
+        `source`) after the first `skip`, shifting their spans by `offset`."""
+        nodes = visitor.document.body[skip:]
+        previous: Dict[str, str] = {e.key: e.formatted for e in self._elements}
+        keys = [element_key(node, source) for node in nodes]
+        task.prefetch_commands(*[node for node, key in zip(nodes, keys) if key not in previous])
+
+        elements = []
+        for node, key in zip(nodes, keys):
+            formatted = previous.get(key)
+            if formatted is None:
+                formatted = visitor.format_element(node)
+                if not visitor.syntax_errors:
+                    tokens = visitor.tokens[node.token_start:node.token_stop]
+                    verify_tokens(tokens, formatted, "fast" if self.verify == "full" else self.verify)
+                previous[key] = formatted
+                self.formatted += 1
+            else:
+                self.reused += 1
+            elements.append(Element(node.start + offset, node.stop + offset, type(node), key, formatted))
+        return elements
@@ -0,0 +1,52 @@
+"""A compact character stream for the WDL lexer.
+
+`antlr4.InputStream` turns the source into a Python list of code points, one
+8-byte pointer per character on top of the string itself, and builds it with
+a per-character `ord` loop. `ArrayInputStream` keeps the code points in an
+`array` instead: one byte per character for ASCII sources (almost every WDL
+file) and four otherwise, built in C from the encoded string.
+
+It is a drop-in subclass, so the lexer, tokens and `get_raw_text` (which
+slices `strdata`) work with it unchanged.
+"""
+
+import sys
+from array import array
+
+from antlr4 import InputStream
+from antlr4.Token import Token
+
+
+def code_points(text: str) -> array:
+    """The code points of `text` in the smallest array that holds them."""
+    if text.isascii():
+        return array("B", text.encode("ascii"))
+    points = array("I")
+    if points.itemsize == 4:
+        points.frombytes(text.encode("utf-32-le" if sys.byteorder == "little" else "utf-32-be"))
+    else:
+        points.extend(map(ord, text))
+    return points
+
+
+class ArrayInputStream(InputStream):
+    """An `InputStream` that stores its code points in an `array`.
+
+    Args:
+        data: The source text.
+    """
+
+    __slots__ = ()
+
+    def _loadString(self):
+        self._index = 0
+        self.data = code_points(self.strdata)
+        self._size = len(self.data)
+
+    def LA(self, offset: int):
+        # The lexer only ever looks one character ahead, so check that first.
+        if offset == 1:
+            if self._index < self._size:
+                return self.data[self._index]
+            return Token.EOF
+        return super().LA(offset)
@@ -0,0 +1,353 @@
+"""Lowering: from the ANTLR parse tree to the syntax tree of `syntax.py`.
+
+`lower` walks the parse tree once, right after parsing, and builds the
+`syntax.Document` the formatters and the style checker work on. Everything
+they read from the parse tree is computed here: names, the text of types and
+expressions (`node_text`), command scripts, and where each comment goes.
+
+Comments are on their own token channel and not in the parse tree. Each one
+is placed before its neighbour (see `comment_neighbours`) and becomes a
+`syntax.Comment` in the body of the block holding the neighbour. A comment
+inside a one-line construct (a declaration, the header of a call, a call
+input, a runtime or meta entry) is kept with the construct, in its `inline`. Comments in the few places no
+formatter writes them out (the version statement, an import, inside an
+expression) are dropped or garbled, and verification reports them.
+
+Trees that came out of error recovery are lowered as far as they go: missing
+names are empty and missing parts are None.
+"""
+
+from typing import List, Optional
+
+from antlr4.Token import CommonToken, Token
+from antlr4.tree.Tree import TerminalNode
+
+from . import syntax
+from .formatters.common import comment_neighbours, subset_children
+from .grammar.WdlV1Parser import WdlV1Parser
+from .utils import get_raw_text, node_text
+
+# Rules that only wrap the element below them.
+_WRAPPERS = frozenset([
+    WdlV1Parser.Document_elementContext,
+    WdlV1Parser.Task_elementContext,
+    WdlV1Parser.Any_declsContext,
+    WdlV1Parser.InputContext,
+    WdlV1Parser.OutputContext,
+    WdlV1Parser.Inner_elementContext,
+    WdlV1Parser.Parameter_meta_elementContext,
+    WdlV1Parser.Meta_elementContext,
+    WdlV1Parser.Inner_workflow_elementContext,
+])
+
+
+def _token_span(token: CommonToken):
+    return token.start, token.stop + 1, token.tokenIndex, token.tokenIndex + 1
+
+
+def _span(ctx):
+    if isinstance(ctx, TerminalNode):
+        return _token_span(ctx.symbol)
+    start, stop = ctx.start, ctx.stop
+    if stop is None or stop.tokenIndex < start.tokenIndex:
+        # A rule error recovery left without tokens.
+        return start.start, start.start, start.tokenIndex, start.tokenIndex
+    return start.start, stop.stop + 1, start.tokenIndex, stop.tokenIndex + 1
+
+
+# Binary operators, after which an expression may break across lines.
+_OPERATORS = frozenset([
+    WdlV1Parser.PLUS, WdlV1Parser.MINUS, WdlV1Parser.STAR, WdlV1Parser.DIVIDE, WdlV1Parser.MOD,
+    WdlV1Parser.AND, WdlV1Parser.OR, WdlV1Parser.EQUALITY, WdlV1Parser.NOTEQUAL,
+    WdlV1Parser.LT, WdlV1Parser.GT, WdlV1Parser.LTE, WdlV1Parser.GTE,
+])
+# Tokens that end an operand: an operator after one of them is binary.
+_OPERAND_ENDS = frozenset([
+    WdlV1Parser.Identifier, WdlV1Parser.IntLiteral, WdlV1Parser.FloatLiteral, WdlV1Parser.BoolLiteral,
+    WdlV1Parser.RPAREN, WdlV1Parser.RBRACK, WdlV1Parser.RBRACE, WdlV1Parser.DQUOTE, WdlV1Parser.SQUOTE,
+])
+_QUOTES = (WdlV1Parser.DQUOTE, WdlV1Parser.SQUOTE)
+
+
+def _text(terminal) -> str:
+    return "" if terminal is None else terminal.getText()
+
+
+def _breaks(ctx) -> tuple:
+    """Where the text of expression `ctx` may break across lines: after each
+    comma and binary operator outside string literals. None in an
+    expression holding a comment, which runs to the end of its line."""
+    start, stop = ctx.start, ctx.stop
+    if start is None or stop is None or start.tokenIndex < 0 or stop.tokenIndex <= start.tokenIndex:
+        return ()
+
+    breaks = []
+    # Open quotes, placeholders and braces, innermost last; `strings` counts
+    # the quotes.
+    nesting = []
+    strings = 0
+    offset = 0
+    previous = None
+    for token in ctx.parser.getTokenStream().tokens[start.tokenIndex:stop.tokenIndex + 1]:
+        if token.channel == Token.HIDDEN_CHANNEL:
+            continue
+        if token.channel != Token.DEFAULT_CHANNEL:
+            return ()
+        kind = token.type
+        offset += len(token.text)
+        if kind in _QUOTES:
+            if nesting and nesting[-1] in _QUOTES:
+                nesting.pop()
+                strings -= 1
+            else:
+                nesting.append(kind)
+                strings += 1
+        elif kind in (WdlV1Parser.StringCommandStart, WdlV1Parser.LBRACE):
+            nesting.append(kind)
+        elif kind == WdlV1Parser.RBRACE:
+            if nesting:
+                nesting.pop()
+        elif not strings and (
+            kind == WdlV1Parser.COMMA or (kind in _OPERATORS and previous in _OPERAND_ENDS)
+        ):
+            breaks.append(offset)
+        previous = kind
+
+    if breaks and breaks[-1] == offset:
+        breaks.pop()
+    return tuple(breaks)
+
+
+def _expression_node(ctx) -> syntax.Expression:
+    return syntax.Expression(node_text(ctx), _breaks(ctx), span=_span(ctx))
+
+
+def _expression(ctx) -> Optional[syntax.Expression]:
+    expressions = subset_children(ctx.children or [], WdlV1Parser.ExprContext)
+    if not expressions:
+        return None
+    return _expression_node(expressions[0])
+
+
+class _Lowering:
+    """Lowers one parse tree; `before` maps `id(node)` to the comments placed
+    before the node.
+
+    Blocks are not lowered by recursion: `body` hands out an empty list and
+    queues the block in `pending`, and `document` fills the queued bodies one
+    after the other, so scatters and conditionals can be nested arbitrarily
+    deep.
+    """
+
+    def __init__(self, tree, comments: List[CommonToken]):
+        self.before = {}
+        self.pending = []
+        if comments:
+            neighbours = comment_neighbours(tree, [token.tokenIndex for token in comments])
+            for token, (neighbour, _) in zip(comments, neighbours):
+                comment = syntax.Comment(token.text, span=_token_span(token))
+                self.before.setdefault(id(neighbour), []).append(comment)
+
+    def body(self, ctx, lower=None) -> list:
+        """The elements `lower` (by default `element`) makes of the children
+        of `ctx`, with the comments placed before each. The list is filled
+        by `fill` later."""
+        body = []
+        self.pending.append((body, ctx, lower or self.element))
+        return body
+
+    def fill(self, body: list, ctx, lower) -> None:
+        for child in ctx.children or ():
+            body.extend(self.before.get(id(child), ()))
+            node = lower(child)
+            if node is not None:
+                body.append(node)
+
+    def inline(self, children) -> tuple:
+        """The comments placed before `children`, the nodes starting each
+        part of a one-line construct after the first, as `(index, text)`:
+        the number of parts before the comment, and its text. Missing
+        children (after error recovery) are None."""
+        inline = []
+        for index, child in enumerate(children, start=1):
+            for comment in self.before.get(id(child), ()):
+                inline.append((index, comment.text))
+        return tuple(inline)
+
+    def element(self, ctx):
+        """The syntax node for `ctx`, or None for tokens and rules that have
+        none."""
+        while type(ctx) in _WRAPPERS:
+            if not ctx.children:
+                return None
+            ctx = ctx.children[0]
+        lower = _LOWERERS.get(type(ctx))
+        return None if lower is None else lower(self, ctx)
+
+    def document(self, ctx) -> syntax.Document:
+        document = syntax.Document(self.body(ctx), span=_span(ctx))
+        while self.pending:
+            self.fill(*self.pending.pop())
+        return document
+
+    def version(self, ctx) -> syntax.Version:
+        return syntax.Version(_text(ctx.ReleaseVersion()), span=_span(ctx))
+
+    def import_doc(self, ctx) -> syntax.Import:
+        uri = ctx.string()
+        alias = ctx.import_as()
+        return syntax.Import(
+            "" if uri is None else node_text(uri),
+            None if alias is None else _text(alias.Identifier()),
+            tuple((_text(a.Identifier(0)), _text(a.Identifier(1))) for a in ctx.import_alias()),
+            span=_span(ctx),
+        )
+
+    def struct(self, ctx) -> syntax.Struct:
+        # Members keep the spelling of their type, with whitespace normalized.
+        return syntax.Struct(_text(ctx.Identifier()), self.body(ctx, self.struct_member), span=_span(ctx))
+
+    def struct_member(self, ctx) -> Optional[syntax.Declaration]:
+        if isinstance(ctx, WdlV1Parser.Unbound_declsContext):
+            return self.declaration(ctx, raw=True)
+        return None
+
+    def task(self, ctx) -> syntax.Task:
+        return syntax.Task(_text(ctx.Identifier()), self.body(ctx), span=_span(ctx))
+
+    def workflow(self, ctx) -> syntax.Workflow:
+        return syntax.Workflow(_text(ctx.Identifier()), self.body(ctx), span=_span(ctx))
+
+    def input(self, ctx) -> syntax.Input:
+        return syntax.Input(self.body(ctx), span=_span(ctx))
+
+    def output(self, ctx) -> syntax.Output:
+        return syntax.Output(self.body(ctx), span=_span(ctx))
+
+    def declaration(self, ctx, raw: bool = False) -> syntax.Declaration:
+        """A bound or unbound declaration. With `raw`, the type and the
+        comments keep their source text with whitespace normalized, instead
+        of the text of their tokens."""
+        type_, name, expression = "", "", None
+        inline = []
+        parts = 0
+        for child in ctx.children or ():
+            for comment in self.before.get(id(child), ()):
+                inline.append((parts, " ".join(comment.text.split()) if raw else comment.text))
+            if isinstance(child, WdlV1Parser.Wdl_typeContext):
+                type_ = " ".join(get_raw_text(child).split()) if raw else node_text(child)
+            elif isinstance(child, WdlV1Parser.ExprContext):
+                expression = _expression_node(child)
+            elif isinstance(child, TerminalNode) and child.symbol.type == WdlV1Parser.Identifier:
+                name = child.getText()
+            elif not (isinstance(child, TerminalNode) and child.symbol.type == WdlV1Parser.EQUAL):
+                # Only left here by error recovery.
+                inline.append((parts, node_text(child)))
+                continue
+            parts += 1
+        return syntax.Declaration(type_, name, expression, tuple(inline), span=_span(ctx))
+
+    def command(self, ctx) -> syntax.Command:
+        commands = subset_children(
+            ctx.children or [],
+            [
+                WdlV1Parser.Task_command_string_partsContext,
+                WdlV1Parser.Task_command_expr_with_stringContext,
+            ],
+        )
+        script = "".join([get_raw_text(i).lstrip() for i in commands])
+        script = "\n".join([line.lstrip() for line in script.split("\n")])
+        # `${...}` is only a WDL interpolation in `command { }` blocks.
+        return syntax.Command(script, ctx.BeginLBrace() is not None, span=_span(ctx))
+
+    def runtime(self, ctx) -> syntax.Runtime:
+        return syntax.Runtime(self.body(ctx), span=_span(ctx))
+
+    def runtime_entry(self, ctx) -> syntax.RuntimeEntry:
+        return syntax.RuntimeEntry(
+            _text(ctx.Identifier()), _expression(ctx), self.inline([ctx.COLON(), ctx.expr()]), span=_span(ctx)
+        )
+
+    def parameter_meta(self, ctx) -> syntax.ParameterMeta:
+        return syntax.ParameterMeta(self.body(ctx), span=_span(ctx))
+
+    def meta(self, ctx) -> syntax.Meta:
+        return syntax.Meta(self.body(ctx), span=_span(ctx))
+
+    def meta_entry(self, ctx) -> syntax.MetaEntry:
+        value = ctx.meta_value()
+        return syntax.MetaEntry(
+            _text(ctx.MetaIdentifier()),
+            "" if value is None else node_text(value),
+            self.inline([ctx.MetaColon(), value]),
+            span=_span(ctx),
+        )
+
+    def call(self, ctx) -> syntax.Call:
+        alias = ctx.call_alias()
+        body = ctx.call_body()
+        header = [ctx.call_name()]
+        if alias is not None:
+            header += [alias, alias.Identifier()]
+        if body is not None:
+            header.append(body)
+        return syntax.Call(
+            "" if ctx.call_name() is None else node_text(ctx.call_name()),
+            None if alias is None else _text(alias.Identifier()),
+            None if body is None else self.body(body),
+            self.inline(header),
+            span=_span(ctx),
+        )
+
+    def call_inputs(self, ctx) -> syntax.CallInputs:
+        return syntax.CallInputs(self.body(ctx), span=_span(ctx))
+
+    def call_input(self, ctx) -> syntax.CallInput:
+        return syntax.CallInput(
+            _text(ctx.Identifier()), _expression(ctx), self.inline([ctx.EQUAL(), ctx.expr()]), span=_span(ctx)
+        )
+
+    def scatter(self, ctx) -> syntax.Scatter:
+        return syntax.Scatter(_text(ctx.Identifier()), _expression(ctx), self.body(ctx), span=_span(ctx))
+
+    def conditional(self, ctx) -> syntax.Conditional:
+        return syntax.Conditional(_expression(ctx), self.body(ctx), span=_span(ctx))
+
+
+_LOWERERS = {
+    WdlV1Parser.VersionContext: _Lowering.version,
+    WdlV1Parser.Import_docContext: _Lowering.import_doc,
+    WdlV1Parser.StructContext: _Lowering.struct,
+    WdlV1Parser.TaskContext: _Lowering.task,
+    WdlV1Parser.WorkflowContext: _Lowering.workflow,
+    WdlV1Parser.Task_inputContext: _Lowering.input,
+    WdlV1Parser.Workflow_inputContext: _Lowering.input,
+    WdlV1Parser.Task_outputContext: _Lowering.output,
+    WdlV1Parser.Workflow_outputContext: _Lowering.output,
+    WdlV1Parser.Bound_declsContext: _Lowering.declaration,
+    WdlV1Parser.Unbound_declsContext: _Lowering.declaration,
+    WdlV1Parser.Task_commandContext: _Lowering.command,
+    WdlV1Parser.Task_runtimeContext: _Lowering.runtime,
+    WdlV1Parser.Task_runtime_kvContext: _Lowering.runtime_entry,
+    WdlV1Parser.Parameter_metaContext: _Lowering.parameter_meta,
+    WdlV1Parser.MetaContext: _Lowering.meta,
+    WdlV1Parser.Meta_kvContext: _Lowering.meta_entry,
+    WdlV1Parser.CallContext: _Lowering.call,
+    WdlV1Parser.Call_inputsContext: _Lowering.call_inputs,
+    WdlV1Parser.Call_inputContext: _Lowering.call_input,
+    WdlV1Parser.ScatterContext: _Lowering.scatter,
+    WdlV1Parser.ConditionalContext: _Lowering.conditional,
+}
+
+
+def lower(tree: WdlV1Parser.DocumentContext, comments: List[CommonToken]) -> syntax.Document:
+    """Build the syntax tree of a parsed document.
+
+    Args:
+        tree: The parse tree, from `WdlV1Parser.document()`.
+        comments: The comment tokens of the document, in order.
+
+    Returns:
+        The `syntax.Document`. It holds no reference to `tree`.
+    """
+    return _Lowering(tree, comments).document(tree)
@@ -0,0 +1,14 @@
+"""The parse and verify modes, apart from the modules that implement them.
+
+Nothing here imports the parser, so the command line tools can list the
+modes (for `--help`, say) without loading it.
+"""
+
+# "two-stage" parses with SLL prediction first and only falls back to
+# full LL when SLL fails; "ll" always uses full LL prediction.
+PARSE_MODES = ("two-stage", "ll")
+DEFAULT_PARSE_MODE = "two-stage"
+
+# See verify.py.
+VERIFY_MODES = ("off", "fast", "full")
+DEFAULT_VERIFY_MODE = "fast"
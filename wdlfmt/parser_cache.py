@@ -0,0 +1,123 @@
+"""Process-wide warm prediction state for the WDL lexer and parser.
+
+The pure-Python ANTLR runtime learns DFA states lazily while it predicts
+which alternative to take. Building those states is the expensive part of a
+cold parse, so instead of rebuilding them for every document we keep a single
+set of DFAs and prediction-context caches alive for the whole process and hand
+them to every `WdlV1Lexer` / `WdlV1Parser` we create.
+
+The cache only ever grows, so it has a ceiling: after each document the number
+of learned DFA states and cached prediction contexts is compared against
+`max_states`, and if it is exceeded everything is dropped and learning starts
+again from scratch. DFA states are linked to each other through their edges,
+so partial eviction is not safe — a full reset is the only eviction policy.
+"""
+
+import os
+
+from antlr4.atn.LexerATNSimulator import LexerATNSimulator
+from antlr4.atn.ParserATNSimulator import ParserATNSimulator
+from antlr4.dfa.DFA import DFA
+from antlr4.PredictionContext import PredictionContextCache
+
+from .grammar.WdlV1Lexer import WdlV1Lexer
+from .grammar.WdlV1Parser import WdlV1Parser
+
+# Large enough to hold the states learned from a few thousand BioWDL files
+# (a few tens of MB), small enough that a long-lived process stays bounded.
+DEFAULT_MAX_STATES = 200_000
+
+MAX_STATES_ENV = "WDLFMT_PARSER_CACHE_MAX_STATES"
+
+
+def _default_max_states() -> int:
+    value = os.environ.get(MAX_STATES_ENV)
+    if value is None:
+        return DEFAULT_MAX_STATES
+    return int(value)
+
+
+def _fresh_dfas(atn) -> list:
+    return [DFA(state, i) for i, state in enumerate(atn.decisionToState)]
+
+
+class ParserCache:
+    """Shared DFA and prediction-context caches for `WdlV1Lexer` and `WdlV1Parser`.
+
+    Args:
+        max_states: Ceiling on learned DFA states plus cached prediction
+            contexts. When a finished document leaves the cache above this
+            size the cache is reset. `0` resets after every document, which
+            reproduces a cold parse each time.
+
+    Attributes:
+        documents: Number of documents parsed since the cache was created.
+        resets: Number of times the ceiling was hit and the cache was dropped.
+    """
+
+    def __init__(self, max_states: int = None):
+        self.max_states = _default_max_states() if max_states is None else max_states
+        self.documents = 0
+        self.resets = 0
+        self._clear()
+
+    def _clear(self):
+        self.lexer_dfa = _fresh_dfas(WdlV1Lexer.atn)
+        self.parser_dfa = _fresh_dfas(WdlV1Parser.atn)
+        self.lexer_contexts = PredictionContextCache()
+        self.parser_contexts = PredictionContextCache()
+
+    def lexer(self, input_stream) -> WdlV1Lexer:
+        """Return a `WdlV1Lexer` over `input_stream` that learns into this cache."""
+        lexer = WdlV1Lexer(input_stream)
+        lexer._interp = LexerATNSimulator(
+            lexer, lexer.atn, self.lexer_dfa, self.lexer_contexts
+        )
+        return lexer
+
+    def parser(self, token_stream) -> WdlV1Parser:
+        """Return a `WdlV1Parser` over `token_stream` that learns into this cache."""
+        parser = WdlV1Parser(token_stream)
+        parser._interp = ParserATNSimulator(
+            parser, parser.atn, self.parser_dfa, self.parser_contexts
+        )
+        return parser
+
+    def size(self) -> int:
+        """Number of learned DFA states plus cached prediction contexts."""
+        states = sum(len(dfa._states) for dfa in self.lexer_dfa)
+        states += sum(len(dfa._states) for dfa in self.parser_dfa)
+        return states + len(self.lexer_contexts) + len(self.parser_contexts)
+
+    def release(self):
+        """Mark the end of a document and enforce the size ceiling."""
+        self.documents += 1
+        self.trim()
+
+    def trim(self):
+        """Enforce the size ceiling."""
+        if self.size() > self.max_states:
+            self.reset()
+
+    def reset(self):
+        """Drop everything learned so far."""
+        self.resets += 1
+        self._clear()
+
+
+_cache = None
+
+
+def get_parser_cache() -> ParserCache:
+    """Return the process-wide `ParserCache`, creating it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = ParserCache()
+    return _cache
+
+
+def configure_parser_cache(max_states: int) -> ParserCache:
+    """Replace the process-wide cache with an empty one using a new ceiling."""
+    global _cache
+    _cache = ParserCache(max_states=max_states)
+    return _cache
@@ -0,0 +1,370 @@
+"""Warm-start: what a `ParserCache` has learned, saved between processes.
+
+Every new `wdlfmt` process starts with empty DFAs and spends its first
+documents learning the same prediction states as the process before it (see
+`parser_cache.py`). With warm start enabled, the process-wide cache is loaded
+from the user cache directory on start-up and written back when the process
+exits, so a cold run predicts as fast as a warm one.
+
+The file holds the learned DFA states of `WdlV1Lexer` and `WdlV1Parser` and
+the prediction contexts they refer to. ATN states, the runtime's singletons
+and the lexer's actions are stored as references into the ATNs the generated
+grammar deserializes on import, so the file only matches the grammar it was
+written for: its name is keyed by a hash of `wdlfmt/grammar/`, the ANTLR
+runtime version and the Python version, and any other file is ignored.
+
+The runtime caches some hash codes that depend on the process's string
+hashing, so the objects that cache one are rebuilt through their
+constructors when the file is loaded rather than restored as they were.
+"""
+
+import hashlib
+import io
+import os
+import pickle
+import sys
+import tempfile
+from pathlib import Path
+from typing import Optional, Union
+
+from antlr4.atn.ATNConfigSet import ATNConfigSet
+from antlr4.atn.ATNSimulator import ATNSimulator
+from antlr4.atn.ATNState import ATNState
+from antlr4.atn.LexerAction import LexerMoreAction, LexerPopModeAction, LexerSkipAction
+from antlr4.atn.LexerActionExecutor import LexerActionExecutor
+from antlr4.atn.LexerATNSimulator import LexerATNSimulator
+from antlr4.atn.SemanticContext import SemanticContext
+from antlr4.dfa.DFAState import DFAState
+from antlr4.PredictionContext import (
+    ArrayPredictionContext,
+    PredictionContext,
+    PredictionContextCache,
+    SingletonPredictionContext,
+)
+
+from .grammar.WdlV1Lexer import WdlV1Lexer
+from .grammar.WdlV1Parser import WdlV1Parser
+from .parser_cache import ParserCache, _fresh_dfas, get_parser_cache
+
+# Bump when the layout of the file changes.
+STATE_FORMAT = 1
+
+_GRAMMAR_DIR = Path(__file__).parent / "grammar"
+
+_ATNS = {"lexer": WdlV1Lexer.atn, "parser": WdlV1Parser.atn}
+
+# Objects the runtime compares by identity.
+_SINGLETONS = {
+    "empty-context": PredictionContext.EMPTY,
+    "no-predicate": SemanticContext.NONE,
+    "parser-error": ATNSimulator.ERROR,
+    "lexer-error": LexerATNSimulator.ERROR,
+    "skip": LexerSkipAction.INSTANCE,
+    "pop-mode": LexerPopModeAction.INSTANCE,
+    "more": LexerMoreAction.INSTANCE,
+}
+
+
+def _runtime_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("antlr4-python3-runtime")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def state_key() -> str:
+    """Identifies the grammar, ANTLR runtime and Python a state file is for."""
+    h = hashlib.sha256()
+    h.update(f"{STATE_FORMAT}:{_runtime_version()}:{sys.version_info[0]}.{sys.version_info[1]}\n".encode())
+    for path in sorted(_GRAMMAR_DIR.iterdir()):
+        if path.is_file():
+            h.update(f"{path.name}\n".encode())
+            h.update(path.read_bytes())
+    return h.hexdigest()[:16]
+
+
+def state_path(directory: Union[str, Path]) -> Path:
+    """The state file for this grammar in `directory`."""
+    return Path(directory) / f"parser-state.{state_key()}.pickle"
+
+
+def _dfa_state(stateNumber, configs, isAcceptState, prediction, lexerActionExecutor, requiresFullContext, predicates):
+    state = DFAState(stateNumber, configs)
+    state.isAcceptState = isAcceptState
+    state.prediction = prediction
+    state.lexerActionExecutor = lexerActionExecutor
+    state.requiresFullContext = requiresFullContext
+    state.predicates = predicates
+    return state
+
+
+def _config_set(fullCtx, configs, readonly, uniqueAlt, conflictingAlts, hasSemanticContext, dipsIntoOuterContext):
+    # The hash of a read-only set is recomputed on first use.
+    config_set = ATNConfigSet(fullCtx)
+    for config in configs:
+        config_set.add(config)
+    config_set.uniqueAlt = uniqueAlt
+    config_set.conflictingAlts = conflictingAlts
+    config_set.hasSemanticContext = hasSemanticContext
+    config_set.dipsIntoOuterContext = dipsIntoOuterContext
+    if readonly:
+        config_set.setReadonly(True)
+    return config_set
+
+
+class _Pickler(pickle.Pickler):
+    def __init__(self, file):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._ids = {}
+        for grammar, atn in _ATNS.items():
+            for i, action in enumerate(atn.lexerActions or ()):
+                self._ids[id(action)] = ("action", grammar, i)
+        for name, obj in _SINGLETONS.items():
+            self._ids[id(obj)] = ("singleton", name)
+
+    def persistent_id(self, obj):
+        pid = self._ids.get(id(obj))
+        if pid is not None:
+            return pid
+        if isinstance(obj, ATNState):
+            for grammar, atn in _ATNS.items():
+                if obj.atn is atn:
+                    return ("state", grammar, obj.stateNumber)
+            raise pickle.PicklingError(f"{obj!r} is not a state of the WDL lexer or parser")
+        return None
+
+    def reducer_override(self, obj):
+        # Edges are saved separately, so saving a state never recurses into
+        # the states it leads to.
+        if isinstance(obj, DFAState):
+            return _dfa_state, (
+                obj.stateNumber,
+                obj.configs,
+                obj.isAcceptState,
+                obj.prediction,
+                obj.lexerActionExecutor,
+                obj.requiresFullContext,
+                obj.predicates,
+            )
+        if isinstance(obj, ATNConfigSet):
+            return _config_set, (
+                obj.fullCtx,
+                obj.configs,
+                obj.readonly,
+                obj.uniqueAlt,
+                obj.conflictingAlts,
+                obj.hasSemanticContext,
+                obj.dipsIntoOuterContext,
+            )
+        if isinstance(obj, LexerActionExecutor):
+            return LexerActionExecutor, (obj.lexerActions,)
+        if isinstance(obj, ArrayPredictionContext):
+            return ArrayPredictionContext, (obj.parents, obj.returnStates)
+        if type(obj) is SingletonPredictionContext:
+            return SingletonPredictionContext, (obj.parentCtx, obj.returnState)
+        return NotImplemented
+
+
+class _Unpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        kind, *rest = pid
+        if kind == "state":
+            grammar, number = rest
+            state = _ATNS[grammar].states[number]
+            if state is None:
+                raise pickle.UnpicklingError(f"no {grammar} ATN state {number}")
+            return state
+        if kind == "action":
+            grammar, index = rest
+            return _ATNS[grammar].lexerActions[index]
+        if kind == "singleton":
+            return _SINGLETONS[rest[0]]
+        raise pickle.UnpicklingError(f"unknown reference {pid!r}")
+
+    def find_class(self, module, name):
+        if module != __name__ and module.split(".")[0] != "antlr4":
+            raise pickle.UnpicklingError(f"{module}.{name} is not part of a parser state")
+        return super().find_class(module, name)
+
+
+def _reachable_states(cache: ParserCache) -> list:
+    seen = {id(s) for s in _SINGLETONS.values()}
+    states = []
+    todo = [dfa.s0 for dfa in cache.lexer_dfa + cache.parser_dfa if dfa.s0 is not None]
+    for dfa in cache.lexer_dfa + cache.parser_dfa:
+        todo.extend(dfa._states)
+    while todo:
+        state = todo.pop()
+        if state is None or id(state) in seen:
+            continue
+        seen.add(id(state))
+        states.append(state)
+        if state.edges:
+            todo.extend(state.edges)
+    return states
+
+
+def dumps_state(cache: ParserCache) -> bytes:
+    """Serialize what `cache` has learned."""
+    states = _reachable_states(cache)
+    payload = {
+        # First, so that every state is saved before any edge refers to it.
+        "states": states,
+        "edges": [s.edges for s in states],
+        "lexer": [(dfa.s0, list(dfa._states)) for dfa in cache.lexer_dfa],
+        "parser": [(dfa.s0, list(dfa._states)) for dfa in cache.parser_dfa],
+        "lexer_contexts": list(cache.lexer_contexts.cache),
+        "parser_contexts": list(cache.parser_contexts.cache),
+    }
+    buffer = io.BytesIO()
+    pickle.dump({"size": cache.size()}, buffer)
+    _Pickler(buffer).dump(payload)
+    return buffer.getvalue()
+
+
+def _restore_dfas(atn, saved: list) -> list:
+    dfas = _fresh_dfas(atn)
+    if len(saved) != len(dfas):
+        raise ValueError("the saved state is for a different grammar")
+    for dfa, (s0, states) in zip(dfas, saved):
+        dfa.s0 = s0
+        dfa._states = {s: s for s in states}
+    return dfas
+
+
+def _restore_contexts(contexts: list) -> PredictionContextCache:
+    cache = PredictionContextCache()
+    cache.cache = {c: c for c in contexts}
+    return cache
+
+
+def loads_state(cache: ParserCache, data: bytes) -> None:
+    """Replace what `cache` has learned with a state from `dumps_state`."""
+    file = io.BytesIO(data)
+    pickle.load(file)
+    payload = _Unpickler(file).load()
+    for state, edges in zip(payload["states"], payload["edges"]):
+        state.edges = edges
+    lexer_dfa = _restore_dfas(WdlV1Lexer.atn, payload["lexer"])
+    parser_dfa = _restore_dfas(WdlV1Parser.atn, payload["parser"])
+    cache.lexer_dfa, cache.parser_dfa = lexer_dfa, parser_dfa
+    cache.lexer_contexts = _restore_contexts(payload["lexer_contexts"])
+    cache.parser_contexts = _restore_contexts(payload["parser_contexts"])
+
+
+def _saved_size(path: Path) -> int:
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)["size"]
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError):
+        return 0
+
+
+def load_state(cache: ParserCache, path: Union[str, Path]) -> bool:
+    """Load the state saved at `path` into `cache`.
+
+    Returns:
+        Whether anything was loaded. A missing, unreadable or corrupt file
+        leaves `cache` as it was.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return False
+    try:
+        loads_state(cache, data)
+    except Exception:
+        return False
+    return True
+
+
+def save_state(cache: ParserCache, path: Union[str, Path]) -> bool:
+    """Save what `cache` has learned to `path`, replacing it atomically.
+
+    Several processes may share a state file (`wdlfmt -j` runs one per
+    worker), and their states cannot be merged, so the file is only replaced
+    by a state that has learned more than the one already there.
+
+    Returns:
+        Whether the file was written.
+    """
+    path = Path(path)
+    if cache.size() <= _saved_size(path):
+        return False
+    try:
+        data = dumps_state(cache)
+    except (pickle.PicklingError, RecursionError):
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".parser-state.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+    return True
+
+
+_warm_start = None
+
+
+class _WarmStart:
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.path = state_path(directory)
+        self.pid = os.getpid()
+        self.loaded_size = 0
+
+    def save(self):
+        cache = get_parser_cache()
+        if cache.size() > self.loaded_size:
+            save_state(cache, self.path)
+
+
+def enable_warm_start(directory: Union[str, Path, None] = None) -> bool:
+    """Load the process-wide `ParserCache` from the state file in `directory`
+    and save it back when the process exits.
+
+    Worker processes that call this save their own state when they exit.
+    A process forked after warm start was enabled inherits the loaded state
+    and only has to call this again to save what it learns.
+
+    Args:
+        directory: Where to keep the state file (default:
+            `cache.user_cache_dir()`).
+
+    Returns:
+        Whether a saved state was loaded.
+    """
+    from multiprocessing.util import Finalize
+
+    from .cache import user_cache_dir
+
+    global _warm_start
+    directory = Path(directory) if directory is not None else user_cache_dir()
+    inherited = _warm_start is not None and _warm_start.directory == directory
+    if inherited and _warm_start.pid == os.getpid():
+        return False
+    _warm_start = _WarmStart(directory)
+    cache = get_parser_cache()
+    loaded = False
+    if not inherited and cache.size() == 0:
+        loaded = load_state(cache, _warm_start.path)
+    _warm_start.loaded_size = cache.size()
+    # Unlike atexit handlers, multiprocessing's finalizers also run when a
+    # worker process exits.
+    Finalize(None, _warm_start.save, exitpriority=0)
+    return loaded
+
+
+def warm_start_directory() -> Optional[Path]:
+    """The directory warm start was enabled with in this process, or `None`."""
+    return _warm_start.directory if _warm_start is not None else None
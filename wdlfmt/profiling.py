@@ -0,0 +1,189 @@
+"""Where the time goes: per-stage timers and counters for the pipeline.
+
+Profiling is off unless a `Profile` is being collected, and then every
+`stage` and `count` call in the pipeline is a global lookup and a `None`
+check. Turn it on with `collect`:
+
+    with profiling.collect() as profile:
+        wdlfmt.format_wdl_str(source)
+    print(profile.format_table())
+
+or pass `profile=True` to `wdlfmt.batch.format_many`, which attaches a
+`Profile` to every `FileResult` (also from worker processes) and calls the
+hooks registered with `add_hook` as each result arrives. `wdlfmt --profile`
+prints the sum over all files.
+
+Stage times are exclusive: time spent in a stage nested inside another
+(shfmt while walking the tree, say) is only counted for the inner one, so
+the stages add up to the time spent formatting.
+
+Stages:
+
+* `lex`: tokenizing the source.
+* `parse`: building the parse tree (both passes in two-stage mode).
+* `lower`: building the syntax tree, with the comments, from the parse tree.
+* `format`: the formatter walk.
+* `shfmt`: running shfmt processes.
+* `verify`: checking the output against the source (see `verify.py`).
+* `check`: the style checker.
+
+Counters include `documents`, `characters`, `tokens`, `comments`,
+`nodes_formatted`, `parse_sll` and `parse_ll`, `shfmt_processes`,
+`shfmt_cache_hits` and `shfmt_cache_misses`, and `style_checks`.
+
+Profiles are collected per process and are not thread-safe: collect in one
+thread at a time.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+STAGES = ("lex", "parse", "lower", "format", "shfmt", "verify", "check")
+
+# The profile being collected in this process, or None when profiling is off.
+_current: Optional["Profile"] = None
+
+_NULL = nullcontext()
+
+_hooks: List[Callable[[str, "Profile"], None]] = []
+
+
+@dataclass
+class Profile:
+    """Stage timings and counters for one or more documents.
+
+    Attributes:
+        seconds: Exclusive time spent in each stage.
+        total: Time spent collecting, including anything not in a stage.
+        counts: Event counters, such as tokens lexed or shfmt processes run.
+    """
+
+    seconds: Dict[str, float] = field(default_factory=dict)
+    total: float = 0.0
+    counts: Counter = field(default_factory=Counter)
+    # Time spent in the nested stages of each stage that is running.
+    _nested: List[float] = field(default_factory=list, repr=False, compare=False)
+
+    def add(self, other: "Profile") -> None:
+        """Add `other`'s timings and counts to this profile."""
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.total += other.total
+        self.counts.update(other.counts)
+
+    def to_dict(self) -> dict:
+        """The profile as plain JSON-serializable data."""
+        return {"total": self.total, "seconds": dict(self.seconds), "counts": dict(self.counts)}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def format_table(self) -> str:
+        """A human-readable table of stages and counters."""
+        stages = [s for s in STAGES if s in self.seconds] + sorted(set(self.seconds) - set(STAGES))
+        other = max(self.total - sum(self.seconds.values()), 0.0)
+        lines = [f"{'stage':<16} {'seconds':>10} {'share':>6}"]
+        for stage, seconds in [(s, self.seconds[s]) for s in stages] + [("other", other)]:
+            share = seconds / self.total if self.total else 0.0
+            lines.append(f"{stage:<16} {seconds:10.4f} {share:6.1%}")
+        lines.append(f"{'total':<16} {self.total:10.4f}")
+        if self.counts:
+            lines.append("")
+            lines.append(f"{'counter':<20} {'value':>10}")
+            for name in sorted(self.counts):
+                lines.append(f"{name:<20} {self.counts[name]:>10}")
+        return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def collect() -> Iterator[Profile]:
+    """Collect a `Profile` of everything the pipeline does in this block.
+
+    A nested `collect` gets its own profile, which is also added to the
+    enclosing one when the block ends.
+    """
+    global _current
+    outer, profile = _current, Profile()
+    _current = profile
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        profile.total += time.perf_counter() - start
+        _current = outer
+        if outer is not None:
+            outer.add(profile)
+
+
+@contextmanager
+def _timed(profile: Profile, name: str):
+    nested = profile._nested
+    nested.append(0.0)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        inner = nested.pop()
+        profile.seconds[name] = profile.seconds.get(name, 0.0) + elapsed - inner
+        if nested:
+            nested[-1] += elapsed
+
+
+def stage(name: str):
+    """A context manager timing the block as stage `name`, or doing nothing
+    when no profile is being collected."""
+    if _current is None:
+        return _NULL
+    return _timed(_current, name)
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add `n` to counter `name` if a profile is being collected."""
+    if _current is not None:
+        _current.counts[name] += n
+
+
+@contextmanager
+def suspended():
+    """Record nothing in this block; its time goes to the enclosing stage."""
+    global _current
+    current, _current = _current, None
+    try:
+        yield
+    finally:
+        _current = current
+
+
+def enabled() -> bool:
+    """True while a profile is being collected."""
+    return _current is not None
+
+
+def add_hook(hook: Callable[[str, Profile], None]) -> None:
+    """Call `hook(path, profile)` for every document `format_many` formats.
+
+    Registering a hook turns profiling on in `format_many` (and so in
+    `format_wdl` and the CLI). Documents passed as source strings are
+    reported with the path `"<string>"`.
+    """
+    _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[str, Profile], None]) -> None:
+    _hooks.remove(hook)
+
+
+def has_hooks() -> bool:
+    return bool(_hooks)
+
+
+def run_hooks(path: str, profile: Profile) -> None:
+    for hook in list(_hooks):
+        hook(path, profile)
@@ -0,0 +1,72 @@
+"""What formatting a file produces, and how it is written out.
+
+Kept apart from the formatter so that `wdlfmt --daemon`, which only talks to
+a running wdlfmtd, never loads the parser or the formatters.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from . import profiling
+from .checker import CheckResult
+
+
+@dataclass
+class FileResult:
+    """The outcome of formatting a single file.
+
+    Attributes:
+        path: The file that was formatted.
+        source: The original file contents, if the file could be read.
+        formatted: The formatted WDL (no footer), or `None` on error.
+        check_results: Style checker results when checking was requested.
+        parse_stage: `"sll"` or `"ll"`, the parse stage that succeeded.
+        error: A one-line description of the failure, or `None`.
+        exception: The original exception. Only kept for in-process runs;
+            results returned from worker processes carry `error` alone.
+        cached: True if the format cache showed the file was already
+            formatted. The file was not read, so `source` and `formatted`
+            are `None`.
+        syntax_errors: The syntax errors the parser recovered from, as
+            `"line L:C message"` strings.
+        profile: Stage timings and counters, when profiling was requested.
+    """
+
+    path: str
+    source: Optional[str] = None
+    formatted: Optional[str] = None
+    check_results: Optional[List[CheckResult]] = None
+    parse_stage: Optional[str] = None
+    error: Optional[str] = None
+    exception: Optional[BaseException] = field(default=None, repr=False, compare=False)
+    cached: bool = False
+    syntax_errors: List[str] = field(default_factory=list)
+    profile: Optional[profiling.Profile] = None
+
+    @property
+    def changed(self) -> bool:
+        """True if formatting succeeded and produced different text."""
+        return self.formatted is not None and self.formatted != self.source
+
+
+def add_footer(formatted):
+    """Add a footer to the formatted WDL"""
+    # Add the date and time and a link to the GIthub repo
+    import datetime
+
+    ts = datetime.datetime.now().strftime('%m/%d/%Y, %H:%M:%S')
+    footer = f"# Formatted by wdlfmt (https://github.com/Chris1221/wdlfmt) on {ts}\n"
+
+    # Let's check if there's already a footer
+    # and if so replace it
+    lines = formatted.split("\n")
+    if lines[-1].startswith("# Formatted by wdlfmt"):
+        formatted = "\n".join(lines[:-1]) + "\n"
+
+    elif len(lines) > 1 and lines[-2].startswith("# Formatted by wdlfmt"):
+        formatted = "\n".join(lines[:-2]) + "\n"
+
+    formatted += footer
+    return formatted
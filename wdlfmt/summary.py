@@ -0,0 +1,85 @@
+"""The structure the style checker needs, collected while formatting.
+
+`StyleChecker` looks at the tasks, workflows, structs, calls, runtime
+sections and command blocks of the text it checks. The parser has already
+found all of them, so a `WdlVisitor` created with `summarize=True` fills in a
+`Summary` from each top-level syntax node as it is formatted, and the checker
+evaluates its rules against that instead of scanning the formatted text (see
+`wdlfmt.format_and_check`).
+
+Offsets in the summary point into the formatted output. The formatters put
+every section of a task or workflow on a line of its own at one level of
+indentation, so a section is found in its element's output by looking for
+that line, in the order of the tree.
+"""
+
+from .checker import Call, Command, Definition, Runtime, Summary, script_lines
+from . import syntax
+
+_SECTION_INDENT = " " * 4
+
+
+def _find(text: str, line: str, pos: int) -> int:
+    """The index in `text` of the next section line starting with `line`."""
+    i = text.find(f"\n{_SECTION_INDENT}{line}", pos)
+    if i == -1:
+        raise LookupError(f"{line!r} is not in the formatted element")
+    return i + 1 + len(_SECTION_INDENT)
+
+
+def _task(summary: Summary, task: syntax.Task, text: str, offset: int) -> None:
+    definition = Definition("task", task.name, offset + len("task "), parameter_meta=False)
+    summary.definitions.append(definition)
+    pos = 0
+    for section in task.body:
+        if isinstance(section, syntax.ParameterMeta):
+            definition.parameter_meta = True
+        elif isinstance(section, syntax.Runtime):
+            pos = _find(text, "runtime {", pos)
+            keys = [entry.key for entry in section.body if isinstance(entry, syntax.RuntimeEntry)]
+            summary.runtimes.append(Runtime(keys, offset + pos))
+        elif isinstance(section, syntax.Command):
+            start = _find(text, "command <<<\n", pos)
+            pos = _find(text, ">>>\n", start)
+            script = text[start + len("command <<<\n"):pos]
+            summary.commands.append(Command(script_lines(script), "set -e -o pipefail" in script, offset + start))
+
+
+def _workflow(summary: Summary, workflow: syntax.Workflow, text: str, offset: int) -> None:
+    definition = Definition("workflow", workflow.name, offset + len("\nworkflow "), parameter_meta=False)
+    summary.definitions.append(definition)
+    pos = 0
+    for element in workflow.body:
+        if isinstance(element, syntax.ParameterMeta):
+            definition.parameter_meta = True
+        elif isinstance(element, syntax.Call):
+            if element.inline:
+                # A comment in the header breaks it across lines.
+                raise LookupError(f"call {element.target} has comments in its header")
+            pos = _find(text, f"call {element.target} ", pos)
+            if element.alias is None:
+                summary.calls.append(Call(element.target, None, offset + pos + len("call ")))
+            else:
+                start = offset + pos + len(f"call {element.target} as ")
+                summary.calls.append(Call(element.target, element.alias, start))
+
+
+def summarize_element(summary: Summary, node: syntax.Node, text: str, offset: int) -> None:
+    """Add a top-level element to `summary`.
+
+    Args:
+        summary: The summary of the document so far.
+        node: The task, workflow or struct node. Other nodes add nothing.
+        text: The element's formatted text.
+        offset: Where `text` starts in the formatted document.
+
+    Raises:
+        LookupError: If a section of the element is not where the formatters
+            put it, so the offsets cannot be trusted.
+    """
+    if isinstance(node, syntax.Task):
+        _task(summary, node, text, offset)
+    elif isinstance(node, syntax.Workflow):
+        _workflow(summary, node, text, offset)
+    elif isinstance(node, syntax.Struct):
+        summary.definitions.append(Definition("struct", node.name, offset + len("struct ")))
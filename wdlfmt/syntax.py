@@ -0,0 +1,282 @@
+"""The WDL syntax tree the formatters and the style checker work on.
+
+The ANTLR parse tree has a context object for every rule the parser went
+through (an expression alone is a dozen nested contexts), each holding its
+parser, its tokens and a list of children. `lowering.py` turns it into the
+much smaller tree of this module right after parsing, and the parse tree is
+dropped.
+
+A node keeps only what formatting needs: names, the source text of
+expressions and types, and the comments that belong to it, as `Comment`
+nodes in the `body` of the block they are in, in source order. Every node
+records where its source lies:
+
+* `start`, `stop`: character offsets into the parsed text (`stop` is
+  exclusive).
+* `token_start`, `token_stop`: indices into the token stream (`token_stop` is
+  exclusive), for verifying a node's output against its own tokens.
+
+The classes use `__slots__` and do not depend on antlr4.
+"""
+
+from typing import Optional, Tuple
+
+
+def with_inline(parts: list, inline) -> list:
+    """`parts` with the `inline` comments, given as `(index, text)` (the
+    number of parts before each comment and its text), put in place."""
+    parts = list(parts)
+    for index, text in reversed(inline):
+        parts.insert(index, text)
+    return parts
+
+
+class Node:
+    """Base class of the syntax tree nodes.
+
+    Subclasses list their fields in `_fields`, in the order the constructor
+    takes them; the span is passed as `span=(start, stop, token_start,
+    token_stop)`.
+    """
+
+    __slots__ = ("start", "stop", "token_start", "token_stop")
+    _fields: Tuple[str, ...] = ()
+
+    def __init__(self, *values, span: Tuple[int, int, int, int] = (0, 0, 0, 0)):
+        if len(values) != len(self._fields):
+            raise TypeError(f"{type(self).__name__} takes {len(self._fields)} fields, got {len(values)}")
+        for name, value in zip(self._fields, values):
+            setattr(self, name, value)
+        self.start, self.stop, self.token_start, self.token_stop = span
+
+    @property
+    def span(self) -> Tuple[int, int, int, int]:
+        return self.start, self.stop, self.token_start, self.token_stop
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+class Comment(Node):
+    """A comment, with its `#`."""
+
+    __slots__ = _fields = ("text",)
+    text: str
+
+
+class Document(Node):
+    """A whole document: the version statement, imports, structs, tasks, the
+    workflow and the comments between them."""
+
+    __slots__ = _fields = ("body",)
+    body: list
+
+
+class Version(Node):
+    __slots__ = _fields = ("version",)
+    version: str
+
+
+class Import(Node):
+    """An import; `uri` keeps its quotes and `aliases` holds the
+    `(struct, alias)` pairs of its `alias ... as ...` clauses."""
+
+    __slots__ = _fields = ("uri", "alias", "aliases")
+    uri: str
+    alias: Optional[str]
+    aliases: Tuple[Tuple[str, str], ...]
+
+
+class Struct(Node):
+    """A struct; `body` holds its member `Declaration`s and comments."""
+
+    __slots__ = _fields = ("name", "body")
+    name: str
+    body: list
+
+
+class Task(Node):
+    """A task; `body` holds its sections, declarations and comments."""
+
+    __slots__ = _fields = ("name", "body")
+    name: str
+    body: list
+
+
+class Workflow(Node):
+    """A workflow; `body` holds its sections, declarations, calls, scatters,
+    conditionals and comments."""
+
+    __slots__ = _fields = ("name", "body")
+    name: str
+    body: list
+
+
+class Input(Node):
+    """The `input` section of a task or workflow."""
+
+    __slots__ = _fields = ("body",)
+    body: list
+
+
+class Output(Node):
+    """The `output` section of a task or workflow."""
+
+    __slots__ = _fields = ("body",)
+    body: list
+
+
+class Declaration(Node):
+    """A declaration, `type name` or `type name = expression`.
+
+    `inline` holds the comments between the parts of the declaration (and,
+    after error recovery, stray tokens), each as `(index, text)`: the number
+    of parts (type, name, `=`, expression) before it, and its text.
+    """
+
+    __slots__ = _fields = ("type", "name", "expression", "inline")
+    type: str
+    name: str
+    expression: Optional["Expression"]
+    inline: Tuple[Tuple[int, str], ...]
+
+    def parts(self) -> list:
+        """The text of the type, name, `=`, expression and inline comments,
+        in source order."""
+        parts = [self.type, self.name]
+        if self.expression is not None:
+            parts += ["=", self.expression.text]
+        return with_inline(parts, self.inline)
+
+
+class Expression(Node):
+    """An expression, as its source text without whitespace.
+
+    `breaks` holds the offsets into `text` where the expression may be
+    broken across lines (after commas and binary operators), in order.
+    """
+
+    __slots__ = _fields = ("text", "breaks")
+    text: str
+    breaks: Tuple[int, ...]
+
+
+class Command(Node):
+    """A command block.
+
+    `script` is the shell script with its indentation removed and
+    `dollar_interpolation` is true for `command { }` blocks, where `${...}`
+    is a WDL placeholder.
+    """
+
+    __slots__ = _fields = ("script", "dollar_interpolation")
+    script: str
+    dollar_interpolation: bool
+
+
+class Runtime(Node):
+    """A runtime section; `body` holds `RuntimeEntry`s and comments."""
+
+    __slots__ = _fields = ("body",)
+    body: list
+
+
+class RuntimeEntry(Node):
+    """A `key: value` pair of a runtime section. `inline` holds the comments
+    between its parts, as in `Declaration`."""
+
+    __slots__ = _fields = ("key", "value", "inline")
+    key: str
+    value: Expression
+    inline: Tuple[Tuple[int, str], ...]
+
+    def parts(self) -> list:
+        """The text of the key, `:`, value and inline comments, in source order."""
+        return with_inline([self.key, ":", "" if self.value is None else self.value.text], self.inline)
+
+
+class ParameterMeta(Node):
+    """A parameter_meta section; `body` holds `MetaEntry`s and comments."""
+
+    __slots__ = _fields = ("body",)
+    body: list
+
+
+class Meta(Node):
+    """A meta section; `body` holds `MetaEntry`s and comments."""
+
+    __slots__ = _fields = ("body",)
+    body: list
+
+
+class MetaEntry(Node):
+    """A `key: value` pair of a meta or parameter_meta section, the value as
+    its source text without whitespace. `inline` holds the comments between
+    its parts, as in `Declaration`."""
+
+    __slots__ = _fields = ("key", "value", "inline")
+    key: str
+    value: str
+    inline: Tuple[Tuple[int, str], ...]
+
+    def parts(self) -> list:
+        """The text of the key, `:`, value and inline comments, in source order."""
+        return with_inline([self.key, ":", self.value], self.inline)
+
+
+class Call(Node):
+    """A call. `body` is None for a call without braces, otherwise it holds
+    the `CallInputs` and comments between the braces. `inline` holds the
+    comments in the header, up to the opening brace, as in `Declaration`."""
+
+    __slots__ = _fields = ("target", "alias", "body", "inline")
+    target: str
+    alias: Optional[str]
+    body: Optional[list]
+    inline: Tuple[Tuple[int, str], ...]
+
+    def parts(self) -> list:
+        """The text of `call`, the target, `as` and the alias, the opening
+        brace and the inline comments, in source order."""
+        parts = ["call", self.target]
+        if self.alias is not None:
+            parts += ["as", self.alias]
+        if self.body is not None:
+            parts.append("{")
+        return with_inline(parts, self.inline)
+
+
+class CallInputs(Node):
+    """The `input:` of a call; `body` holds `CallInput`s and comments."""
+
+    __slots__ = _fields = ("body",)
+    body: list
+
+
+class CallInput(Node):
+    """A `name = expression` input of a call. `inline` holds the comments
+    between its parts, as in `Declaration`."""
+
+    __slots__ = _fields = ("name", "expression", "inline")
+    name: str
+    expression: Expression
+    inline: Tuple[Tuple[int, str], ...]
+
+    def parts(self) -> list:
+        """The text of the name, `=`, expression and inline comments, in source order."""
+        expression = "" if self.expression is None else self.expression.text
+        return with_inline([self.name, "=", expression], self.inline)
+
+
+class Scatter(Node):
+    __slots__ = _fields = ("variable", "expression", "body")
+    variable: str
+    expression: Expression
+    body: list
+
+
+class Conditional(Node):
+    __slots__ = _fields = ("expression", "body")
+    expression: Expression
+    body: list
@@ -1,8 +1,11 @@
 import difflib
 import logging
 import re
+import sys
+import threading
 
-import wdlfmt.formatters
+from antlr4.Token import Token
+from antlr4.tree.Tree import TerminalNode
 
 
 def init_logger(level="warning", file=None, name=None):
@@ -18,12 +21,47 @@ def init_logger(level="warning", file=None, name=None):
     return logging.getLogger(name if name else __name__)
 
 
-def get_raw_text(ctx):
-    # Comments are just mocked up context objects so do not
-    # have the convenience methods below
-    if isinstance(ctx, wdlfmt.formatters.common.CommentContext):
-        return ctx.getText() + "\n"
+# Room for recursion in `call_with_deep_stack`: about 10,000 levels of
+# nesting for the generated parser, which takes up to twenty frames a level.
+DEEP_RECURSION_LIMIT = 250_000
+DEEP_STACK_SIZE = 512 * 1024 * 1024
+
+
+def call_with_deep_stack(function, *args):
+    """Call `function(*args)` in a thread with a `DEEP_STACK_SIZE` stack and a
+    recursion limit of at least `DEEP_RECURSION_LIMIT`, and return its result
+    (or raise its exception).
+
+    For code that cannot be made iterative, like the recursive-descent
+    parser ANTLR generates. The recursion limit is raised for the whole
+    process until the call returns.
+    """
+    outcome = []
+
+    def run():
+        try:
+            outcome.append((function(*args), None))
+        except BaseException as error:
+            outcome.append((None, error))
+
+    limit = sys.getrecursionlimit()
+    stack_size = threading.stack_size(DEEP_STACK_SIZE)
+    try:
+        sys.setrecursionlimit(max(limit, DEEP_RECURSION_LIMIT))
+        thread = threading.Thread(target=run, name="wdlfmt-deep-stack")
+        thread.start()
+        thread.join()
+    finally:
+        threading.stack_size(stack_size)
+        sys.setrecursionlimit(limit)
 
+    result, error = outcome[0]
+    if error is not None:
+        raise error
+    return result
+
+
+def get_raw_text(ctx):
     stream = ctx.start.getInputStream()
 
     start = ctx.start.start
@@ -39,6 +77,41 @@ def get_raw_text(ctx):
     return raw
 
 
+def node_text(node) -> str:
+    """The text of `node` without whitespace, like `node.getText()` but with
+    the comments inside `node`.
+
+    `getText()` concatenates the text of every leaf below `node`, building a
+    new string at each level of the tree. This reads the node's tokens from
+    the token stream instead: if none of them is whitespace the text is a
+    single slice of the source, otherwise the non-whitespace tokens (which
+    include the comments) are joined once.
+    """
+    if isinstance(node, TerminalNode):
+        return node.getText()
+
+    start, stop = node.start, node.stop
+    if (
+        node.parentCtx is None or start is None or stop is None
+        or start.tokenIndex < 0 or stop.tokenIndex < start.tokenIndex
+    ):
+        # The whole document (which ends in an "<EOF>" leaf), empty, or
+        # holding tokens conjured up by error recovery.
+        return node.getText()
+
+    tokens = node.parser.getTokenStream().tokens[start.tokenIndex:stop.tokenIndex + 1]
+    # The lexer never skips input, so without hidden tokens the span is
+    # exactly the text of its tokens.
+    if all(token.channel != Token.HIDDEN_CHANNEL for token in tokens):
+        return start.getInputStream().strdata[start.start:stop.stop + 1]
+    return "".join(token.text for token in tokens if token.channel != Token.HIDDEN_CHANNEL)
+
+
+def join_text(nodes, separator: str = " ") -> str:
+    """The `node_text` of each of `nodes`, joined with `separator`."""
+    return separator.join([node_text(node) for node in nodes])
+
+
 def assert_text_equal(original, formatted, check=True):
     """Assert that the actual content of a formatted string
     does not change."""
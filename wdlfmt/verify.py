@@ -0,0 +1,198 @@
+"""Check that formatting changed nothing but layout.
+
+The formatted output is lexed again with `WdlV1Lexer` and its tokens are
+compared with the source's in one linear pass. Before comparing, both token
+streams are normalized so that only the differences the formatter is meant
+to make are ignored:
+
+* whitespace is dropped, including the layout inside command blocks (which
+  shfmt re-indents, also splitting `a; b` onto two lines, so `;` is dropped
+  there too) and inside the meta tokens that span whitespace;
+* comments are compared without their leading `#`s and surrounding spaces;
+* single-quoted strings compare equal to double-quoted ones;
+* a trailing comma before a closing bracket or brace is dropped;
+* `command { ... }` compares equal to `command <<< ... >>>`, and `${`
+  placeholders to `~{` ones.
+
+Any other difference, such as a lost or duplicated token or comment, raises
+`VerificationError`.
+
+Modes:
+
+* `"off"`: no checking.
+* `"fast"`: the token comparison above.
+* `"full"`: also checks that the output parses without errors and that
+  formatting it again leaves it unchanged. This formats every document twice.
+"""
+
+from __future__ import annotations
+
+from typing import List, NamedTuple, Sequence
+
+from antlr4 import CommonTokenStream
+from antlr4.Token import Token
+
+from . import profiling
+from .grammar.WdlV1Lexer import WdlV1Lexer
+from .input_stream import ArrayInputStream
+from .modes import DEFAULT_VERIFY_MODE, VERIFY_MODES
+
+_COMMENTS_CHANNEL = 2
+
+# Pseudo token type for a whole command block.
+_COMMAND = -2
+
+_COMMAND_START = (WdlV1Lexer.BeginHereDoc, WdlV1Lexer.BeginLBrace)
+
+# Tokens whose text can hold layout whitespace.
+_SPACED = frozenset([
+    WdlV1Lexer.MetaEmptyObject,
+    WdlV1Lexer.MetaEmptyArray,
+    WdlV1Lexer.MetaArrayCommaRbrack,
+    WdlV1Lexer.MetaObjectCommaRbrace,
+])
+
+_CLOSING = frozenset([WdlV1Lexer.RBRACE, WdlV1Lexer.RBRACK, WdlV1Lexer.RPAREN])
+
+_NO_WHITESPACE = str.maketrans("", "", " \t\r\n")
+_COMMAND_LAYOUT = str.maketrans("", "", " \t\r\n;")
+
+
+class VerificationError(Exception):
+    """The formatted output does not hold the same tokens as the source."""
+
+
+class _Item(NamedTuple):
+    type: int
+    text: str
+    line: int
+
+
+def check_verify_mode(mode: str) -> None:
+    if mode not in VERIFY_MODES:
+        raise ValueError(f"Unknown verify mode {mode!r}, expected one of {VERIFY_MODES}")
+
+
+def lex(text: str) -> List[Token]:
+    """Every token of `text`, on all channels, without reporting errors."""
+    from .parser_cache import get_parser_cache
+
+    cache = get_parser_cache()
+    lexer = cache.lexer(ArrayInputStream(text))
+    lexer.removeErrorListeners()
+    stream = CommonTokenStream(lexer)
+    stream.fill()
+    cache.trim()
+    return stream.tokens
+
+
+def normalized_tokens(tokens: Sequence[Token]) -> List[_Item]:
+    """The tokens that formatting must preserve, normalized as described in
+    the module docstring."""
+    items: List[_Item] = []
+    command, command_line = None, 0
+    for token in tokens:
+        if command is not None:
+            if token.type == WdlV1Lexer.EndCommand:
+                items.append(_Item(_COMMAND, "".join(command).translate(_COMMAND_LAYOUT), command_line))
+                command = None
+            elif token.type == WdlV1Lexer.StringCommandStart:
+                # `${` and `~{` both open a placeholder; what matters is that
+                # it is still one and not shell text.
+                command.append("\0{")
+            else:
+                command.append(token.text)
+            continue
+
+        if token.type == Token.EOF or token.channel == Token.HIDDEN_CHANNEL:
+            continue
+        if token.channel == _COMMENTS_CHANNEL:
+            items.append(_Item(WdlV1Lexer.LINE_COMMENT, token.text.strip("# \t\r"), token.line))
+        elif token.type in _COMMAND_START:
+            command, command_line = [], token.line
+        elif token.type == WdlV1Lexer.SQUOTE:
+            items.append(_Item(WdlV1Lexer.DQUOTE, '"', token.line))
+        elif token.type in _CLOSING and items and items[-1].type == WdlV1Lexer.COMMA:
+            items[-1] = _Item(token.type, token.text, token.line)
+        elif token.type in _SPACED:
+            items.append(_Item(token.type, token.text.translate(_NO_WHITESPACE), token.line))
+        else:
+            items.append(_Item(token.type, token.text, token.line))
+    if command is not None:
+        items.append(_Item(_COMMAND, "".join(command).translate(_COMMAND_LAYOUT), command_line))
+    return items
+
+
+def _describe(item: _Item) -> str:
+    if item.type == _COMMAND:
+        return "command block"
+    if item.type == WdlV1Lexer.LINE_COMMENT:
+        return f"comment {item.text!r}"
+    return repr(item.text)
+
+
+def verify_tokens(source_tokens: Sequence[Token], formatted: str, mode: str = DEFAULT_VERIFY_MODE) -> None:
+    """Check `formatted` against the tokens it was formatted from.
+
+    Args:
+        source_tokens: Every token of the source (or of the part of it that
+            `formatted` is the formatted version of), on all channels.
+        formatted: The formatter's output.
+        mode: One of `VERIFY_MODES`.
+
+    Raises:
+        VerificationError: At the first token that differs.
+    """
+    check_verify_mode(mode)
+    if mode == "off":
+        return
+    with profiling.stage("verify"):
+        _verify_tokens(source_tokens, formatted)
+    if mode == "full":
+        verify_output(formatted)
+
+
+def _verify_tokens(source_tokens: Sequence[Token], formatted: str) -> None:
+    expected = normalized_tokens(source_tokens)
+    found = normalized_tokens(lex(formatted))
+    for i, (before, after) in enumerate(zip(expected, found)):
+        if before[:2] == after[:2]:
+            continue
+        # Name a single lost or added token as such.
+        if i + 1 < len(expected) and expected[i + 1][:2] == after[:2]:
+            raise VerificationError(f"formatting lost {_describe(before)} on line {before.line} of the source")
+        if i + 1 < len(found) and found[i + 1][:2] == before[:2]:
+            raise VerificationError(f"formatting added {_describe(after)} on line {after.line} of the output")
+        raise VerificationError(
+            f"formatting changed {_describe(before)} on line {before.line} of the source "
+            f"into {_describe(after)} on line {after.line} of the output"
+        )
+    if len(expected) > len(found):
+        missing = expected[len(found)]
+        raise VerificationError(f"formatting lost {_describe(missing)} on line {missing.line} of the source")
+    if len(found) > len(expected):
+        extra = found[len(expected)]
+        raise VerificationError(f"formatting added {_describe(extra)} on line {extra.line} of the output")
+
+
+def verify_output(formatted: str) -> None:
+    """The extra checks of `"full"` mode: `formatted` parses without errors
+    and formatting it again leaves it unchanged."""
+    from .visitor import WdlVisitor
+
+    # Timed as verification, not as the formatting of another document.
+    with profiling.stage("verify"), profiling.suspended():
+        visitor = WdlVisitor(ArrayInputStream(formatted), report_errors=False, verify="off")
+        reformatted = None if visitor.syntax_errors else str(visitor)
+    if visitor.syntax_errors:
+        raise VerificationError(
+            f"the output does not parse: {visitor.syntax_error_messages[0]}"
+        )
+    if reformatted != formatted:
+        raise VerificationError("formatting the output again changes it")
+
+
+def verify_text(source: str, formatted: str, mode: str = DEFAULT_VERIFY_MODE) -> None:
+    """Check `formatted` against the `source` text it was formatted from."""
+    if mode != "off":
+        verify_tokens(lex(source), formatted, mode)
@@ -1,30 +1,128 @@
-from typing import List
+from collections import Counter
+from typing import List, Tuple
 
-from antlr4 import CommonTokenStream, InputStream
+from antlr4 import CommonTokenStream
+from antlr4.atn.PredictionMode import PredictionMode
+from antlr4.error.ErrorListener import ErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
 
-# Imported for side effects: registers Formatter subclasses before collect_formatters runs.
+# Imported for side effects: defining the Formatter subclasses registers them.
 from wdlfmt.formatters import struct, task, workflow  # noqa: F401
-from wdlfmt.formatters.common import CommentContext, collect_formatters, insert_comments
+from wdlfmt.formatters.common import public_formatters
 
-from .grammar.WdlV1Lexer import WdlV1Lexer
-from .grammar.WdlV1Parser import ParserRuleContext, WdlV1Parser
-from .grammar.WdlV1ParserVisitor import WdlV1ParserVisitor
-from .utils import assert_text_equal, init_logger
+from . import profiling, syntax
+from .checker import CheckResult, StyleChecker, Summary
+from .grammar.WdlV1Parser import WdlV1Parser
+from .input_stream import ArrayInputStream
+from .lowering import lower
+from .modes import DEFAULT_PARSE_MODE, PARSE_MODES
+from .parser_cache import get_parser_cache
+from .results import add_footer
+from .summary import summarize_element
+from .utils import call_with_deep_stack, init_logger
+from .verify import DEFAULT_VERIFY_MODE, check_verify_mode, verify_tokens
 
+# How many documents were parsed by each stage ("sll" or "ll") in this process.
+parse_stage_counts = Counter()
+
+
+def parse_document(parser: WdlV1Parser, mode: str = DEFAULT_PARSE_MODE):
+    """Parse a full document, returning the tree and the stage that produced it.
+
+    In two-stage mode the fast SLL prediction is tried first with a bail-out
+    error strategy, so the first syntax error aborts instead of recovering.
+    SLL only fails on input that is either invalid or needs full context to
+    disambiguate, so on failure the token stream is rewound and the document is
+    parsed again with full LL prediction and the normal error reporting.
+
+    Args:
+        parser: A freshly constructed parser over a token stream.
+        mode: One of `PARSE_MODES`.
+
+    Returns:
+        A `(tree, stage)` tuple where `stage` is `"sll"` or `"ll"`.
+    """
+    if mode not in PARSE_MODES:
+        raise ValueError(f"Unknown parse mode {mode!r}, expected one of {PARSE_MODES}")
+
+    if mode == "two-stage":
+        listeners = parser._listeners
+        parser.removeErrorListeners()
+        parser._errHandler = BailErrorStrategy()
+        parser._interp.predictionMode = PredictionMode.SLL
+        try:
+            tree = parser.document()
+        except ParseCancellationException:
+            tree = None
+        finally:
+            # Restored whatever happens, so that a parse that raised (see
+            # `WdlVisitor`) can be run again.
+            parser._listeners = listeners
+            parser._errHandler = DefaultErrorStrategy()
+            parser._interp.predictionMode = PredictionMode.LL
+        if tree is not None:
+            parse_stage_counts["sll"] += 1
+            return tree, "sll"
+        parser.reset()
+
+    tree = parser.document()
+    parse_stage_counts["ll"] += 1
+    return tree, "ll"
+
+
+class SyntaxErrorCollector(ErrorListener):
+    """Collects the syntax errors reported by a lexer and parser, formatted
+    like ANTLR's console output."""
+
+    def __init__(self):
+        self.messages = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.messages.append(f"line {line}:{column} {msg}")
+
+
+class WdlVisitor:
+    """Parses a document and formats it.
+
+    The document is lexed, parsed and lowered to a `syntax.Document`
+    (`self.document`) when the visitor is created; the parse tree is not
+    kept. `str(visitor)` formats the top-level elements of the document with
+    the public formatters.
+
+    Nothing after parsing recurses once per level of nesting in the document:
+    lowering fills nested blocks from a work list, comments are placed with
+    explicit-stack walkers and the layout printer is iterative. The parser
+    does recurse, and is run again with a deep stack (`call_with_deep_stack`)
+    on input nested deeper than the recursion limit allows.
+    """
+
+    def __init__(
+        self,
+        input_stream,
+        parse_mode: str = DEFAULT_PARSE_MODE,
+        report_errors: bool = True,
+        verify: str = DEFAULT_VERIFY_MODE,
+        summarize: bool = False,
+    ):
+        check_verify_mode(verify)
+        self.verify = verify
 
-class WdlVisitor(WdlV1ParserVisitor):
-    def __init__(self, input_stream):
         # Set up the formatters
-        self.formatters = {**collect_formatters()}
+        self.formatters = public_formatters()
 
         # Set up the listeners and parse the
         # token stream from the lexer
         self.formatted = ""
-        lexer = WdlV1Lexer(input_stream)
 
-        lexer.atn.decisionToState = []
-        lexer.decisionsToDFA = []
-        lexer.reset()
+        # The lexer and parser share their learned DFA states with every
+        # other document parsed in this process (see parser_cache.py).
+        cache = get_parser_cache()
+        lexer = cache.lexer(input_stream)
+        if not report_errors:
+            lexer.removeErrorListeners()
+        errors = SyntaxErrorCollector()
+        lexer.addErrorListener(errors)
 
         stream = CommonTokenStream(lexer)
 
@@ -36,121 +134,119 @@ class WdlVisitor(WdlV1ParserVisitor):
         # We want to work with the comments channel
         # but cannot directly parse it, so we read in
         # all of the tokens directly from the lexer
-        # and thread them into the tree behind their
-        # nearest top-level node.
-
-        # First we get all the tokens from the lexer
-        # in the comments channel and record their
-        # indices
-        comment_tokens = []
-        idxs = []
-        stream.fill()
-        for token in stream.tokens:
-            if token.channel == 2:
-                comment_tokens.append(token)
-                idxs.append(token.tokenIndex)
-
-        # The CommentContext is a mocked up context
-        # class that we use to insert the comments. It has
-        # manually set .getText() methods that return the
-        # comment text.
-        comment_ctx = [CommentContext(token) for token in comment_tokens]
-        parser = WdlV1Parser(stream)
-        parser.sharedContextCache.cache.clear()
-        # parser.atn.decisionToState = []
-        # parser.decisionsToDFA = []
-
-        # Parse the input and recusively visit the tree
-        # to add the comment nodes
-        self.tree = parser.document()
-        self.tree = insert_comments(self.tree, comment_ctx, idxs)
+        # and place them in the syntax tree when
+        # lowering (see lowering.py).
+        with profiling.stage("lex"):
+            stream.fill()
+        # Kept for checking the output against (see verify.py).
+        self.tokens = stream.tokens
+        comment_tokens = [token for token in stream.tokens if token.channel == 2]
+        profiling.count("documents")
+        profiling.count("characters", input_stream.size)
+        profiling.count("tokens", len(stream.tokens))
+        profiling.count("comments", len(comment_tokens))
+
+        parser = cache.parser(stream)
+        if not report_errors:
+            parser.removeErrorListeners()
+        parser.addErrorListener(errors)
+
+        # Parse the input. parse_stage records whether
+        # the SLL pass succeeded or we fell back to LL.
+        lexer_errors = len(errors.messages)
+        with profiling.stage("parse"):
+            try:
+                tree, self.parse_stage = parse_document(parser, parse_mode)
+            except RecursionError:
+                # The generated parser is recursive descent: input nested
+                # deeper than the recursion limit allows (brackets, prefix
+                # operators, blocks) is parsed again with room for it.
+                del errors.messages[lexer_errors:]
+                parser.reset()
+                tree, self.parse_stage = call_with_deep_stack(parse_document, parser, parse_mode)
+        profiling.count(f"parse_{self.parse_stage}")
+        # Errors the lexer and parser recovered from (and reported) while
+        # building the tree.
+        self.syntax_error_messages = errors.messages
+        self.syntax_errors = len(errors.messages)
+        # The formatters work on the syntax tree; the parse tree is dropped
+        # here.
+        with profiling.stage("lower"):
+            self.document = lower(tree, comment_tokens)
+        del tree
         self.log = init_logger(name=__name__)
 
-        parser.reset()
-        lexer.reset()
-        parser.sharedContextCache.cache.clear()
+        # With `summarize`, formatting also collects the structure of the
+        # output for the style checker (see summary.py). A tree that came out
+        # of error recovery is not summarized.
+        self.summary = Summary() if summarize and not self.syntax_errors else None
+
+        cache.release()
 
     def __str__(self):
         """The print method for the visitor will return the
         formatted WDL"""
-        self.visit(self.tree)
+        with profiling.stage("format"):
+            # Run shfmt once over every command block rather than once per task.
+            task.prefetch_commands(self.document)
+            for element in self.document.body:
+                self.visit(element)
+        if not self.syntax_errors:
+            # With syntax errors the tree came out of error recovery and
+            # already lacks tokens; the errors themselves are reported instead.
+            verify_tokens(self.tokens, self.formatted, self.verify)
         return self.formatted
 
-    def format(self, ctx):
+    def format_element(self, node: syntax.Node) -> str:
+        """Format one top-level element of the document (an element of
+        `document.body`) on its own, returning its part of the output."""
+        formatted, self.formatted = self.formatted, ""
+        # Offsets into a single element would not fit the summary.
+        summary, self.summary = self.summary, None
+        try:
+            with profiling.stage("format"):
+                self.visit(node)
+            return self.formatted
+        finally:
+            self.formatted = formatted
+            self.summary = summary
+
+    def visit(self, node: syntax.Node) -> None:
+        """Format a top-level element and add it to the output. Elements
+        without a public formatter are left out."""
+        if type(node) in self.formatters:
+            self.formatted += self.format_summarized(node)
+
+    def format(self, node: syntax.Node) -> str:
         """Get the formatter for the current class"""
-        self.log.debug(f"Formatting {ctx.__repr__()}")
-        if isinstance(ctx, CommentContext):
-            check = False
-        else:
-            check = True
-
-        formatted = self.formatters[str(type(ctx))].format(ctx)
-
-        # Now let's check to see if the formatting was applied correctly.
-        # Step 1: Remove any comments
-        lines = formatted.split("\n")
-        lines = "\n".join([line for line in lines if not line.startswith("#")])
-
-        assert_text_equal(ctx, lines, check)
+        self.log.debug("Formatting %r", node)
+        profiling.count("nodes_formatted")
+        # The output is checked as a whole once formatting is done, see
+        # `__str__`.
+        return self.formatters[type(node)].format(node)
+
+    def format_summarized(self, node: syntax.Node) -> str:
+        """Format a top-level element, adding it to the summary if one is
+        being collected."""
+        formatted = self.format(node)
+        if self.summary is not None:
+            try:
+                summarize_element(self.summary, node, formatted, len(self.formatted))
+            except LookupError:
+                # Not laid out as expected: the checker scans the text instead.
+                self.summary = None
         return formatted
 
-        # except KeyError:
-        #     self.log.warn(f"Missing formatter for: {ctx.__repr__()}")
-        #     self.log.debug(f"Writing the following instead:\n{get_raw_text(ctx)}\n")
-        #     return get_raw_text(ctx)
-        # except AssertionError as e:
-        #     self.log.error("Error formatting this block. See the diff above")
-        #     raise e
-
-    def visitVersion(self, ctx: WdlV1Parser.VersionContext):
-        self.formatted += self.format(ctx)
-        return self.visitChildren(ctx)
-
-    def baseVisitor(self, ctx: ParserRuleContext):
-        self.formatted += self.format(ctx)
-        return self.visitChildren(ctx)
-
-    def visitTask(self, ctx: WdlV1Parser.TaskContext):
-        self.formatted += self.format(ctx)
-        return self.visitChildren(ctx)
-
-    def visitWorkflow(self, ctx: WdlV1Parser.WorkflowContext):
-        self.formatted += self.format(ctx)
-        return self.visitChildren(ctx)
-
-    def visitComment(self, ctx: CommentContext):
-        self.formatted += self.format(ctx)
-        return self.visitChildren(ctx)
-
-    def visitStruct(self, ctx: WdlV1Parser.StructContext):
-        self.formatted += self.format(ctx)
-        return self.visitChildren(ctx)
-
-
-def add_footer(formatted):
-    """Add a footer to the formatted WDL"""
-    # Add the date and time and a link to the GIthub repo
-    import datetime
-
-    ts = datetime.datetime.now().strftime('%m/%d/%Y, %H:%M:%S')
-    footer = f"# Formatted by wdlfmt (https://github.com/Chris1221/wdlfmt) on {ts}\n"
-
-    # Let's check if there's already a footer
-    # and if so replace it
-    last_line = formatted.split("\n")[-1]
-    second_to_last_line = formatted.split("\n")[-2]
-    if last_line.startswith("# Formatted by wdlfmt"):
-        formatted = "\n\n".join(formatted.split("\n")[:-1])
-
-    elif second_to_last_line.startswith("# Formatted by wdlfmt"):
-        formatted = "\n\n".join(formatted.split("\n")[:-2])
-
-    formatted += footer
-    return formatted
-
 
 def format_wdl(
-    files: List[str] = "test/test_md5.wdl", in_place: bool = False, return_object=False
+    files: List[str] = "test/test_md5.wdl",
+    in_place: bool = False,
+    return_object=False,
+    parse_mode: str = DEFAULT_PARSE_MODE,
+    jobs: int = 1,
+    cache: bool = False,
+    cache_dir: str = None,
+    verify: str = DEFAULT_VERIFY_MODE,
 ):
     """Format one or more WDL files on disk.
 
@@ -160,15 +256,32 @@ def format_wdl(
             If `False` (default), print formatted output to stdout.
         return_object: If `True`, return the formatted text instead of printing.
             Single file → `str`; multiple files → `list[str]`.
-            Ignored when `in_place=True`.
+            Ignored when `in_place=True`. This keeps every document in
+            memory; use `wdlfmt.batch.format_many` to process large batches
+            one document at a time.
+        parse_mode: `"two-stage"` (SLL, falling back to LL on failure) or `"ll"`.
+        jobs: Number of worker processes to format with. Output order always
+            follows `files`.
+        cache: If `True`, skip files the on-disk format cache records as
+            already formatted, and record the ones found to be formatted.
+            Formatted command blocks are also kept on disk for reuse.
+        cache_dir: Directory for the format cache (default: `user_cache_dir()`).
+        verify: How to check that formatting changed nothing but layout:
+            `"off"`, `"fast"` or `"full"` (see `wdlfmt.verify`).
 
     Returns:
         The formatted WDL string(s) when `return_object=True`, otherwise `None`.
 
     Raises:
         ValueError: If `return_object=True` but no files were successfully formatted.
+        VerificationError: If `verify` finds that formatting changed a token.
         Exception: Re-raises any parse or formatting error from the underlying visitor.
+            With `jobs > 1` the error is raised as a `wdlfmt.batch.FormatError`.
     """
+    from .batch import FormatError, format_many
+    from .cache import FormatCache
+    from .formatters.shell_formatter import configure_shfmt_cache, get_shfmt_runner
+
     if isinstance(files, str):
         files = [files]
 
@@ -177,24 +290,34 @@ def format_wdl(
     if return_object:
         formatted_wdls = []
 
-    for file in files:
-        with open(file, "r") as f:
-            input_stream = InputStream(f.read())
+    format_cache = None
+    if cache:
+        # Command blocks are formatted by shfmt, so its version is part of the key.
+        options = {"parse_mode": parse_mode, "shfmt": get_shfmt_runner().version}
+        format_cache = FormatCache(options=options, directory=cache_dir)
+        configure_shfmt_cache(format_cache.directory / "shfmt")
 
-        try:
-            formatted = str(WdlVisitor(input_stream))
-        except Exception as e:
-            logger.error(f"Could not format {file}, see below for error message.")
-            raise e
+    for result in format_many(files, jobs=jobs, parse_mode=parse_mode, cache=format_cache, verify=verify):
+        if result.cached:
+            if in_place:
+                continue
+            with open(result.path, "r") as f:
+                result.formatted = f.read()
 
-        formatted = add_footer(formatted)
+        if result.error is not None:
+            logger.error(f"Could not format {result.path}, see below for error message.")
+            if result.exception is not None:
+                raise result.exception
+            raise FormatError(f"{result.path}: {result.error}")
+
+        formatted = add_footer(result.formatted)
 
         if in_place:
-            with open(file, "w") as f:
-                f.write(add_footer(formatted))
+            with open(result.path, "w") as f:
+                f.write(formatted)
         else:
             if not return_object:
-                print(add_footer(formatted))
+                print(formatted)
             else:
                 formatted_wdls.append(formatted)
 
@@ -207,15 +330,48 @@ def format_wdl(
             return formatted_wdls
 
 
-def format_wdl_str(wdl: str) -> str:
+def format_wdl_str(wdl: str, parse_mode: str = DEFAULT_PARSE_MODE, verify: str = DEFAULT_VERIFY_MODE) -> str:
     """Format a WDL document passed as a string.
 
     Args:
         wdl: The raw WDL source text.
+        parse_mode: `"two-stage"` (SLL, falling back to LL on failure) or `"ll"`.
+        verify: How to check that formatting changed nothing but layout:
+            `"off"`, `"fast"` or `"full"` (see `wdlfmt.verify`).
 
     Returns:
         The formatted WDL string. No footer is added (unlike `format_wdl`).
+
+    Raises:
+        VerificationError: If `verify` finds that formatting changed a token.
     """
-    input_stream = InputStream(wdl)
-    visitor = WdlVisitor(input_stream)
+    input_stream = ArrayInputStream(wdl)
+    visitor = WdlVisitor(input_stream, parse_mode=parse_mode, verify=verify)
     return str(visitor)
+
+
+def format_and_check(
+    wdl: str, parse_mode: str = DEFAULT_PARSE_MODE, verify: str = DEFAULT_VERIFY_MODE
+) -> Tuple[str, List[CheckResult]]:
+    """Format a WDL document and check the result for BioWDL style guide compliance.
+
+    Gives the same results as `check_style(format_wdl_str(wdl))`, but the
+    checker works from the structure found while formatting instead of
+    scanning the formatted text again.
+
+    Args:
+        wdl: The raw WDL source text.
+        parse_mode: `"two-stage"` (SLL, falling back to LL on failure) or `"ll"`.
+        verify: How to check that formatting changed nothing but layout:
+            `"off"`, `"fast"` or `"full"` (see `wdlfmt.verify`).
+
+    Returns:
+        A `(formatted, results)` tuple: the formatted WDL string (no footer)
+        and a `CheckResult` for every rule.
+
+    Raises:
+        VerificationError: If `verify` finds that formatting changed a token.
+    """
+    visitor = WdlVisitor(ArrayInputStream(wdl), parse_mode=parse_mode, verify=verify, summarize=True)
+    formatted = str(visitor)
+    return formatted, StyleChecker(formatted, summary=visitor.summary).run_all()